@@ -0,0 +1,184 @@
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Variável de ambiente para forçar o hash do conteúdo do dataset em vez do
+# atalho tamanho + mtime.
+CONTENT_HASH_ENV_VAR = "ASCE_CACHE_CONTENT_HASH"
+_CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(*package_dirs: str) -> str:
+    """Hash do código-fonte (.py) dos pacotes; calculado uma vez por processo."""
+    digest = hashlib.sha256()
+    for package_dir in package_dirs:
+        for path in sorted(Path(package_dir).glob("*.py")):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=32)
+def _content_hash(data_path: str, size: int, mtime_ns: int) -> str:
+    # Memorizado por (caminho, tamanho, mtime): o arquivo só é lido de novo se mudar
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(data_path: str, content_hash: bool = False) -> str:
+    stat = os.stat(data_path)
+    if content_hash:
+        return "sha256:" + _content_hash(os.path.abspath(data_path), stat.st_size, stat.st_mtime_ns)
+    return f"stat:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+
+
+class ResultCache:
+    """
+    Cache em disco dos resultados de uma análise (tempo, anomalias e perfil por
+    etapa), endereçado pelo conteúdo do dataset, pela solução, pelos
+    parâmetros e pela versão do código.
+
+    Cada entrada é um arquivo JSON; o mtime do arquivo marca o último uso e,
+    quando o total passa de `max_bytes`, as entradas usadas há mais tempo são
+    removidas (LRU).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 content_hash: bool | None = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        if content_hash is None:
+            content_hash = os.environ.get(CONTENT_HASH_ENV_VAR, "0") not in ("", "0")
+        self.content_hash = content_hash
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, data_path: str, solution: str, params: dict, code: str) -> str:
+        identity = {
+            "dataset": dataset_fingerprint(data_path, self.content_hash),
+            "solution": solution,
+            "params": params,
+            "code": code,
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        if not self.cache_dir.is_dir():
+            return []
+        return [(path, path.stat()) for path in self.cache_dir.glob("*.json")]
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime_ns)
+        total = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            self.evictions += 1
+
+    def clear(self):
+        for path, _ in self._entries():
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+        }
+
+
+_default_cache = None
+
+
+def get_default_cache() -> ResultCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def cached_analysis(solution: str, package_dir: str, *dependency_dirs: str):
+    """
+    Decorador para as funções `(data_path, num_workers, profiler=None)` das
+    soluções. A versão do código cobre `core/`, o pacote da solução e os
+    `dependency_dirs` de outros pacotes dos quais ela importa código (ex.: o
+    parser do multiprocessing usado pelas threads), para que mudar qualquer
+    um deles invalide as entradas. Acrescenta o parâmetro `use_cache` (padrão True): com ele
+    desligado, por exemplo em benchmarks, a análise sempre é executada.
+    Resultados de falha (tempo negativo) não são guardados.
+
+    Num acerto, o tempo devolvido é o da execução guardada, não uma medição
+    nova: o acerto conta em `get_default_cache().hits` e no contador
+    `cache_hits` do profiler, para quem exibe tempos poder separá-lo.
+    """
+    code = code_version(_CORE_DIR, os.path.abspath(package_dir), *(os.path.abspath(d) for d in dependency_dirs))
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(data_path: str, num_workers: int, profiler=None, use_cache: bool = True):
+            if not use_cache:
+                return func(data_path, num_workers, profiler=profiler)
+            cache = get_default_cache()
+            try:
+                key = cache.key(data_path, solution, {"num_workers": num_workers}, code)
+            except OSError:
+                # Dataset inexistente: a própria análise reporta o erro
+                return func(data_path, num_workers, profiler=profiler)
+
+            entry = cache.get(key)
+            if entry is not None:
+                if profiler is not None:
+                    profiler.merge(entry.get("profile"))
+                    profiler.count("cache_hits")
+                return entry["exec_time"], entry["found_anomalies"]
+
+            exec_time, found_anomalies = func(data_path, num_workers, profiler=profiler)
+            if exec_time >= 0:
+                cache.put(key, {
+                    "exec_time": exec_time,
+                    "found_anomalies": found_anomalies,
+                    "profile": profiler.to_dict() if profiler is not None else {},
+                })
+            return exec_time, found_anomalies
+        return wrapper
+    return decorator
@@ -1,22 +1,12 @@
 from collections import deque
-from datetime import datetime, timedelta
-
-def is_anomalous(event: dict) -> tuple[bool, str | None]:
-    """
-    Checks if a given event contains an anomalous sensor reading.
-    Returns a tuple: (is_anomaly: bool, anomalous_sensor: str | None)
-    """
-    if event['temperature'] < -10.0 or event['temperature'] > 45.0:
-        return (True, 'temperature')
-    if event['humidity'] < 0.0 or event['humidity'] > 100.0:
-        return (True, 'humidity')
-    if event['pressure'] < 950.0 or event['pressure'] > 1070.0:
-        return (True, 'pressure')
-    return (False, None)
-
+from collections.abc import Iterable, Sequence
 
+from core.models import MeteorologicalEvent
+# Regras de anomalia compartilhadas por todas as soluções
+from core.rules import is_anomalous
+from core.timestamps import MICROS_PER_MINUTE
 
-def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
+def calculate_moving_averages(events: Iterable[MeteorologicalEvent], window_size: int) -> dict:
     """
     Calcula as médias móveis para temperatura, umidade e pressão,
     ignorando valores anômalos.
@@ -35,9 +25,9 @@ def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
         anomaly_found, _ = is_anomalous(event)
         
         if not anomaly_found:
-            temp_window.append(event['temperature'])
-            hum_window.append(event['humidity'])
-            press_window.append(event['pressure'])
+            temp_window.append(event.temperature)
+            hum_window.append(event.humidity)
+            press_window.append(event.pressure)
         
         if len(temp_window) == window_size:
             averages['temperature'].append(sum(temp_window) / window_size)
@@ -51,36 +41,34 @@ def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
     
     return last_averages
 
-def count_multi_sensor_anomaly_periods(events: list[dict], window_minutes: int = 10) -> int:
+def count_multi_sensor_anomaly_periods(events: Sequence[MeteorologicalEvent], window_minutes: int = 10) -> int:
     """
     Conta o número de períodos de 'window_minutes' em que uma estação teve
-    anomalias em sensores distintos.
+    anomalias em sensores distintos. Os eventos devem estar ordenados pelo
+    timestamp (em microssegundos, ver core.timestamps).
     """
     if not events:
         return 0
 
+    window_us = window_minutes * MICROS_PER_MINUTE
     period_count = 0
     # Usamos um deque como uma janela deslizante de eventos
     window = deque()
     
     for event in events:
-        # Converte o timestamp de string ISO para objeto datetime
-        event_time = datetime.fromisoformat(event['timestamp'])
+        event_time = event.timestamp
         
         # Remove da janela os eventos que estão fora do período de 10 minutos
         # em relação ao evento atual.
-        while window and (event_time - window[0]['timestamp_obj']) > timedelta(minutes=window_minutes):
+        while window and (event_time - window[0][0]) > window_us:
             window.popleft()
 
         anomaly_found, sensor = is_anomalous(event)
         if anomaly_found:
-            window.append({
-                'timestamp_obj': event_time,
-                'sensor': sensor
-            })
+            window.append((event_time, sensor))
 
         # Verifica se a janela atual contém anomalias em mais de um tipo de sensor
-        sensors_in_window = {e['sensor'] for e in window}
+        sensors_in_window = {anomaly_sensor for _, anomaly_sensor in window}
         if len(sensors_in_window) > 1:
             period_count += 1
             window.clear()
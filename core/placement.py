@@ -0,0 +1,183 @@
+import math
+import os
+
+from core.startup import get_context
+
+# Variável de ambiente com a política de fixação dos workers em CPUs:
+#   none - o escalonador do sistema decide (padrão)
+#   cpu  - cada worker numa CPU lógica distinta
+#   core - cada worker num núcleo físico distinto (irmãos SMT só quando faltam núcleos)
+#   numa - workers agrupados por nó NUMA, cada um livre entre as CPUs do seu nó
+PLACEMENT_ENV_VAR = "ASCE_PLACEMENT"
+PLACEMENT_MODES = ("none", "cpu", "core", "numa")
+_SYS_CPU = "/sys/devices/system/cpu"
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def usable_cpus() -> list[int]:
+    """CPUs em que este processo pode rodar (máscara de afinidade / cpuset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_paths() -> dict[str, str]:
+    # /proc/self/cgroup: "0::/caminho" (v2) ou "id:cpu,cpuacct:/caminho" (v1)
+    paths = {}
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        for controller in controllers.split(",") if controllers else [""]:
+            paths[controller] = path
+    return paths
+
+
+def cgroup_cpu_quota() -> float | None:
+    """
+    Limite de CPU do cgroup em núcleos (ex.: 2.5 para `--cpus=2.5` no
+    Docker), ou None sem limite. Lê cpu.max (cgroup v2) ou
+    cpu.cfs_quota_us / cpu.cfs_period_us (v1), no cgroup do processo e na raiz
+    montada (como aparece dentro de um contêiner).
+    """
+    paths = _cgroup_paths()
+    v2_path = paths.get("", "/").lstrip("/")
+    for directory in dict.fromkeys((os.path.join(_CGROUP_ROOT, v2_path), _CGROUP_ROOT)):
+        content = _read(os.path.join(directory, "cpu.max"))
+        if content:
+            quota, _, period = content.partition(" ")
+            return None if quota == "max" else int(quota) / int(period or 100000)
+
+    v1_path = paths.get("cpu", "/").lstrip("/")
+    for directory in dict.fromkeys((os.path.join(_CGROUP_ROOT, "cpu", v1_path), os.path.join(_CGROUP_ROOT, "cpu"))):
+        quota = _read(os.path.join(directory, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(directory, "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            return int(quota) / int(period)
+    return None
+
+
+def available_cpu_count() -> int:
+    """
+    Quantas CPUs os workers podem de fato usar: o menor entre as CPUs da
+    máscara de afinidade e a cota do cgroup (arredondada para cima). Num
+    contêiner, `os.cpu_count()` devolve os núcleos do host.
+    """
+    count = len(usable_cpus())
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+    return max(1, count)
+
+
+def cpu_topology(cpus=None) -> dict[int, dict]:
+    """
+    {cpu: {"core": (pacote, núcleo), "node": nó NUMA}} a partir do sysfs.
+    Sem sysfs, cada CPU é tratada como um núcleo do nó 0.
+    """
+    topology = {}
+    for cpu in cpus if cpus is not None else usable_cpus():
+        base = os.path.join(_SYS_CPU, f"cpu{cpu}")
+        package = _read(os.path.join(base, "topology", "physical_package_id"))
+        core_id = _read(os.path.join(base, "topology", "core_id"))
+        try:
+            node = next(int(name[4:]) for name in os.listdir(base) if name.startswith("node") and name[4:].isdigit())
+        except (OSError, StopIteration):
+            node = 0
+        topology[cpu] = {
+            "core": (int(package or 0), int(core_id)) if core_id is not None else (0, cpu),
+            "node": node,
+        }
+    return topology
+
+
+def default_placement_mode() -> str:
+    mode = os.environ.get(PLACEMENT_ENV_VAR, "none")
+    if mode not in PLACEMENT_MODES:
+        raise ValueError(f"{PLACEMENT_ENV_VAR} deve ser um de {PLACEMENT_MODES}, não {mode!r}")
+    return mode
+
+
+def plan_placement(num_workers: int, mode: str | None = None) -> list[frozenset[int]] | None:
+    """
+    Conjunto de CPUs de cada worker segundo `mode` (padrão: ASCE_PLACEMENT),
+    ou None para não fixar. Só usa as CPUs da máscara de afinidade; com mais
+    workers do que posições, elas são reaproveitadas em ordem circular.
+    """
+    mode = mode or default_placement_mode()
+    if mode == "none":
+        return None
+    topology = cpu_topology()
+    cpus = sorted(topology)
+
+    if mode == "cpu":
+        slots = [frozenset((cpu,)) for cpu in cpus]
+    elif mode == "core":
+        # Primeiro uma CPU de cada núcleo físico, depois os irmãos SMT
+        by_core = {}
+        for cpu in cpus:
+            by_core.setdefault(topology[cpu]["core"], []).append(cpu)
+        siblings = list(by_core.values())
+        slots = [
+            frozenset((core_cpus[rank],))
+            for rank in range(max(len(core_cpus) for core_cpus in siblings))
+            for core_cpus in siblings if rank < len(core_cpus)
+        ]
+    elif mode == "numa":
+        by_node = {}
+        for cpu in cpus:
+            by_node.setdefault(topology[cpu]["node"], []).append(cpu)
+        # Workers em blocos por nó, proporcionais ao número de CPUs de cada nó
+        slots = [frozenset(node_cpus) for node_cpus in by_node.values() for _ in node_cpus]
+    else:
+        raise ValueError(f"Modo de placement desconhecido: {mode!r}")
+    return [slots[worker % len(slots)] for worker in range(num_workers)]
+
+
+def pin_process(pid: int, cpus) -> bool:
+    """Fixa o processo `pid` (0 = o atual) nas CPUs dadas; False se o sistema não suporta."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(pid, cpus)
+    return True
+
+
+def _pin_pool_worker(slots: list, next_slot):
+    # Initializer do pool: cada worker pega a próxima posição do plano
+    with next_slot.get_lock():
+        slot = next_slot.value
+        next_slot.value += 1
+    pin_process(0, slots[slot % len(slots)])
+
+
+def worker_pool(num_workers: int, mode: str | None = None, context=None):
+    """
+    `Pool` de `num_workers` processos (contexto de `core.startup`) com cada
+    worker fixado segundo `plan_placement`. Sem placement, é o mesmo
+    `get_context().Pool(processes=num_workers)` de antes.
+    """
+    context = context or get_context()
+    slots = plan_placement(num_workers, mode)
+    if slots is None:
+        return context.Pool(processes=num_workers)
+    return context.Pool(processes=num_workers, initializer=_pin_pool_worker, initargs=(slots, context.Value("i", 0)))
+
+
+def placement_summary() -> dict:
+    """O que foi detectado, para os benchmarks registrarem junto dos tempos."""
+    topology = cpu_topology()
+    return {
+        "os_cpu_count": os.cpu_count(),
+        "usable_cpus": sorted(topology),
+        "cgroup_quota": cgroup_cpu_quota(),
+        "available_cpus": available_cpu_count(),
+        "physical_cores": len({info["core"] for info in topology.values()}),
+        "numa_nodes": len({info["node"] for info in topology.values()}),
+        "mode": default_placement_mode(),
+    }
@@ -0,0 +1,97 @@
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Variável de ambiente usada para ligar a instrumentação em subprocessos
+# (ex.: workers do message broker, que são novos interpretadores).
+PROFILE_ENV_VAR = "ASCE_PROFILE"
+
+_NULL_CONTEXT = nullcontext()
+
+
+class StageProfiler:
+    """
+    Acumula o tempo gasto em cada etapa do processamento (parsing, agrupamento,
+    ordenação, métricas, IPC, merge...) e contadores simples.
+
+    O estado exportado por `to_dict` é um dicionário de tipos básicos, para que
+    os workers possam enviá-lo ao coordenador (via pickle ou JSON) e ele seja
+    somado com `merge`.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        # Carga de cada processo worker: {id: {"busy": s, "idle": s, "tasks": n}}
+        self.workers = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def add_time(self, name: str, seconds: float):
+        self.timings[name] += seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def record_worker(self, worker: str, busy_seconds: float, idle_seconds: float, tasks: int):
+        """Registra quanto tempo um worker passou processando e ocioso."""
+        self.workers[worker] = {"busy": busy_seconds, "idle": idle_seconds, "tasks": tasks}
+
+    def merge(self, other: dict | None):
+        """Soma ao perfil atual um perfil exportado por outro processo."""
+        if not other:
+            return
+        for name, seconds in other.get("timings", {}).items():
+            self.timings[name] += seconds
+        for name, value in other.get("counters", {}).items():
+            self.counters[name] += value
+        self.workers.update(other.get("workers", {}))
+
+    def to_dict(self) -> dict:
+        return {"timings": dict(self.timings), "counters": dict(self.counters), "workers": dict(self.workers)}
+
+
+class NullProfiler:
+    """
+    Implementação sem efeito da mesma interface, usada quando a instrumentação
+    está desligada. `stage` devolve sempre o mesmo contexto vazio, então o custo
+    no caminho quente é apenas uma chamada de método.
+    """
+
+    enabled = False
+
+    def stage(self, name: str):
+        return _NULL_CONTEXT
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def record_worker(self, worker: str, busy_seconds: float, idle_seconds: float, tasks: int):
+        pass
+
+    def merge(self, other: dict | None):
+        pass
+
+    def to_dict(self) -> dict:
+        return {}
+
+
+def get_profiler(enabled: bool) -> StageProfiler | NullProfiler:
+    return StageProfiler() if enabled else NullProfiler()
+
+
+def profiler_from_env() -> StageProfiler | NullProfiler:
+    """Cria o profiler de acordo com a variável de ambiente `ASCE_PROFILE`."""
+    return get_profiler(os.environ.get(PROFILE_ENV_VAR, "0") not in ("", "0"))
@@ -0,0 +1,318 @@
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+# Diretório onde os workers gravam os pontos de alocação da medição em
+# andamento (ver `AllocationTracer`). O `ResourceSampler` o define no
+# coordenador, que o repassa aos workers nos argumentos das tarefas: processos
+# do forkserver guardam o ambiente de quando o servidor nasceu e não veriam
+# uma variável de ambiente trocada a cada medição.
+_active_trace_dir = None
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_HAS_PROC = os.path.isdir("/proc/self")
+
+
+def _read_proc_sample(pid: int) -> dict | None:
+    """
+    Lê RSS, pico de RSS, tempo de CPU e trocas de contexto de um processo em
+    /proc. Retorna None se o processo já terminou.
+    """
+    sample = {"pid": pid}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    sample["name"] = value.strip()
+                elif key == "VmRSS":
+                    sample["rss_kb"] = int(value.split()[0])
+                elif key == "VmHWM":
+                    sample["peak_rss_kb"] = int(value.split()[0])
+                elif key == "voluntary_ctxt_switches":
+                    sample["voluntary_ctx_switches"] = int(value)
+                elif key == "nonvoluntary_ctxt_switches":
+                    sample["involuntary_ctx_switches"] = int(value)
+        with open(f"/proc/{pid}/stat") as f:
+            # O nome do processo pode conter espaços; os campos vêm depois do ')'
+            fields = f.read().rpartition(")")[2].split()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    # utime e stime são os campos 14 e 15 de /proc/<pid>/stat
+    sample["cpu_seconds"] = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return sample
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Zera o VmHWM deste processo para o RSS atual (Linux >= 4.0), para que o
+    pico lido depois seja o da medição e não o de toda a vida do processo.
+    Retorna False se o sistema não permite.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _list_children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+        return children
+    except FileNotFoundError:
+        pass
+    # Kernel sem CONFIG_PROC_CHILDREN: varre /proc procurando o PPID
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _list_descendants(pid: int) -> list[int]:
+    descendants, pending = [], [pid]
+    while pending:
+        for child in _list_children(pending.pop()):
+            descendants.append(child)
+            pending.append(child)
+    return descendants
+
+
+def allocation_trace_dir() -> str | None:
+    """Diretório de rastreamento da medição em andamento, para o coordenador repassar aos workers."""
+    return _active_trace_dir
+
+
+class AllocationTracer:
+    """
+    Registra, com tracemalloc, as linhas que mais alocaram memória entre
+    `start` e `stop`. Só faz algo com um `output_dir` (o valor de
+    `allocation_trace_dir()` recebido do coordenador); o resultado é gravado
+    nesse diretório para o `ResourceSampler` do coordenador agregar.
+    """
+
+    def __init__(self, limit: int = 10, output_dir: str | None = None):
+        self.output_dir = output_dir
+        self.limit = limit
+        self._baseline = None
+        self._started_here = False
+
+    def start(self):
+        if not self.output_dir:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_here = True
+        # Processos criados via fork herdam os rastros do pai; comparar com
+        # um snapshot inicial isola o que foi alocado aqui.
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop(self) -> list[dict]:
+        if not self.output_dir or self._baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        if self._started_here:
+            tracemalloc.stop()
+        hotspots = top_allocations(snapshot.compare_to(self._baseline, "lineno"), self.limit)
+        fd, path = tempfile.mkstemp(prefix=f"{os.getpid()}-", suffix=".json", dir=self.output_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(hotspots, f)
+        self._baseline = None
+        return hotspots
+
+
+def top_allocations(stats: list, limit: int) -> list[dict]:
+    """Converte `StatisticDiff`s do tracemalloc em dicionários serializáveis."""
+    hotspots = []
+    for stat in sorted(stats, key=lambda s: s.size_diff, reverse=True)[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        hotspots.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff,
+        })
+    return hotspots
+
+
+def merge_allocations(hotspot_lists: list[list[dict]], limit: int = 10) -> list[dict]:
+    merged = {}
+    for hotspots in hotspot_lists:
+        for spot in hotspots:
+            entry = merged.setdefault(spot["location"], {"location": spot["location"], "size_kb": 0.0, "count": 0})
+            entry["size_kb"] = round(entry["size_kb"] + spot["size_kb"], 1)
+            entry["count"] += spot["count"]
+    return sorted(merged.values(), key=lambda s: s["size_kb"], reverse=True)[:limit]
+
+
+class ResourceSampler:
+    """
+    Amostra periodicamente, numa thread, o uso de memória e CPU do processo
+    coordenador e de todos os seus descendentes (workers do pool, subprocessos
+    do broker, a JVM do Spark).
+
+    Uso:
+        with ResourceSampler() as sampler:
+            run_analysis(...)
+        report = sampler.report()
+
+    O pico de RSS vem de VmHWM, então é exato mesmo entre amostras. No
+    coordenador, que pode ser um processo longo como o Streamlit, o VmHWM é
+    zerado no início da medição (e as amostras de VmRSS cobrem sistemas em
+    que isso não é possível), então o pico é o da medição; sem /proc, resta
+    o `ru_maxrss` de toda a vida do processo. Já o tempo
+    de CPU de um processo que termina entre duas amostras perde no máximo um
+    `interval`. Os totais de `resource.getrusage(RUSAGE_CHILDREN)` (filhos já
+    finalizados) servem de conferência. Sem /proc, apenas `getrusage` é usado.
+    """
+
+    def __init__(self, interval: float = 0.1, trace_allocations: bool = False, allocation_limit: int = 10):
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.allocation_limit = allocation_limit
+        self.pid = os.getpid()
+        self._samples = {}
+        self._baselines = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._trace_dir = None
+        self._previous_trace_dir = None
+        self._coordinator_tracer = None
+        self._self_peak_kb = 0
+        self._peak_reset = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self):
+        self._start_wall = time.perf_counter()
+        self._start_self = resource.getrusage(resource.RUSAGE_SELF)
+        self._start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        if _HAS_PROC:
+            self._peak_reset = _reset_peak_rss()
+            self._sample_self()
+            # Processos que já existiam antes (ex.: uma JVM do Spark reaproveitada)
+            # entram no relatório apenas com o que consumiram durante a medição.
+            for pid in _list_descendants(self.pid):
+                sample = _read_proc_sample(pid)
+                if sample:
+                    self._baselines[pid] = sample
+        if self.trace_allocations:
+            global _active_trace_dir
+            self._trace_dir = tempfile.mkdtemp(prefix="asce-tracemalloc-")
+            self._previous_trace_dir, _active_trace_dir = _active_trace_dir, self._trace_dir
+            self._coordinator_tracer = AllocationTracer(self.allocation_limit, self._trace_dir)
+            self._coordinator_tracer.start()
+        if _HAS_PROC:
+            self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._sample_descendants()
+            self._stop_event.wait(self.interval)
+
+    def _sample_self(self) -> dict | None:
+        sample = _read_proc_sample(self.pid)
+        if sample:
+            self._self_peak_kb = max(self._self_peak_kb, sample.get("rss_kb", 0))
+        return sample
+
+    def _sample_descendants(self):
+        self._sample_self()
+        for pid in _list_descendants(self.pid):
+            sample = _read_proc_sample(pid)
+            if sample:
+                self._samples[pid] = sample
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._sample_descendants()
+            sample = self._sample_self()
+            if sample and self._peak_reset:
+                self._self_peak_kb = max(self._self_peak_kb, sample.get("peak_rss_kb", 0))
+        self._wall_seconds = time.perf_counter() - self._start_wall
+        self._end_self = resource.getrusage(resource.RUSAGE_SELF)
+        self._end_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._hotspots = []
+        if self.trace_allocations:
+            global _active_trace_dir
+            _active_trace_dir = self._previous_trace_dir
+            hotspot_lists = [self._coordinator_tracer.stop()]
+            for path in Path(self._trace_dir).glob("*.json"):
+                hotspot_lists.append(json.loads(path.read_text()))
+                path.unlink()
+            os.rmdir(self._trace_dir)
+            self._hotspots = merge_allocations(hotspot_lists, self.allocation_limit)
+
+    def _worker_record(self, sample: dict) -> dict:
+        baseline = self._baselines.get(sample["pid"], {})
+        return {
+            "pid": sample["pid"],
+            "name": sample.get("name", ""),
+            "peak_rss_mb": round(sample.get("peak_rss_kb", 0) / 1024, 1),
+            "cpu_seconds": round(sample["cpu_seconds"] - baseline.get("cpu_seconds", 0.0), 3),
+            "voluntary_ctx_switches": sample.get("voluntary_ctx_switches", 0) - baseline.get("voluntary_ctx_switches", 0),
+            "involuntary_ctx_switches": sample.get("involuntary_ctx_switches", 0) - baseline.get("involuntary_ctx_switches", 0),
+        }
+
+    def report(self) -> dict:
+        start, end = self._start_self, self._end_self
+        coordinator = {
+            "pid": self.pid,
+            # Pico durante a medição (ver a docstring); sem /proc, ru_maxrss
+            # (KB no Linux) é o pico de toda a vida do processo
+            "peak_rss_mb": round((self._self_peak_kb or end.ru_maxrss) / 1024, 1),
+            "peak_rss_scope": "measurement" if self._self_peak_kb else "lifetime",
+            "cpu_seconds": round((end.ru_utime - start.ru_utime) + (end.ru_stime - start.ru_stime), 3),
+            "voluntary_ctx_switches": end.ru_nvcsw - start.ru_nvcsw,
+            "involuntary_ctx_switches": end.ru_nivcsw - start.ru_nivcsw,
+        }
+        workers = [self._worker_record(sample) for sample in self._samples.values()]
+        children_start, children_end = self._start_children, self._end_children
+        reaped_children_cpu = (children_end.ru_utime - children_start.ru_utime) + (children_end.ru_stime - children_start.ru_stime)
+
+        # Para processos que o /proc não chegou a ver, o getrusage dos filhos
+        # finalizados é a melhor estimativa disponível.
+        workers_cpu = max(sum(w["cpu_seconds"] for w in workers), reaped_children_cpu)
+        total_cpu = coordinator["cpu_seconds"] + workers_cpu
+        wall = self._wall_seconds
+        return {
+            "wall_seconds": round(wall, 4),
+            "coordinator": coordinator,
+            "workers": workers,
+            "peak_rss_mb": coordinator["peak_rss_mb"],
+            "max_worker_peak_rss_mb": max((w["peak_rss_mb"] for w in workers), default=0.0),
+            "total_peak_rss_mb": round(coordinator["peak_rss_mb"] + sum(w["peak_rss_mb"] for w in workers), 1),
+            "cpu_seconds": round(total_cpu, 3),
+            # Em porcentagem de um núcleo, como no `top`
+            "cpu_percent": round(100 * total_cpu / wall, 1) if wall > 0 else 0.0,
+            "reaped_children_cpu_seconds": round(reaped_children_cpu, 3),
+            "voluntary_ctx_switches": coordinator["voluntary_ctx_switches"] + sum(w["voluntary_ctx_switches"] for w in workers),
+            "involuntary_ctx_switches": coordinator["involuntary_ctx_switches"] + sum(w["involuntary_ctx_switches"] for w in workers),
+            "alloc_hotspots": self._hotspots,
+        }
@@ -0,0 +1,122 @@
+from dataclasses import dataclass, fields
+
+from core.models import MeteorologicalEvent
+
+
+@dataclass(frozen=True)
+class RangeRule:
+    """
+    Regra de anomalia de um sensor: a leitura é anômala fora de [low, high].
+    Com `inclusive=True`, os próprios limites já contam como anomalia.
+    """
+
+    sensor: str
+    low: float
+    high: float
+    inclusive: bool = False
+
+
+# Especificação única das regras, na ordem de prioridade: quando mais de um
+# sensor está fora da faixa, o evento é atribuído à primeira regra.
+ANOMALY_RULES = (
+    # O gerador cria temperaturas >= 45.0 ou <= -10.0
+    RangeRule("temperature", -10.0, 45.0, inclusive=True),
+    # Umidade fora da faixa possível (0-100%)
+    RangeRule("humidity", 0.0, 100.0),
+    # O gerador desloca a pressão em 30-50 hPa a partir de 1002-1023
+    RangeRule("pressure", 980.0, 1040.0),
+)
+
+SENSORS = tuple(rule.sensor for rule in ANOMALY_RULES)
+# Ordem dos campos nas tuplas de `parse_event_bytes` (a mesma do evento)
+ROW_FIELDS = tuple(field.name for field in fields(MeteorologicalEvent))
+_NORMAL = (False, None)
+
+
+def _operators(rule: RangeRule) -> tuple[str, str]:
+    return ("<=", ">=") if rule.inclusive else ("<", ">")
+
+
+def compile_python(rules=ANOMALY_RULES, row_fields: tuple | None = None):
+    """
+    Gera uma função `is_anomalous(event) -> (bool, sensor | None)` com as
+    regras desenroladas em ifs com constantes, como se fossem escritas à mão:
+    no caminho quente não há laço sobre as regras nem consulta a dicionário.
+
+    Com `row_fields` (ex.: `ROW_FIELDS`), a função recebe a tupla parseada e
+    lê cada sensor pelo índice, sem criar um evento por linha.
+    """
+    lines = ["def is_anomalous(event):"]
+    for rule in rules:
+        low_op, high_op = _operators(rule)
+        if row_fields is None:
+            lines.append(f"    value = event.{rule.sensor}")
+        else:
+            lines.append(f"    value = event[{row_fields.index(rule.sensor)}]")
+        lines.append(f"    if value {low_op} {rule.low!r} or value {high_op} {rule.high!r}:")
+        lines.append(f"        return (True, {rule.sensor!r})")
+    lines.append("    return _NORMAL")
+
+    namespace = {"_NORMAL": _NORMAL}
+    exec(compile("\n".join(lines), f"<anomaly rules: {', '.join(rule.sensor for rule in rules)}>", "exec"), namespace)
+    is_anomalous = namespace["is_anomalous"]
+    is_anomalous.__doc__ = (
+        "Verifica se um evento contém uma leitura de sensor anômala, segundo core.rules.ANOMALY_RULES.\n"
+        "Retorna (is_anomaly, anomalous_sensor | None)."
+    )
+    return is_anomalous
+
+
+def compile_numpy(rules=ANOMALY_RULES):
+    """
+    Gera uma função vetorizada `anomaly_mask(columns) -> (mask, sensor_codes)`
+    sobre colunas NumPy (ex.: `EventBatch.to_numpy()`). `sensor_codes[i]` é o
+    índice em `SENSORS` da primeira regra violada pelo evento i, ou -1.
+    """
+    import numpy as np
+
+    def anomaly_mask(columns: dict):
+        size = len(columns[rules[0].sensor])
+        sensor_codes = np.full(size, -1, dtype=np.int8)
+        # Da última regra para a primeira, para que a de maior prioridade prevaleça
+        for code in range(len(rules) - 1, -1, -1):
+            rule = rules[code]
+            values = columns[rule.sensor]
+            if rule.inclusive:
+                violated = (values <= rule.low) | (values >= rule.high)
+            else:
+                violated = (values < rule.low) | (values > rule.high)
+            sensor_codes[violated] = code
+        return sensor_codes >= 0, sensor_codes
+
+    return anomaly_mask
+
+
+def compile_spark(rules=ANOMALY_RULES):
+    """
+    Gera as expressões Spark equivalentes: (condição de anomalia, coluna com o
+    sensor da primeira regra violada ou nulo).
+    """
+    from pyspark.sql.functions import col, lit, when
+
+    def violated(rule: RangeRule):
+        if rule.inclusive:
+            return (col(rule.sensor) <= rule.low) | (col(rule.sensor) >= rule.high)
+        return (col(rule.sensor) < rule.low) | (col(rule.sensor) > rule.high)
+
+    condition = violated(rules[0])
+    sensor = when(violated(rules[0]), rules[0].sensor)
+    for rule in rules[1:]:
+        condition = condition | violated(rule)
+        sensor = sensor.when(violated(rule), rule.sensor)
+    return condition, sensor.otherwise(lit(None))
+
+
+is_anomalous = compile_python()
+is_anomalous_row = compile_python(row_fields=ROW_FIELDS)
+
+
+def sensor_name(code: int) -> str | None:
+    """Converte um código de `compile_numpy` de volta para o nome do sensor."""
+    return SENSORS[code] if code >= 0 else None
+
@@ -0,0 +1,248 @@
+import argparse
+import importlib
+import itertools
+import math
+import os
+import time
+
+# Datasets gerados para a varredura (um arquivo por número de eventos)
+SCALING_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'scaling')
+
+
+# --- Métricas e ajuste dos modelos ---------------------------------------------
+
+def speedup_rows(times: dict[int, float]) -> list[dict]:
+    """
+    Escalabilidade forte (mesmo dataset, grau variando): speedup e eficiência
+    em relação ao menor grau medido, e a métrica de Karp-Flatt (fração serial
+    estimada a partir de cada ponto; se ela cresce com o grau, o limite é
+    overhead de paralelização e não código serial).
+    """
+    base_degree = min(times)
+    base_time = times[base_degree] * base_degree
+    rows = []
+    for degree in sorted(times):
+        speedup = base_time / times[degree]
+        karp_flatt = (1 / speedup - 1 / degree) / (1 - 1 / degree) if degree > 1 else None
+        rows.append({
+            "degree": degree, "seconds": times[degree], "speedup": speedup,
+            "efficiency": speedup / degree, "karp_flatt": karp_flatt,
+        })
+    return rows
+
+
+def weak_scaling_rows(times: dict[int, float]) -> list[dict]:
+    """
+    Escalabilidade fraca (eventos proporcionais ao grau): eficiência T(1)/T(p)
+    e speedup escalado p·T(1)/T(p) (Gustafson).
+    """
+    base_degree = min(times)
+    rows = []
+    for degree in sorted(times):
+        efficiency = times[base_degree] / times[degree]
+        rows.append({
+            "degree": degree, "seconds": times[degree],
+            "scaled_speedup": efficiency * degree / base_degree, "efficiency": efficiency,
+        })
+    return rows
+
+
+def _solve(matrix: list[list[float]], vector: list[float]) -> list[float] | None:
+    # Eliminação de Gauss com pivotamento parcial (sistemas de até 3x3)
+    size = len(vector)
+    augmented = [row[:] + [value] for row, value in zip(matrix, vector)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(augmented[r][col]))
+        if abs(augmented[pivot][col]) < 1e-15:
+            return None
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        for row in range(size):
+            if row != col:
+                factor = augmented[row][col] / augmented[col][col]
+                augmented[row] = [a - factor * b for a, b in zip(augmented[row], augmented[col])]
+    return [augmented[i][size] / augmented[i][i] for i in range(size)]
+
+
+def _nonnegative_least_squares(columns: list[list[float]], target: list[float]) -> list[float]:
+    """
+    Mínimos quadrados com coeficientes >= 0, testando todos os subconjuntos
+    de colunas (são no máximo 3): o melhor ajuste viável vence.
+    """
+    best, best_error = [0.0] * len(columns), sum(y * y for y in target)
+    for size in range(1, len(columns) + 1):
+        for subset in itertools.combinations(range(len(columns)), size):
+            if len(target) < size:
+                continue
+            chosen = [columns[i] for i in subset]
+            normal = [[sum(a * b for a, b in zip(ci, cj)) for cj in chosen] for ci in chosen]
+            rhs = [sum(a * y for a, y in zip(ci, target)) for ci in chosen]
+            solution = _solve(normal, rhs)
+            if solution is None or min(solution) < 0:
+                continue
+            predicted = [sum(coef * col[k] for coef, col in zip(solution, chosen)) for k in range(len(target))]
+            error = sum((p - y) ** 2 for p, y in zip(predicted, target))
+            if error < best_error - 1e-18:
+                best_error = error
+                best = [0.0] * len(columns)
+                for index, coef in zip(subset, solution):
+                    best[index] = coef
+    return best
+
+
+def fit_amdahl(times: dict[int, float]) -> dict:
+    """
+    Ajusta T(p) = a + b/p + c·(p - 1) aos tempos de escalabilidade forte:
+    `a` é a parte serial, `b` a parte paralelizável e `c` o overhead que cada
+    worker a mais acrescenta (criação de processos, IPC, merge). Com c > 0 o
+    speedup tem um máximo em p* = sqrt(b / c), onde a arquitetura deixa de
+    escalar; com c = 0 é a lei de Amdahl pura, limitada a 1 / fração serial.
+    """
+    degrees = sorted(times)
+    target = [times[p] for p in degrees]
+    serial, parallel, overhead = _nonnegative_least_squares(
+        [[1.0] * len(degrees), [1 / p for p in degrees], [p - 1.0 for p in degrees]], target
+    )
+    t1 = serial + parallel
+    model = {"serial_s": serial, "parallel_s": parallel, "overhead_s_per_worker": overhead}
+    model["serial_fraction"] = serial / t1 if t1 > 0 else 1.0
+    if overhead > 0:
+        model["peak_degree"] = max(1.0, math.sqrt(parallel / overhead))
+    else:
+        model["peak_degree"] = math.inf
+    model["max_speedup"] = (
+        predict_speedup(model, model["peak_degree"]) if math.isfinite(model["peak_degree"])
+        else (1 / model["serial_fraction"] if model["serial_fraction"] > 0 else math.inf)
+    )
+    residuals = [predict_time(model, p) - t for p, t in zip(degrees, target)]
+    model["rmse_s"] = math.sqrt(sum(r * r for r in residuals) / len(residuals))
+    return model
+
+
+def predict_time(model: dict, degree: float) -> float:
+    return model["serial_s"] + model["parallel_s"] / degree + model["overhead_s_per_worker"] * (degree - 1)
+
+
+def predict_speedup(model: dict, degree: float) -> float:
+    """Speedup previsto pelo ajuste de `fit_amdahl` num grau qualquer."""
+    return (model["serial_s"] + model["parallel_s"]) / predict_time(model, degree)
+
+
+def fit_gustafson(times: dict[int, float]) -> dict:
+    """
+    Ajusta a escalabilidade fraca: a fração serial `s` de Gustafson no speedup
+    escalado S(p) = s + (1 - s)·p, e o crescimento do tempo por worker a mais,
+    T(p) = T(1) + g·(p - 1), que soma a parte serial que cresce com os dados
+    e o overhead de coordenação (g = 0 é escalabilidade fraca perfeita).
+    """
+    rows = weak_scaling_rows(times)
+    base_degree = rows[0]["degree"]
+    relative = [(row["degree"] / base_degree, row["scaled_speedup"]) for row in rows]
+    denominator = sum((1 - p) ** 2 for p, _ in relative)
+    serial_fraction = sum((s - p) * (1 - p) for p, s in relative) / denominator if denominator else 0.0
+    serial_fraction = min(1.0, max(0.0, serial_fraction))
+
+    base_time = times[base_degree]
+    growth_denominator = sum((p - 1) ** 2 for p, _ in relative)
+    growth = (
+        sum((times[row["degree"]] - base_time) * (p - 1) for row, (p, _) in zip(rows, relative)) / growth_denominator
+        if growth_denominator else 0.0
+    )
+    return {"serial_fraction": serial_fraction, "growth_s_per_worker": max(0.0, growth)}
+
+
+# --- Varredura ------------------------------------------------------------------
+
+def load_solution(spec: str):
+    """Importa a função de análise de "módulo:função" (como no dashboard)."""
+    module_name, function_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def scaling_dataset(num_events: int, anomaly_percentage: float = 5.0, data_dir: str = SCALING_DATA_DIR) -> str:
+    """Gera (uma vez) um dataset com `num_events` eventos para a varredura."""
+    path = os.path.join(data_dir, f"events_{num_events}.csv")
+    if not os.path.exists(path):
+        from data_generator.generator import generate_data
+
+        generate_data(num_events, anomaly_percentage, path, os.path.join(data_dir, f"anomalies_{num_events}.json"))
+    return path
+
+
+def run_scaling_sweep(solutions: dict, sizes, degrees, weak_base_events: int | None = None,
+                      repeats: int = 1, on_result=None) -> list[dict]:
+    """
+    Executa cada solução em cada combinação de tamanho × grau (escalabilidade
+    forte) e, com `weak_base_events`, em `weak_base_events × grau` eventos
+    (escalabilidade fraca). `solutions` mapeia nome -> função ou "módulo:função".
+    Cada medição é o menor tempo de `repeats` execuções, sem cache, e é
+    passada a `on_result` assim que fica pronta (ex.: barra de progresso).
+    """
+    plan = [("strong", size, degree) for size in sizes for degree in degrees]
+    if weak_base_events:
+        plan += [("weak", weak_base_events * degree, degree) for degree in degrees]
+
+    results = []
+    for mode, size, degree in plan:
+        data_path = scaling_dataset(size)
+        for name, solution in solutions.items():
+            analysis = load_solution(solution) if isinstance(solution, str) else solution
+            timings = []
+            for _ in range(repeats):
+                exec_time, _ = analysis(data_path, degree, use_cache=False)
+                timings.append(exec_time)
+            result = {"mode": mode, "solution": name, "events": size, "degree": degree, "seconds": min(timings)}
+            results.append(result)
+            if on_result is not None:
+                on_result(result, len(results), len(plan) * len(solutions))
+    return results
+
+
+def summarize_sweep(results: list[dict]) -> list[dict]:
+    """
+    Um resumo por solução (e tamanho, na escalabilidade forte) com os ajustes
+    de `fit_amdahl` e `fit_gustafson`.
+    """
+    strong, weak = {}, {}
+    for result in results:
+        if result["mode"] == "strong":
+            strong.setdefault((result["solution"], result["events"]), {})[result["degree"]] = result["seconds"]
+        else:
+            weak.setdefault(result["solution"], {})[result["degree"]] = result["seconds"]
+
+    summary = []
+    for (solution, events), times in strong.items():
+        model = fit_amdahl(times)
+        summary.append({"mode": "strong", "solution": solution, "events": events, **model})
+    for solution, times in weak.items():
+        summary.append({"mode": "weak", "solution": solution, **fit_gustafson(times)})
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strong/weak scaling sweep with Amdahl and Gustafson fits.")
+    parser.add_argument("--solutions", nargs="+", default=[
+        "solution_multiprocessing.processor:run_analysis", "solution_threads.processor:run_thread_analysis",
+    ], help="Analysis functions as module:function.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50_000, 200_000])
+    parser.add_argument("--degrees", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--weak-base", type=int, default=25_000, help="Events per worker for weak scaling (0 = skip).")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    sweep = run_scaling_sweep(
+        {spec.split(":")[0].split(".")[0]: spec for spec in args.solutions}, args.sizes, args.degrees,
+        weak_base_events=args.weak_base, repeats=args.repeats,
+        on_result=lambda r, done, total: print(
+            f"[{done}/{total}] {r['mode']:>6} {r['solution']:>24} {r['events']:>9} eventos, grau {r['degree']:>2}: {r['seconds']:.4f} s"
+        ),
+    )
+    print(f"\nVarredura concluída em {time.perf_counter() - start_time:.1f} s.\n")
+    for fit in summarize_sweep(sweep):
+        if fit["mode"] == "strong":
+            print(f"{fit['solution']:>24} ({fit['events']} eventos): fração serial {fit['serial_fraction']:.3f}, "
+                  f"overhead {fit['overhead_s_per_worker'] * 1000:.1f} ms/worker, "
+                  f"speedup máximo {fit['max_speedup']:.2f}x em ~{fit['peak_degree']:.0f} workers")
+        else:
+            print(f"{fit['solution']:>24} (fraca): fração serial de Gustafson {fit['serial_fraction']:.3f}, "
+                  f"crescimento {fit['growth_s_per_worker'] * 1000:.1f} ms/worker")
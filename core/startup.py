@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+
+# Variável de ambiente para escolher o método de início dos processos worker
+# (fork, spawn ou forkserver).
+START_METHOD_ENV_VAR = "ASCE_START_METHOD"
+
+# Módulos importados uma única vez pelo forkserver; cada worker nasce de um
+# fork dele com tudo isso já carregado. Módulos indisponíveis (ex.: pika fora
+# do container) são ignorados pelo próprio forkserver.
+PRELOAD_MODULES = [
+    "core.models",
+    "core.rules",
+    "core.timestamps",
+    "core.profiling",
+    "core.resources",
+    "core.metrics",
+    "solution_multiprocessing.data_parser",
+    "solution_multiprocessing.metrics",
+    "solution_multiprocessing.processor",
+    "solution_message_broker.worker",
+]
+
+_preload_configured = False
+
+
+def default_start_method() -> str:
+    method = os.environ.get(START_METHOD_ENV_VAR)
+    if method:
+        return method
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_context(method: str | None = None):
+    """
+    Contexto de multiprocessing usado por todas as soluções para criar
+    workers. Por padrão é o forkserver com PRELOAD_MODULES: o servidor paga o
+    custo dos imports uma vez e cada worker é um fork barato dele, sem herdar
+    o estado do processo pai (threads do Streamlit, a JVM do Spark...).
+    """
+    method = method or default_start_method()
+    context = multiprocessing.get_context(method)
+    global _preload_configured
+    if method == "forkserver" and not _preload_configured:
+        # Só vale antes de o forkserver ser iniciado pela primeira vez
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        _preload_configured = True
+    return context
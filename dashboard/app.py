@@ -9,9 +9,23 @@ import json
 st.set_page_config(page_title="Dashboard de Computação Escalável", layout="wide")
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from solution_multiprocessing.processor import run_analysis as run_multiprocessing_analysis
-from solution_message_broker.processor import run_analysis as run_broker_analysis
-from solution_spark.processor import run_spark_analysis as run_spark_analysis
+from core.cache import get_default_cache
+from core.profiling import get_profiler
+from core.resources import ResourceSampler
+from core.scaling import load_solution, predict_speedup, run_scaling_sweep, speedup_rows, summarize_sweep, weak_scaling_rows
+from core.timestamps import MICROS_PER_HOUR
+
+# Soluções disponíveis, como "módulo:função". Os módulos (pyspark, pika...) só
+# são importados quando a solução é executada pela primeira vez, para que a
+# página abra sem pagar o custo de iniciar todos os backends.
+SOLUTIONS = {
+    "Multiprocessing": "solution_multiprocessing.processor:run_analysis",
+    "Multiprocessing (TCP)": "solution_multiprocessing.distributed:run_distributed_analysis",
+    "Multiprocessing (Out-of-core)": "solution_multiprocessing.out_of_core:run_out_of_core_analysis",
+    "Threads (NumPy)": "solution_threads.processor:run_thread_analysis",
+    "Message Broker": "solution_message_broker.processor:run_analysis",
+    "Apache Spark": "solution_spark.processor:run_spark_analysis",
+}
 
 def calculate_correctness(ground_truth: list, found: list) -> dict:
     """Calcula apenas o número de anomalias geradas e encontradas."""
@@ -40,6 +54,12 @@ with st.sidebar:
         help="Percentual de eventos que serão gerados como anomalias."
     )
     
+    ordered_data = st.checkbox(
+        "Gerar dados ordenados (por estação e tempo)",
+        value=False,
+        help="Simula feeds por estação já ordenados; as soluções detectam isso e evitam reordenar."
+    )
+
     parallelism_degrees = st.multiselect(
         "Graus de Paralelismo a Testar", 
         options=[1, 2, 4, 8, 12, 16], 
@@ -47,50 +67,112 @@ with st.sidebar:
         help="Unidades de processamento (processos/workers/cores) para cada teste."
     )
 
+    profile_stages = st.checkbox(
+        "Medir tempo por etapa",
+        value=True,
+        help="Instrumenta parsing, ordenação, métricas, IPC e merge de cada solução."
+    )
+
+    use_cache = st.checkbox(
+        "Reaproveitar resultados em cache",
+        value=True,
+        help="Pula execuções com o mesmo dataset, solução, grau e versão do código. Desligue para medir tempos."
+    )
+
+    trace_allocations = st.checkbox(
+        "Rastrear alocações (tracemalloc)",
+        value=False,
+        help="Mostra as linhas de Python que mais alocam memória. Deixa a execução bem mais lenta."
+    )
+
     start_button = st.button(" Iniciar Experimento", type="primary", use_container_width=True)
 
 status_placeholder = st.empty()
-tab1, tab2 = st.tabs([" Desempenho (Tempo de Execução)", " Corretude das Anomalias"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    " Desempenho (Tempo de Execução)", " Corretude das Anomalias", " Recursos (Memória e CPU)", " Exploração por Período",
+    " Escalabilidade",
+])
 
 with tab1:
     st.header("Gráfico de Desempenho")
     chart_placeholder = st.empty()
     st.header("Tabela de Tempos (segundos)")
     results_table_placeholder = st.empty() 
+    cached_runs_placeholder = st.empty()
+    st.header("Tempo por Etapa (segundos)")
+    st.caption("Etapas executadas nos workers são somadas entre todos os processos.")
+    stages_chart_placeholder = st.empty()
+    st.header("Carga por Worker (segundos)")
+    st.caption("Tempo ocupado e ocioso de cada processo do pool, para ver o balanceamento conforme o grau cresce.")
+    workers_chart_placeholder = st.empty()
 
 with tab2:
     st.header("Métricas de Corretude por Execução")
     correctness_placeholder = st.empty()
 
+with tab3:
+    st.header("Pico de Memória (MB, coordenador + workers)")
+    memory_chart_placeholder = st.empty()
+    st.header("Uso de CPU (% de um núcleo)")
+    cpu_chart_placeholder = st.empty()
+    st.header("Recursos por Execução")
+    resources_table_placeholder = st.empty()
+    hotspots_placeholder = st.container()
+
 if start_button:
     # Limpa os resultados e placeholders da tela
-    status_placeholder.empty(); chart_placeholder.empty(); results_table_placeholder.empty(); correctness_placeholder.empty()
+    status_placeholder.empty(); chart_placeholder.empty(); results_table_placeholder.empty(); correctness_placeholder.empty(); cached_runs_placeholder.empty()
+    stages_chart_placeholder.empty(); workers_chart_placeholder.empty(); memory_chart_placeholder.empty(); cpu_chart_placeholder.empty(); resources_table_placeholder.empty()
 
     # --- Etapa de Geração de Dados (Não-Bloqueante) ---
-    command = [
-        'python', '-m', 'data_generator.generator',
-        '--events', str(num_events),
-        '--anomaly_perc', str(anomaly_perc)
-    ]
+    # Com o cache ligado, dados já gerados com os mesmos parâmetros são
+    # reaproveitados; gerar de novo mudaria o dataset e invalidaria o cache.
+    data_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv')
+    generation_params = {"events": num_events, "anomaly_perc": anomaly_perc, "ordered": ordered_data}
+    params_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'generation_params.json')
+    try:
+        with open(params_file_path, 'r') as f:
+            previous_params = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous_params = None
+    reuse_data = use_cache and previous_params == generation_params and os.path.exists(data_file_path)
+
+    if reuse_data:
+        status_placeholder.info("Dados já gerados com estes parâmetros; reaproveitando.")
+    else:
+        command = [
+            'python', '-m', 'data_generator.generator',
+            '--events', str(num_events),
+            '--anomaly_perc', str(anomaly_perc)
+        ]
+        if ordered_data:
+            command.append('--ordered')
     
-    # Inicia o processo gerador em segundo plano com Popen
-    generator_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # Inicia o processo gerador em segundo plano com Popen
+        generator_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     
-    # Usa st.spinner para mostrar um feedback visual enquanto espera
-    with st.spinner(f"Gerando {num_events} eventos... Isso pode levar um momento."):
-        # Espera o processo terminar, verificando seu status sem bloquear o Streamlit
-        while generator_process.poll() is None:
-            time.sleep(1) # Pequena pausa para não sobrecarregar o CPU
+        # Usa st.spinner para mostrar um feedback visual enquanto espera
+        with st.spinner(f"Gerando {num_events} eventos... Isso pode levar um momento."):
+            # Espera o processo terminar, verificando seu status sem bloquear o Streamlit
+            while generator_process.poll() is None:
+                time.sleep(1) # Pequena pausa para não sobrecarregar o CPU
             
-    # Verifica se o processo terminou com erro
-    stdout, stderr = generator_process.communicate()
-    if generator_process.returncode != 0:
-        status_placeholder.error("Ocorreu um erro durante a geração de dados:")
-        st.code(stderr)
-        st.stop() # Interrompe a execução se a geração falhou
-    else:
-        status_placeholder.info("Geração de dados concluída com sucesso.")
-        print(stdout) # Opcional: mostra a saída do gerador no console
+        # Verifica se o processo terminou com erro
+        stdout, stderr = generator_process.communicate()
+        if generator_process.returncode != 0:
+            status_placeholder.error("Ocorreu um erro durante a geração de dados:")
+            st.code(stderr)
+            st.stop() # Interrompe a execução se a geração falhou
+        else:
+            status_placeholder.info("Geração de dados concluída com sucesso.")
+            print(stdout) # Opcional: mostra a saída do gerador no console
+
+    # Rollups por estação/região e minuto/hora para a aba de exploração; só
+    # são reconstruídos quando o dataset muda.
+    from solution_multiprocessing.rollups import build_rollups, is_rollup_current
+    if not is_rollup_current(data_file_path):
+        with st.spinner("Pré-agregando os dados por estação e período..."):
+            build_rollups(data_file_path, max(parallelism_degrees, default=1))
 
     # --- Continuação do Experimento ---
     
@@ -102,27 +184,83 @@ if start_button:
         status_placeholder.error("Arquivo de anomalias não encontrado. A geração de dados falhou.")
         st.stop()
 
-    performance_data, correctness_data = [], []
-    data_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv')
-    solutions = {
-        "Multiprocessing": run_multiprocessing_analysis,
-        "Message Broker": run_broker_analysis,
-        "Apache Spark": run_spark_analysis
-    }
+    performance_data, correctness_data, stage_data, worker_data, resource_data = [], [], [], [], []
+    cached_runs = []
 
     # O resto do loop de execução permanece o mesmo...
     for degree in sorted(parallelism_degrees):
-        for name, analysis_func in solutions.items():
+        for name, spec in SOLUTIONS.items():
             status_placeholder.info(f"Executando '{name}' com grau de paralelismo {degree}...")
+            analysis_func = load_solution(spec)
             
-            exec_time, found_anomalies = analysis_func(data_file_path, degree)
-            
+            profiler = get_profiler(profile_stages)
+            cache_hits_before = get_default_cache().hits
+            with ResourceSampler(trace_allocations=trace_allocations) as sampler:
+                exec_time, found_anomalies = analysis_func(data_file_path, degree, profiler=profiler, use_cache=use_cache)
+            resources = sampler.report()
+            # Um acerto do cache devolve o tempo de uma execução anterior e a
+            # amostragem de recursos fica perto de zero: nenhum dos dois é uma
+            # medição desta execução, então ficam fora dos gráficos
+            from_cache = get_default_cache().hits > cache_hits_before
+
             # --- Atualiza Desempenho ---
-            performance_data.append({"Abordagem": name, "Grau de Paralelismo": degree, "Tempo (s)": exec_time})
-            df_performance = pd.DataFrame(performance_data).pivot(index="Grau de Paralelismo", columns="Abordagem", values="Tempo (s)")
-            with tab1:
-                results_table_placeholder.dataframe(df_performance, use_container_width=True)
-                chart_placeholder.line_chart(df_performance)
+            if from_cache:
+                cached_runs.append(f"{name} (grau {degree}): {exec_time:.4f} s registrados")
+                with tab1:
+                    cached_runs_placeholder.caption(
+                        "Vindas do cache, fora dos gráficos de tempo e de recursos: " + "; ".join(cached_runs) + "."
+                    )
+            else:
+                performance_data.append({"Abordagem": name, "Grau de Paralelismo": degree, "Tempo (s)": exec_time})
+                df_performance = pd.DataFrame(performance_data).pivot(index="Grau de Paralelismo", columns="Abordagem", values="Tempo (s)")
+                with tab1:
+                    results_table_placeholder.dataframe(df_performance, use_container_width=True)
+                    chart_placeholder.line_chart(df_performance)
+
+            # --- Atualiza Tempo por Etapa ---
+            if profiler.enabled:
+                # O perfil de um acerto é o da execução que foi guardada
+                run_label = f"{name} (grau {degree}{', cache' if from_cache else ''})"
+                for stage, seconds in profiler.timings.items():
+                    stage_data.append({"Execução": run_label, "Etapa": stage, "Tempo (s)": seconds})
+                if stage_data:
+                    df_stages = pd.DataFrame(stage_data).pivot_table(
+                        index="Execução", columns="Etapa", values="Tempo (s)", aggfunc="sum", sort=False
+                    ).fillna(0)
+                    with tab1:
+                        # st.bar_chart empilha as colunas por padrão
+                        stages_chart_placeholder.bar_chart(df_stages)
+                for worker, load in profiler.workers.items():
+                    worker_data.append({"Worker": f"{run_label} - {worker}", "Ocupado": load["busy"], "Ocioso": load["idle"]})
+                if worker_data:
+                    with tab1:
+                        workers_chart_placeholder.bar_chart(pd.DataFrame(worker_data).set_index("Worker"))
+
+            # --- Atualiza Recursos ---
+            if not from_cache:
+                resource_data.append({
+                    "Abordagem": name, "Grau de Paralelismo": degree,
+                    "Pico RSS Total (MB)": resources["total_peak_rss_mb"],
+                    "Pico RSS Coordenador (MB)": resources["peak_rss_mb"],
+                    "Maior Pico RSS Worker (MB)": resources["max_worker_peak_rss_mb"],
+                    "Processos Worker": len(resources["workers"]),
+                    "CPU (s)": resources["cpu_seconds"],
+                    "CPU (%)": resources["cpu_percent"],
+                    "Trocas de Contexto Voluntárias": resources["voluntary_ctx_switches"],
+                    "Trocas de Contexto Involuntárias": resources["involuntary_ctx_switches"],
+                })
+                df_resources = pd.DataFrame(resource_data)
+                with tab3:
+                    memory_chart_placeholder.line_chart(
+                        df_resources.pivot(index="Grau de Paralelismo", columns="Abordagem", values="Pico RSS Total (MB)")
+                    )
+                    cpu_chart_placeholder.line_chart(
+                        df_resources.pivot(index="Grau de Paralelismo", columns="Abordagem", values="CPU (%)")
+                    )
+                    resources_table_placeholder.dataframe(df_resources, use_container_width=True, hide_index=True)
+                    if resources["alloc_hotspots"]:
+                        with hotspots_placeholder.expander(f"Pontos de alocação: {name} (grau {degree})"):
+                            st.dataframe(pd.DataFrame(resources["alloc_hotspots"]), use_container_width=True, hide_index=True)
 
             # --- Atualiza Corretude ---
             correctness_metrics = calculate_correctness(ground_truth_anomalies, found_anomalies)
@@ -134,4 +272,132 @@ if start_button:
             with tab2:
                 correctness_placeholder.dataframe(df_correctness, use_container_width=True, hide_index=True)
 
-    status_placeholder.success("✅ Experimento concluído!")
\ No newline at end of file
+    cache_stats = get_default_cache().stats()
+    status_placeholder.success(
+        f"✅ Experimento concluído! Cache: {cache_stats['hits']} acertos, {cache_stats['misses']} falhas, "
+        f"{cache_stats['entries']} entradas ({cache_stats['bytes'] / 1024:.0f} KB)."
+    )
+
+# --- Exploração por Período ---
+# Lê apenas os rollups pré-agregados: mudar os filtros responde em
+# milissegundos, sem reexecutar as soluções nem reler o CSV.
+with tab4:
+    from solution_multiprocessing.rollups import DEFAULT_STORE_PATH, RollupStore
+    if not os.path.exists(DEFAULT_STORE_PATH):
+        st.info("Execute um experimento para gerar os dados e os rollups.")
+    else:
+        # Uma conexão por rerun do Streamlit, fechada ao fim da aba
+        with RollupStore(DEFAULT_STORE_PATH) as store:
+            data_range = store.time_range()
+            if data_range is None:
+                st.info("O dataset não tem eventos para explorar.")
+            else:
+                data_start, data_end = data_range
+                total_hours = max(1, -(-(data_end - data_start) // MICROS_PER_HOUR))
+                col_hours, col_scope, col_keys = st.columns([1, 1, 2])
+                with col_hours:
+                    last_hours = st.number_input("Últimas N horas", min_value=1, max_value=int(total_hours), value=min(24, int(total_hours)))
+                with col_scope:
+                    scope_label = st.radio("Agrupar por", ["Estação", "Região"], horizontal=True)
+                scope = "station" if scope_label == "Estação" else "region"
+                all_keys = [row["key"] for row in store.summary(scope)]
+                with col_keys:
+                    selected_keys = st.multiselect(f"Filtrar {scope_label.lower()}", all_keys, help="Vazio = todas.")
+
+                query_start = max(data_start, data_end - int(last_hours) * MICROS_PER_HOUR)
+                query_time = time.perf_counter()
+                summary_rows = store.summary(scope, start=query_start, end=data_end, keys=selected_keys or None)
+                series_rows = store.series(scope, start=query_start, end=data_end, keys=selected_keys or None, granularity="hour")
+                st.caption(f"Consulta respondida em {(time.perf_counter() - query_time) * 1000:.1f} ms a partir dos rollups.")
+
+                if series_rows:
+                    st.header("Anomalias por Hora")
+                    st.bar_chart(pd.DataFrame(series_rows).pivot_table(index="bucket", columns="key", values="anomalies", aggfunc="sum").fillna(0))
+                    st.header(f"Resumo por {scope_label}")
+                    st.dataframe(pd.DataFrame(summary_rows).rename(columns={"key": scope_label}), use_container_width=True, hide_index=True)
+                else:
+                    st.info("Nenhum evento no período selecionado.")
+
+# --- Varredura de Escalabilidade ---
+# Tamanho × grau × solução, com os ajustes de core.scaling para prever até
+# onde cada arquitetura escala em máquinas com mais núcleos.
+with tab5:
+    st.header("Varredura de Escalabilidade")
+    st.caption(
+        "Escalabilidade forte: mesmo dataset com graus crescentes. Fraca: eventos proporcionais ao grau. "
+        "Usa os graus escolhidos na barra lateral e nunca o cache."
+    )
+    col_sizes, col_solutions, col_weak = st.columns([2, 2, 1])
+    with col_sizes:
+        sweep_sizes = st.multiselect("Tamanhos (eventos)", [10000, 50000, 100000, 200000, 500000], default=[50000, 200000])
+    with col_solutions:
+        sweep_solutions = st.multiselect("Soluções", list(SOLUTIONS), default=["Multiprocessing", "Threads (NumPy)"])
+    with col_weak:
+        weak_base = st.number_input("Eventos por worker (fraca)", min_value=0, max_value=200000, value=25000, step=5000)
+        sweep_repeats = st.number_input("Repetições", min_value=1, max_value=5, value=1)
+
+    if st.button(" Executar Varredura", disabled=not (sweep_sizes and sweep_solutions and parallelism_degrees)):
+        progress = st.progress(0.0)
+        st.session_state["scaling_results"] = run_scaling_sweep(
+            {name: SOLUTIONS[name] for name in sweep_solutions}, sorted(sweep_sizes), sorted(parallelism_degrees),
+            weak_base_events=weak_base, repeats=sweep_repeats,
+            on_result=lambda result, done, total: progress.progress(
+                done / total, text=f"{result['solution']}: {result['events']} eventos, grau {result['degree']}"
+            ),
+        )
+
+    sweep_results = st.session_state.get("scaling_results")
+    if sweep_results:
+        df_sweep = pd.DataFrame(sweep_results)
+        fits = summarize_sweep(sweep_results)
+        strong_fits = [fit for fit in fits if fit["mode"] == "strong"]
+
+        if strong_fits:
+            largest = max(fit["events"] for fit in strong_fits)
+            strong_rows = []
+            for solution, group in df_sweep[(df_sweep["mode"] == "strong") & (df_sweep["events"] == largest)].groupby("solution"):
+                for row in speedup_rows(dict(zip(group["degree"], group["seconds"]))):
+                    strong_rows.append({"Solução": solution, "Grau": row["degree"], "Speedup": row["speedup"], "Eficiência": row["efficiency"]})
+            df_strong = pd.DataFrame(strong_rows)
+            st.header(f"Escalabilidade Forte ({largest} eventos)")
+            col_speedup, col_efficiency = st.columns(2)
+            with col_speedup:
+                st.caption("Speedup medido")
+                st.line_chart(df_strong.pivot(index="Grau", columns="Solução", values="Speedup"))
+            with col_efficiency:
+                st.caption("Eficiência paralela (speedup / grau)")
+                st.line_chart(df_strong.pivot(index="Grau", columns="Solução", values="Eficiência"))
+
+            st.header("Speedup Previsto pelo Modelo")
+            st.caption("T(p) = serial + paralelo / p + overhead × (p - 1), ajustado aos tempos medidos.")
+            prediction_degrees = [1, 2, 4, 8, 16, 32, 64]
+            st.line_chart(pd.DataFrame({
+                fit["solution"]: [predict_speedup(fit, degree) for degree in prediction_degrees]
+                for fit in strong_fits if fit["events"] == largest
+            }, index=pd.Index(prediction_degrees, name="Grau")))
+            st.dataframe(pd.DataFrame([{
+                "Solução": fit["solution"], "Eventos": fit["events"],
+                "Fração Serial": round(fit["serial_fraction"], 3),
+                "Overhead (ms/worker)": round(fit["overhead_s_per_worker"] * 1000, 1),
+                "Grau de Pico": round(fit["peak_degree"], 1) if fit["peak_degree"] != float("inf") else None,
+                "Speedup Máximo": round(fit["max_speedup"], 2) if fit["max_speedup"] != float("inf") else None,
+                "Erro do Ajuste (s)": round(fit["rmse_s"], 4),
+            } for fit in strong_fits]), use_container_width=True, hide_index=True)
+
+        weak_fits = [fit for fit in fits if fit["mode"] == "weak"]
+        if weak_fits:
+            weak_rows = []
+            for solution, group in df_sweep[df_sweep["mode"] == "weak"].groupby("solution"):
+                for row in weak_scaling_rows(dict(zip(group["degree"], group["seconds"]))):
+                    weak_rows.append({"Solução": solution, "Grau": row["degree"], "Eficiência": row["efficiency"]})
+            st.header("Escalabilidade Fraca")
+            st.caption("Eficiência T(1) / T(p) com o volume de dados crescendo junto com o grau; 1,0 é o ideal.")
+            st.line_chart(pd.DataFrame(weak_rows).pivot(index="Grau", columns="Solução", values="Eficiência"))
+            st.dataframe(pd.DataFrame([{
+                "Solução": fit["solution"],
+                "Fração Serial (Gustafson)": round(fit["serial_fraction"], 3),
+                "Crescimento (ms/worker)": round(fit["growth_s_per_worker"] * 1000, 1),
+            } for fit in weak_fits]), use_container_width=True, hide_index=True)
+
+        with st.expander("Medições"):
+            st.dataframe(df_sweep, use_container_width=True, hide_index=True)
@@ -26,9 +26,41 @@ def setup_regions(fake: Faker) -> dict:
             }
     return regions
 
-def generate_data(num_events: int, anomaly_percentage: float, output_csv_path: str, output_json_path: str):
+def make_event(station_id: int, event_time: datetime.datetime, regions_config: dict, regions_list: list,
+               anomaly_percentage: float) -> tuple[dict, dict | None]:
+    """
+    Builds one event row for a station at `event_time`, turning it into an
+    anomaly with the given probability. Returns the row and the ground-truth
+    anomaly record (or None).
+    """
+    region_name = regions_list[(station_id - 1) // STATIONS_PER_REGION]
+    base_values = regions_config[region_name]
+    event_data = {
+        "timestamp": event_time.isoformat(), "station_id": station_id, "region": region_name,
+        "temperature": round(base_values["temp"] + random.uniform(-2.5, 2.5), 2),
+        "humidity": round(base_values["humidity"] + random.uniform(-5, 5), 2),
+        "pressure": round(base_values["pressure"] + random.uniform(-3, 3), 2)
+    }
+    anomaly = None
+    if random.random() < (anomaly_percentage / 100.0):
+        sensor_to_alter = random.choice(list(ANOMALY_FUNCTIONS.keys()))
+        anomalous_value = ANOMALY_FUNCTIONS[sensor_to_alter](event_data[sensor_to_alter])
+        event_data[sensor_to_alter] = anomalous_value
+        anomaly = {
+            "timestamp": event_data["timestamp"], "station_id": station_id,
+            "sensor": sensor_to_alter, "value": anomalous_value,
+        }
+    return event_data, anomaly
+
+def generate_data(num_events: int, anomaly_percentage: float, output_csv_path: str, output_json_path: str,
+                  ordered: bool = False):
     """
     Generates synthetic data with anomalies based on provided parameters.
+
+    With `ordered=True` the CSV is written clustered by station and, within
+    each station, in time order (as a per-station feed would be), so the
+    processors can skip sorting. Otherwise events are written as generated,
+    in random time order.
     """
     print(f"Generating {num_events} events with {anomaly_percentage:.1f}% anomalies...")
     fake = Faker('pt_BR')
@@ -46,28 +78,22 @@ def generate_data(num_events: int, anomaly_percentage: float, output_csv_path: s
 
         today = datetime.datetime.now(datetime.timezone.utc)
         start_date = today - datetime.timedelta(days=1)
+        buffered_events = []
 
         for _ in range(num_events):
-            # ... (internal generation logic remains the same) ...
             station_id = random.randint(1, TOTAL_STATIONS)
-            region_name = regions_list[(station_id - 1) // STATIONS_PER_REGION]
-            base_values = regions_config[region_name]
             event_time = fake.date_time_between(start_date=start_date, end_date=today, tzinfo=datetime.timezone.utc)
-            event_data = {
-                "timestamp": event_time.isoformat(), "station_id": station_id, "region": region_name,
-                "temperature": round(base_values["temp"] + random.uniform(-2.5, 2.5), 2),
-                "humidity": round(base_values["humidity"] + random.uniform(-5, 5), 2),
-                "pressure": round(base_values["pressure"] + random.uniform(-3, 3), 2)
-            }
-            if random.random() < (anomaly_percentage / 100.0):
-                sensor_to_alter = random.choice(list(ANOMALY_FUNCTIONS.keys()))
-                anomalous_value = ANOMALY_FUNCTIONS[sensor_to_alter](event_data[sensor_to_alter])
-                event_data[sensor_to_alter] = anomalous_value
-                generated_anomalies.append({
-                    "timestamp": event_data["timestamp"], "station_id": station_id,
-                    "sensor": sensor_to_alter, "value": anomalous_value,
-                })
-            writer.writerow(event_data)
+            event_data, anomaly = make_event(station_id, event_time, regions_config, regions_list, anomaly_percentage)
+            if anomaly is not None:
+                generated_anomalies.append(anomaly)
+            if ordered:
+                buffered_events.append((station_id, event_time, event_data))
+            else:
+                writer.writerow(event_data)
+
+        if ordered:
+            buffered_events.sort(key=lambda item: (item[0], item[1]))
+            writer.writerows(event_data for _, _, event_data in buffered_events)
 
     with open(output_json_path, 'w') as jsonfile:
         json.dump(generated_anomalies, jsonfile, indent=4)
@@ -78,14 +104,21 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate synthetic meteorological data.")
     parser.add_argument("--events", type=int, default=10000, help="Number of events to generate.")
     parser.add_argument("--anomaly_perc", type=float, default=5.0, help="Percentage of anomalies to introduce.")
+    parser.add_argument("--ordered", action="store_true", help="Write events clustered by station and in time order.")
     args = parser.parse_args()
     
     OUTPUT_CSV = "data/synthetic_data.csv"
     OUTPUT_JSON = "data/generated_anomalies.json"
+    OUTPUT_PARAMS = "data/generation_params.json"
     
     generate_data(
         num_events=args.events, 
         anomaly_percentage=args.anomaly_perc,
         output_csv_path=OUTPUT_CSV, 
-        output_json_path=OUTPUT_JSON
-    )
\ No newline at end of file
+        output_json_path=OUTPUT_JSON,
+        ordered=args.ordered
+    )
+
+    # Registra os parâmetros usados, para o dashboard saber se pode reaproveitar os dados
+    with open(OUTPUT_PARAMS, 'w') as params_file:
+        json.dump({"events": args.events, "anomaly_perc": args.anomaly_perc, "ordered": args.ordered}, params_file)
\ No newline at end of file
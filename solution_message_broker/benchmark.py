@@ -1,10 +1,12 @@
 import pika
 import time
-import subprocess
-import os
 import json
 from collections import defaultdict
+from core.placement import available_cpu_count, pin_process, plan_placement
+from core.resources import ResourceSampler
+from core.startup import get_context
 from .producer import run_producer
+from .worker import main as worker_main
 
 def run_single_test(data_path: str, num_workers: int) -> float:
     connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
@@ -21,13 +23,20 @@ def run_single_test(data_path: str, num_workers: int) -> float:
 
     start_time = time.perf_counter()
 
-    workers = []
-    for _ in range(num_workers):
-        proc = subprocess.Popen(['python', '-m', 'solution_message_broker.worker'])
-        workers.append(proc)
-    
-    for proc in workers:
-        proc.wait()
+    with ResourceSampler() as sampler:
+        workers = []
+        placement = plan_placement(num_workers)
+        for index in range(num_workers):
+            proc = get_context().Process(target=worker_main)
+            proc.start()
+            if placement:
+                pin_process(proc.pid, placement[index])
+            workers.append(proc)
+        
+        for proc in workers:
+            proc.join()
+    resources = sampler.report()
+    print(f"  Pico RSS por worker: {resources['max_worker_peak_rss_mb']:.1f} MB | CPU: {resources['cpu_percent']:.0f}%")
 
     connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
     channel = connection.channel()
@@ -53,8 +62,8 @@ if __name__ == '__main__':
     print("Iniciando benchmark da solução OTIMIZADA com Message Broker...")
     results = {}
     for workers in WORKER_COUNTS:
-        if workers > os.cpu_count():
-            print(f"Pulando teste com {workers} workers (Máximo de CPUs: {os.cpu_count()}).")
+        if workers > available_cpu_count():
+            print(f"Pulando teste com {workers} workers (Máximo de CPUs: {available_cpu_count()}).")
             continue
         duration = run_single_test(DATA_FILE, num_workers=workers)
         if duration > 0: results[workers] = duration
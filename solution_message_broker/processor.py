@@ -1,15 +1,32 @@
 import pika
 import time
-import subprocess
 import os
 import json
 from collections import defaultdict
+
+from core.cache import cached_analysis
+from core.placement import pin_process, plan_placement
+from core.profiling import get_profiler
+from core.resources import allocation_trace_dir
+from core.sketches import DistributionSketches, write_distribution_report
+from core.startup import get_context
+from core.timestamps import format_iso_us
 from .producer import run_producer
+from .worker import main as worker_main
+
+# Percentis por região e estação (sketches combinados de todos os workers)
+DISTRIBUTIONS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'distributions_broker.json')
 
-def run_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
+@cached_analysis("message_broker", os.path.dirname(__file__))
+def run_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
     """
     Orquestra a análise distribuída com o padrão de workers agregadores (otimizado).
+    Se um `StageProfiler` for passado, os workers são iniciados com a
+    instrumentação ligada e seus perfis são somados a ele. Os percentis por
+    região e estação são salvos em DISTRIBUTIONS_FILE.
+    O resultado passa pelo cache de `core.cache` (`use_cache=False` o ignora).
     """
+    profiler = profiler or get_profiler(False)
     print("\n--- Iniciando Análise com Message Broker (Otimizado) ---")
     
     try:
@@ -24,31 +41,50 @@ def run_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
         print(f"Erro de conexão no Setup: {e}")
         return -1.0, []
 
-    total_tasks = run_producer(data_path)
+    with profiler.stage("produce"):
+        total_tasks = run_producer(data_path, profiler)
     if total_tasks <= 0: return -1.0, []
     
     start_time = time.perf_counter()
 
-    workers = []
-    for _ in range(num_workers):
-        proc = subprocess.Popen(['python', '-m', 'solution_message_broker.worker'])
-        workers.append(proc)
-    
-    for proc in workers:
-        proc.wait(timeout=300)
+    # Workers nascem do forkserver com core e as métricas já importados,
+    # em vez de um novo interpretador cada
+    context = get_context()
+    with profiler.stage("workers"):
+        workers = []
+        placement = plan_placement(num_workers)
+        trace_dir = allocation_trace_dir()
+        for index in range(num_workers):
+            proc = context.Process(target=worker_main, args=(profiler.enabled, trace_dir))
+            proc.start()
+            # Fixa o worker nas CPUs do plano (ASCE_PLACEMENT; padrão: sem fixar)
+            if placement:
+                pin_process(proc.pid, placement[index])
+            workers.append(proc)
+        
+        for proc in workers:
+            proc.join(timeout=300)
 
     all_found_anomalies = []
+    sketches = DistributionSketches()
     
     connection = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
     channel = connection.channel()
     for method_frame, properties, body in channel.consume('result_queue', inactivity_timeout=5):
         if method_frame is None: break
-        result = json.loads(body)
-        if result.get("found_anomalies"):
-            all_found_anomalies.extend(result["found_anomalies"])
+        with profiler.stage("merge"):
+            result = json.loads(body)
+            # Os workers trabalham com timestamps inteiros; volta para ISO só na saída
+            for anomaly in result.get("found_anomalies", ()):
+                anomaly["timestamp"] = format_iso_us(anomaly["timestamp"])
+                all_found_anomalies.append(anomaly)
+            sketches.merge(result.get("sketches"))
+        profiler.merge(result.get("profile"))
         channel.basic_ack(delivery_tag=method_frame.delivery_tag)
     
     connection.close()
+    with profiler.stage("sketches"):
+        write_distribution_report(sketches, DISTRIBUTIONS_FILE)
     end_time = time.perf_counter()
     
     return (end_time - start_time), all_found_anomalies
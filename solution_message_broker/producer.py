@@ -2,10 +2,13 @@ import pika
 import csv
 import json
 
-def run_producer(data_path: str) -> int:
+from core.profiling import get_profiler
+
+def run_producer(data_path: str, profiler=None) -> int:
     """
     Lê o arquivo CSV e publica cada linha como uma mensagem na fila de tarefas.
     """
+    profiler = profiler or get_profiler(False)
     message_count = 0
     try:
         connection = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
@@ -18,14 +21,17 @@ def run_producer(data_path: str) -> int:
         with open(data_path, 'r', newline='') as csvfile:
             reader = csv.DictReader(csvfile)
             for row in reader:
-                message_body = json.dumps(row)
-                channel.basic_publish(
-                    exchange='',
-                    routing_key='task_queue',
-                    body=message_body,
-                    properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
-                )
+                with profiler.stage("serialize"):
+                    message_body = json.dumps(row)
+                with profiler.stage("ipc"):
+                    channel.basic_publish(
+                        exchange='',
+                        routing_key='task_queue',
+                        body=message_body,
+                        properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
+                    )
                 message_count += 1
+        profiler.count("published_messages", message_count)
         
         print(f"Producer: {message_count} mensagens publicadas.")
         connection.close()
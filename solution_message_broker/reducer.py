@@ -1,16 +1,18 @@
 import pika
 import json
 import os
-import sys
 from collections import defaultdict
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.metrics import calculate_moving_averages, count_multi_sensor_anomaly_periods
+from core.models import EventBatch, merge_by_time
+from core.profiling import profiler_from_env
+from core.timestamps import format_iso_us, parse_iso_us
 
 ANOMALY_OUTPUT_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'broker_found_anomalies.json')
 
 def main():
     reducer_id = os.getpid()
+    profiler = profiler_from_env()
     print(f"[*] Reducer {reducer_id}: Iniciando.")
 
     try:
@@ -18,19 +20,30 @@ def main():
         channel = connection.channel()
         channel.queue_declare(queue='results_queue', durable=True)
         
-        station_events = defaultdict(list)
-        region_events = defaultdict(list)
+        station_events = defaultdict(EventBatch)
+        # Por região e estação, para intercalar as estações sem reordenar a região
+        region_events = defaultdict(lambda: defaultdict(EventBatch))
+        station_anomalies = defaultdict(list)
         
         print(f"[*] Reducer {reducer_id}: Consumindo dados da 'results_queue'...")
         
         for method_frame, properties, body in channel.consume('results_queue', inactivity_timeout=10):
             if method_frame is None: break
             
-            event = json.loads(body)
-            station_events[event['station_id']].append(event)
-            
-            if not event['is_anomaly']:
-                 region_events[event['region']].append(event)
+            with profiler.stage("parse"):
+                message = json.loads(body)
+                station_id = message['station_id']
+                event_fields = (parse_iso_us(message['timestamp']), station_id, message['region'],
+                                message['temperature'], message['humidity'], message['pressure'])
+            with profiler.stage("group"):
+                station_events[station_id].append(*event_fields)
+                
+                if message['is_anomaly']:
+                    station_anomalies[station_id].append(
+                        {"timestamp": event_fields[0], "station_id": station_id, "sensor": message['anomaly_sensor']}
+                    )
+                else:
+                    region_events[message['region']][station_id].append(*event_fields)
             
             channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
@@ -40,20 +53,30 @@ def main():
         all_found_anomalies = []
 
         for station_id, events in station_events.items():
-            events.sort(key=lambda x: x['timestamp'])
+            with profiler.stage("sort"):
+                events.sort_by_time()
+                anomalies = sorted(station_anomalies[station_id], key=lambda anom: anom['timestamp'])
             
-            # Coleta as anomalias desta estação
-            station_anomalies = [e for e in events if e.get('is_anomaly')]
-            all_found_anomalies.extend(station_anomalies)
+            with profiler.stage("metrics"):
+                # Coleta as anomalias desta estação
+                all_found_anomalies.extend(anomalies)
 
-            final_report["station_metrics"][station_id] = {
-                'anomaly_percentage': (len(station_anomalies) / len(events)) * 100 if events else 0,
-                'multi_sensor_periods': count_multi_sensor_anomaly_periods(events)
-            }
+                final_report["station_metrics"][station_id] = {
+                    'anomaly_percentage': (len(anomalies) / len(events)) * 100 if events else 0,
+                    'multi_sensor_periods': count_multi_sensor_anomaly_periods(events)
+                }
         
-        for region, events in region_events.items():
-            events.sort(key=lambda x: x['timestamp'])
-            final_report["region_metrics"][region] = calculate_moving_averages(events, window_size=50)
+        for region, station_batches in region_events.items():
+            with profiler.stage("sort"):
+                for events in station_batches.values():
+                    events.sort_by_time()
+            with profiler.stage("metrics"):
+                final_report["region_metrics"][region] = calculate_moving_averages(
+                    merge_by_time(station_batches.values()), window_size=50
+                )
+
+        if profiler.enabled:
+            final_report["profile"] = profiler.to_dict()
 
         # Salva o relatório completo para análise posterior
         with open('data/final_report_broker.json', 'w') as f:
@@ -61,7 +84,7 @@ def main():
 
         # Apenas os campos necessários para a verificação de corretude
         anomaly_list_for_processor = [
-            {"timestamp": anom['timestamp'], "station_id": anom['station_id'], "sensor": anom['anomaly_sensor']}
+            {"timestamp": format_iso_us(anom['timestamp']), "station_id": anom['station_id'], "sensor": anom['sensor']}
             for anom in all_found_anomalies
         ]
         with open(ANOMALY_OUTPUT_FILE, 'w') as f:
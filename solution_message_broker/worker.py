@@ -1,14 +1,27 @@
 import pika
 import json
 import os
-import sys
+import time
 from collections import defaultdict
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.metrics import is_anomalous, calculate_moving_averages, count_multi_sensor_anomaly_periods
+from core.models import EventBatch
+from core.profiling import get_profiler, profiler_from_env
+from core.resources import AllocationTracer
+from core.sketches import DistributionSketches
+from core.timestamps import parse_iso_us
 
-def main():
+def main(profile_enabled: bool | None = None, trace_dir: str | None = None):
+    """
+    Consome a fila de tarefas, agrega localmente e publica o resultado.
+    Sem `profile_enabled`, a instrumentação segue a variável `ASCE_PROFILE`
+    (execução com `python -m solution_message_broker.worker`). `trace_dir`
+    é o `allocation_trace_dir()` do coordenador.
+    """
     worker_id = os.getpid()
+    profiler = profiler_from_env() if profile_enabled is None else get_profiler(profile_enabled)
+    tracer = AllocationTracer(output_dir=trace_dir)
+    tracer.start()
     print(f"[*] Aggregating Worker {worker_id}: Iniciando.")
     try:
         connection = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
@@ -16,57 +29,68 @@ def main():
         channel.queue_declare(queue='task_queue', durable=True)
         channel.queue_declare(queue='result_queue', durable=True)
         
-        station_events = defaultdict(list)
+        station_events = defaultdict(EventBatch)
         
         # Consome o máximo de mensagens que conseguir da fila
+        consume_start = time.perf_counter()
         for method_frame, properties, body in channel.consume('task_queue', inactivity_timeout=3):
             if method_frame is None: break
+            profiler.add_time("ipc", time.perf_counter() - consume_start)
             
-            event = json.loads(body)
-            try:
-                # Converte tipos de dados
-                event['station_id'] = int(event['station_id'])
-                event['temperature'] = float(event['temperature'])
-                event['humidity'] = float(event['humidity'])
-                event['pressure'] = float(event['pressure'])
-                station_events[event['station_id']].append(event)
-            except (ValueError, KeyError):
-                pass 
-            finally:
-                channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+            with profiler.stage("parse"):
+                row = json.loads(body)
+                try:
+                    # Converte tipos de dados; o timestamp vira inteiro (microssegundos)
+                    station_id = int(row['station_id'])
+                    station_events[station_id].append(
+                        parse_iso_us(row['timestamp']), station_id, row['region'],
+                        float(row['temperature']), float(row['humidity']), float(row['pressure'])
+                    )
+                    profiler.count("events")
+                except (ValueError, KeyError):
+                    profiler.count("malformed_rows")
+            channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+            consume_start = time.perf_counter()
         
         print(f"[*] Worker {worker_id}: Mensagens consumidas. Agregando localmente...")
         
         worker_station_report = {}
         worker_region_report = defaultdict(list)
         worker_found_anomalies = []
+        sketches = DistributionSketches()
 
         for station_id, events in station_events.items():
-            events.sort(key=lambda x: x['timestamp'])
-            region_name = events[0]['region']
+            with profiler.stage("sort"):
+                events.sort_by_time()
+            region_name = events[0].region
             anomalies_in_station = []
 
-            for event in events:
-                anomaly_found, sensor = is_anomalous(event)
-                if anomaly_found:
-                    anomalies_in_station.append(event)
-                    worker_found_anomalies.append({
-                        "timestamp": event['timestamp'],
-                        "station_id": event['station_id'],
-                        "sensor": sensor
-                    })
-                else:
-                    worker_region_report[region_name].append(event)
-            
-            worker_station_report[station_id] = {
-                "total_events": len(events),
-                "anomaly_events": len(anomalies_in_station),
-                "multi_sensor_periods": count_multi_sensor_anomaly_periods(events)
-            }
+            with profiler.stage("metrics"):
+                for event in events:
+                    anomaly_found, sensor = is_anomalous(event)
+                    if anomaly_found:
+                        anomalies_in_station.append(event)
+                        worker_found_anomalies.append({
+                            "timestamp": event.timestamp,
+                            "station_id": event.station_id,
+                            "sensor": sensor
+                        })
+                    else:
+                        worker_region_report[region_name].append(event)
+                        sketches.add(region_name, station_id, event.temperature, event.humidity, event.pressure)
+                
+                worker_station_report[station_id] = {
+                    "total_events": len(events),
+                    "anomaly_events": len(anomalies_in_station),
+                    "multi_sensor_periods": count_multi_sensor_anomaly_periods(events)
+                }
+        profiler.count("anomalies", len(worker_found_anomalies))
         
         final_result = {
             "station_metrics": worker_station_report,
-            "found_anomalies": worker_found_anomalies
+            "found_anomalies": worker_found_anomalies,
+            "sketches": sketches.to_dict(),
+            "profile": profiler.to_dict()
         }
         channel.basic_publish(
             exchange='',
@@ -75,6 +99,7 @@ def main():
         )
         
         connection.close()
+        tracer.stop()
         print(f"[*] Worker {worker_id}: Resultado agregado enviado. Encerrando.")
     except Exception as e:
         print(f"Worker {worker_id} Error: {e}")
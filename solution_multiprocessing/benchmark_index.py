@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+from core.profiling import get_profiler
+from core.timestamps import MICROS_PER_HOUR
+from .station_index import build_station_index, default_index_path, run_filtered_analysis
+
+
+def run_index_benchmark(data_path: str, num_workers: int = 4) -> dict:
+    """
+    Mede o tempo de construção e o tamanho do índice lateral e compara, para
+    consultas seletivas, a leitura só dos intervalos do índice com a leitura
+    do arquivo inteiro filtrada linha a linha.
+    """
+    csv_bytes = os.path.getsize(data_path)
+    build_start = time.perf_counter()
+    index = build_station_index(data_path, num_workers)
+    build_seconds = time.perf_counter() - build_start
+    index_bytes = os.path.getsize(default_index_path(data_path))
+    print(f"Índice: {build_seconds:.3f} s para construir, {index_bytes / 1024:.1f} KB "
+          f"({index_bytes / csv_bytes:.2%} do CSV), {len(index.entries)} chaves (estação, hora).\n")
+
+    stations = index.stations()
+    last_bucket = max(bucket for _, bucket in index.entries)
+    queries = {
+        "1 estação": (stations[:1], None),
+        "5 estações": (stations[:5], None),
+        "1 estação, últimas 3 h": (stations[:1], last_bucket - 2 * MICROS_PER_HOUR),
+        "todas as estações": (None, None),
+    }
+    results = {}
+    for name, (station_ids, start_us) in queries.items():
+        timings = {}
+        for use_index in (False, True):
+            profiler = get_profiler(True)
+            exec_time, anomalies = run_filtered_analysis(
+                data_path, num_workers, station_ids, start_us, profiler=profiler, use_index=use_index
+            )
+            timings[use_index] = (exec_time, profiler.counters["bytes_read"], len(anomalies))
+        (scan_time, _, scan_found), (index_time, index_read, index_found) = timings[False], timings[True]
+        results[name] = {"scan_s": scan_time, "index_s": index_time, "bytes_fraction": index_read / csv_bytes}
+        print(f"{name:>24}: varredura {scan_time:7.4f} s | índice {index_time:7.4f} s "
+              f"({scan_time / index_time:5.1f}x) | lidos {index_read / csv_bytes:6.1%} do arquivo "
+              f"| anomalias {index_found}{'' if index_found == scan_found else ' (DIVERGE)'}")
+    return {"build_s": build_seconds, "index_bytes": index_bytes, "queries": results}
+
+
+if __name__ == "__main__":
+    DATA_FILE = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic_data.csv"
+    NUM_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    run_index_benchmark(DATA_FILE, NUM_WORKERS)
@@ -0,0 +1,73 @@
+import gc
+import sys
+import tracemalloc
+
+from core.models import EventBatch, MeteorologicalEvent
+from core.timestamps import format_iso_us
+from .data_parser import EVENT_FIELDS, parse_event_bytes
+
+
+# Cada construtor parte dos bytes crus, então o que fica retido ao final
+# (floats, strings, objetos) pertence só àquela representação.
+
+def build_dicts(buffer: bytes) -> list[dict]:
+    """Representação anterior: um dicionário de 6 chaves por evento, timestamp em ISO."""
+    rows, _ = parse_event_bytes(buffer)
+    return [dict(zip(EVENT_FIELDS, (format_iso_us(row[0]),) + row[1:])) for row in rows]
+
+
+def build_records(buffer: bytes) -> list[MeteorologicalEvent]:
+    rows, _ = parse_event_bytes(buffer)
+    return [MeteorologicalEvent(*row) for row in rows]
+
+
+def build_batch(buffer: bytes) -> EventBatch:
+    rows, _ = parse_event_bytes(buffer)
+    batch = EventBatch()
+    for row in rows:
+        batch.append(*row)
+    return batch
+
+
+def measure_retained_bytes(build, buffer: bytes) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    result = build(buffer)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, len(result)
+
+
+def run_memory_benchmark(data_path: str, num_events: int = 200_000) -> dict[str, float]:
+    """
+    Mede a memória retida por ~`num_events` eventos (o conteúdo do arquivo é
+    repetido se tiver menos linhas) em cada representação e extrapola para
+    1 milhão de eventos.
+    """
+    with open(data_path, 'rb') as f:
+        f.readline()
+        body = f.read()
+    lines = body.count(b'\n')
+    if not lines:
+        print("Arquivo de dados vazio ou não encontrado.")
+        return {}
+    buffer = body * max(1, num_events // lines)
+
+    representations = {
+        "dict por evento": build_dicts,
+        "MeteorologicalEvent (__slots__)": build_records,
+        "EventBatch (colunas)": build_batch,
+    }
+    results = {}
+    for name, build in representations.items():
+        retained, count = measure_retained_bytes(build, buffer)
+        per_million_mb = retained / count * 1_000_000 / (1024 * 1024)
+        results[name] = per_million_mb
+        print(f"{name:>32}: {per_million_mb:8.1f} MB por milhão de eventos")
+    return results
+
+
+if __name__ == "__main__":
+    DATA_FILE = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic_data.csv"
+    run_memory_benchmark(DATA_FILE)
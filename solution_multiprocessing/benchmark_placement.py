@@ -0,0 +1,57 @@
+import os
+import statistics
+import sys
+
+from core.placement import PLACEMENT_ENV_VAR, PLACEMENT_MODES, available_cpu_count, placement_summary
+from core.resources import ResourceSampler
+from .processor import run_analysis
+
+
+def run_placement_benchmark(data_path: str, num_workers: int | None = None, repeats: int = 5) -> dict:
+    """
+    Executa a análise `repeats` vezes em cada política de ASCE_PLACEMENT e
+    compara média, desvio padrão e coeficiente de variação dos tempos: fixar
+    os workers costuma reduzir mais a variância (migrações, caches frios,
+    acessos a memória remota) do que o tempo médio.
+    """
+    num_workers = num_workers or available_cpu_count()
+    summary = placement_summary()
+    print(f"CPUs: os.cpu_count()={summary['os_cpu_count']}, afinidade={len(summary['usable_cpus'])}, "
+          f"cota do cgroup={summary['cgroup_quota']}, disponíveis={summary['available_cpus']} | "
+          f"{summary['physical_cores']} núcleo(s) físico(s), {summary['numa_nodes']} nó(s) NUMA.")
+    print(f"{num_workers} workers, {repeats} execuções por política.\n")
+
+    previous_mode = os.environ.get(PLACEMENT_ENV_VAR)
+    results = {}
+    try:
+        for mode in PLACEMENT_MODES:
+            os.environ[PLACEMENT_ENV_VAR] = mode
+            timings, switches = [], []
+            for _ in range(repeats):
+                with ResourceSampler() as sampler:
+                    exec_time, _ = run_analysis(data_path, num_workers, use_cache=False)
+                timings.append(exec_time)
+                switches.append(sampler.report()["involuntary_ctx_switches"])
+            mean = statistics.mean(timings)
+            stdev = statistics.stdev(timings) if len(timings) > 1 else 0.0
+            results[mode] = {
+                "mean_s": mean, "stdev_s": stdev, "cv": stdev / mean if mean else 0.0,
+                "min_s": min(timings), "max_s": max(timings),
+                "involuntary_ctx_switches": statistics.mean(switches),
+            }
+            print(f"{mode:>5}: média {mean:.4f} s ± {stdev:.4f} (CV {results[mode]['cv']:6.2%}) | "
+                  f"mín {min(timings):.4f} s, máx {max(timings):.4f} s | "
+                  f"trocas de contexto (invol.) {results[mode]['involuntary_ctx_switches']:.0f}")
+    finally:
+        if previous_mode is None:
+            os.environ.pop(PLACEMENT_ENV_VAR, None)
+        else:
+            os.environ[PLACEMENT_ENV_VAR] = previous_mode
+    return {"summary": summary, "num_workers": num_workers, "modes": results}
+
+
+if __name__ == "__main__":
+    DATA_FILE = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic_data.csv"
+    NUM_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    REPEATS = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    run_placement_benchmark(DATA_FILE, NUM_WORKERS, REPEATS)
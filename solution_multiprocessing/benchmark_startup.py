@@ -0,0 +1,100 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from core.startup import get_context
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Módulos que o dashboard e os workers importam, do mais leve ao mais pesado
+IMPORT_TARGETS = [
+    "core.rules",
+    "solution_multiprocessing.processor",
+    "solution_message_broker.processor",
+    "solution_spark.processor",
+    "pandas",
+    "streamlit",
+]
+
+
+def import_time_report(module: str, top: int = 5) -> dict:
+    """
+    Importa `module` num interpretador novo com `-X importtime` e retorna o
+    tempo acumulado do import (ms) e os `top` submódulos com maior tempo
+    próprio.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    if completed.returncode != 0:
+        return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+    total_us = next((cumulative for name, _, cumulative in entries if name == module), 0)
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "slowest": [(name, round(self_us / 1000, 1)) for name, self_us, _ in slowest],
+    }
+
+
+def _worker_ready(_) -> int:
+    # O que uma tarefa real precisa ter importado antes de começar
+    import solution_multiprocessing.processor  # noqa: F401
+    return os.getpid()
+
+
+def spawn_latency(method: str, num_workers: int, repeats: int = 3) -> dict:
+    """
+    Tempo até um pool de `num_workers` processos responder uma tarefa por
+    worker, já com o processador importado. A primeira medição ("fria")
+    inclui iniciar o forkserver e importar os módulos pré-carregados; as
+    demais ("quentes") mostram o custo de cada novo pool.
+    """
+    context = get_context(method)
+    timings = []
+    for _ in range(repeats + 1):
+        start_time = time.perf_counter()
+        with context.Pool(processes=num_workers) as pool:
+            pool.map(_worker_ready, range(num_workers), chunksize=1)
+        timings.append(time.perf_counter() - start_time)
+    return {
+        "method": method,
+        "cold_ms": round(timings[0] * 1000, 1),
+        "warm_ms": round(statistics.median(timings[1:]) * 1000, 1),
+    }
+
+
+def run_startup_benchmark(num_workers: int = 4) -> dict:
+    print("Tempo de import (interpretador novo, -X importtime):")
+    imports = []
+    for module in IMPORT_TARGETS:
+        report = import_time_report(module)
+        imports.append(report)
+        if "error" in report:
+            print(f"{module:>36}: indisponível ({report['error']})")
+            continue
+        slowest = ", ".join(f"{name} {ms:.1f}" for name, ms in report["slowest"][:3])
+        print(f"{module:>36}: {report['total_ms']:8.1f} ms | mais lentos (ms próprios): {slowest}")
+
+    print(f"\nLatência para {num_workers} workers ficarem prontos:")
+    spawns = []
+    for method in ("fork", "forkserver", "spawn"):
+        report = spawn_latency(method, num_workers)
+        spawns.append(report)
+        print(f"{method:>12}: fria {report['cold_ms']:7.1f} ms | quente {report['warm_ms']:7.1f} ms")
+    return {"imports": imports, "spawn": spawns}
+
+
+if __name__ == "__main__":
+    NUM_WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    run_startup_benchmark(NUM_WORKERS)
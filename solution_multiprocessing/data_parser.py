@@ -1,7 +1,19 @@
 import os
 import csv
+import sys
 from collections import defaultdict
 
+from core.models import EventBatch, merge_by_time
+from core.timestamps import parse_iso_us
+
+# Esquema fixo do CSV gerado por data_generator.generator
+EVENT_FIELDS = ("timestamp", "station_id", "region", "temperature", "humidity", "pressure")
+
+# Limites do tamanho automático dos pedaços (ver auto_chunk_count)
+MIN_CHUNK_BYTES = 256 * 1024
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+TASKS_PER_WORKER = 4
+
 def get_file_chunks(data_path: str, num_chunks: int) -> list[tuple[int, int]]:
     """
     Calculates byte offsets for splitting a file into chunks without loading it.
@@ -32,60 +44,157 @@ def get_file_chunks(data_path: str, num_chunks: int) -> list[tuple[int, int]]:
                 
     return chunks
 
-def load_and_group_by_station(data_path: str) -> dict[int, list[dict]]:
+def auto_chunk_count(file_size: int, num_workers: int) -> int:
+    """
+    Chooses how many chunks to cut a file into for `num_workers` processes.
+
+    Aims at TASKS_PER_WORKER chunks per worker, so a slow chunk can be
+    balanced by the others, without going below MIN_CHUNK_BYTES per chunk
+    (where per-task overhead dominates) or above MAX_CHUNK_BYTES (bounding
+    per-task memory on large files). Never fewer chunks than workers.
+    """
+    balanced = max(num_workers * TASKS_PER_WORKER, -(-file_size // MAX_CHUNK_BYTES))
+    return max(num_workers, min(balanced, -(-file_size // MIN_CHUNK_BYTES)))
+
+def read_byte_range(data_path: str, start_byte: int, end_byte: int) -> bytes:
+    """Reads the raw bytes of a chunk returned by `get_file_chunks`."""
+    with open(data_path, 'rb') as f:
+        f.seek(start_byte)
+        return f.read(end_byte - start_byte)
+
+def read_byte_ranges(data_path: str, ranges) -> bytes:
+    """
+    Reads and concatenates several (start_byte, end_byte) ranges, each made
+    of whole lines (e.g. from `station_index.StationIndex.ranges`).
+    """
+    parts = []
+    with open(data_path, 'rb') as f:
+        for start_byte, end_byte in ranges:
+            f.seek(start_byte)
+            parts.append(f.read(end_byte - start_byte))
+    return b''.join(parts)
+
+def filter_rows(rows: list[tuple], station_ids=None, start_us: int | None = None, end_us: int | None = None) -> list[tuple]:
+    """
+    Keeps the parsed rows of the given stations (None = all) whose timestamp
+    falls in [start_us, end_us) (None = unbounded).
+    """
+    if station_ids is None and start_us is None and end_us is None:
+        return rows
+    low = start_us if start_us is not None else -(1 << 63)
+    high = end_us if end_us is not None else 1 << 63
+    return [
+        row for row in rows
+        if (station_ids is None or row[1] in station_ids) and low <= row[0] < high
+    ]
+
+def _parse_quoted_line(line: bytes) -> list[str] | None:
+    # Slow path: only lines containing quotes (e.g. a region name with a comma)
+    # go through the csv module.
+    try:
+        text = line.decode()
+    except UnicodeDecodeError:
+        return None
+    for fields in csv.reader([text]):
+        return fields if len(fields) == len(EVENT_FIELDS) else None
+    return None
+
+def parse_event_bytes(buffer: bytes) -> tuple[list[tuple], int]:
+    """
+    Parses raw CSV bytes with the fixed event schema, splitting lines and
+    fields directly on bytes instead of going through csv.reader and one dict
+    per row. Region names are decoded and interned once per distinct value.
+
+    Returns:
+        A list of (timestamp, station_id, region, temperature, humidity,
+        pressure) tuples with typed values (timestamps as UTC epoch
+        microseconds, see core.timestamps), and the number of malformed lines
+        skipped. The header line and blank lines are ignored without being
+        counted.
+    """
+    rows = []
+    append = rows.append
+    regions = {}
+    malformed = 0
+
+    for line in buffer.split(b'\n'):
+        fields = line.split(b',')
+        if len(fields) != 6:
+            if b'"' in line and (quoted := _parse_quoted_line(line)) is not None:
+                fields = [field.encode() for field in quoted]
+            else:
+                if line.strip():
+                    malformed += 1
+                continue
+
+        timestamp, station_id, region, temperature, humidity, pressure = fields
+        try:
+            region_name = regions.get(region)
+            if region_name is None:
+                # UnicodeDecodeError is a ValueError: invalid UTF-8 counts as malformed
+                region_name = regions[region] = sys.intern(region.decode())
+            # int() and float() accept bytes and ignore surrounding whitespace (e.g. '\r')
+            row = (parse_iso_us(timestamp), int(station_id), region_name,
+                   float(temperature), float(humidity), float(pressure))
+        except ValueError:
+            if timestamp != b'timestamp':
+                malformed += 1
+            continue
+        append(row)
+
+    return rows, malformed
+
+def load_and_group_by_station(data_path: str) -> dict[int, EventBatch]:
     """
     Loads data from a CSV file and groups it by station_id without pandas.
 
     Returns:
-        A dictionary where keys are station_ids and values are lists of 
-        event dictionaries for that station.
+        A dictionary where keys are station_ids and values are columnar
+        `EventBatch`es with the events of that station.
     """
-    station_groups = defaultdict(list)
+    station_groups = defaultdict(EventBatch)
     
     try:
-        with open(data_path, 'r', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Manually convert data types from string to numeric
-                try:
-                    event = {
-                        'timestamp': row['timestamp'],
-                        'station_id': int(row['station_id']),
-                        'region': row['region'],
-                        'temperature': float(row['temperature']),
-                        'humidity': float(row['humidity']),
-                        'pressure': float(row['pressure']),
-                    }
-                    station_groups[event['station_id']].append(event)
-                except (ValueError, KeyError) as e:
-                    print(f"Warning: Skipping malformed row: {row}. Error: {e}")
-
+        rows, malformed = parse_event_bytes(read_byte_range(data_path, 0, os.path.getsize(data_path)))
     except FileNotFoundError:
         # Return an empty dict and let the processor handle the error message
         return {}
 
+    if malformed:
+        print(f"Warning: Skipped {malformed} malformed row(s).")
+
+    for row in rows:
+        station_groups[row[1]].append(*row)
+
     return station_groups
 
-def load_and_group_by_region(data_path: str) -> dict[str, list[dict]]:
+def load_and_group_by_region(data_path: str) -> dict[str, EventBatch]:
     """
-    Carrega dados de um arquivo CSV, agrupa por região e ordena por timestamp.
+    Carrega dados de um arquivo CSV, agrupa por região e ordena por timestamp
+    (inteiro, em microssegundos).
+
+    Cada estação é ordenada isoladamente (o que é só uma verificação linear se
+    o arquivo já vier ordenado) e as estações de uma região são intercaladas
+    por k-way merge, sem reordenar a região inteira.
     """
-    region_groups = defaultdict(list)
+    region_groups = {}
     
     # Reutilizamos a lógica de carregamento da função anterior
     station_groups = load_and_group_by_station(data_path)
     if not station_groups:
         return {}
 
-    # Desagrupa os dados das estações e reagrupa por região
-    all_events = []
-    for station_id in station_groups:
-        all_events.extend(station_groups[station_id])
+    stations_by_region = defaultdict(list)
+    for batch in station_groups.values():
+        batch.sort_by_time()
+        for region in batch.regions:
+            stations_by_region[region].append(batch)
 
-    for event in all_events:
-        region_groups[event['region']].append(event)
-        
-    for region in region_groups:
-        region_groups[region].sort(key=lambda x: x['timestamp'])
+    for region, batches in stations_by_region.items():
+        region_batch = EventBatch()
+        for event in merge_by_time(batches):
+            if event.region == region:
+                region_batch.append_event(event)
+        region_groups[region] = region_batch
         
     return region_groups
\ No newline at end of file
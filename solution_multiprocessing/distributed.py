@@ -0,0 +1,378 @@
+import argparse
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from multiprocessing.managers import BaseManager
+
+from core.cache import cached_analysis
+from core.placement import available_cpu_count, pin_process, plan_placement
+from core.profiling import get_profiler
+from core.resources import allocation_trace_dir
+from core.startup import get_context
+from .data_parser import auto_chunk_count, get_file_chunks
+from .processor import merge_chunk_result, process_file_chunk
+
+DEFAULT_PORT = 50000
+# Chave compartilhada entre coordenador e agentes; defina a mesma variável de
+# ambiente em todos os nós. O gerenciador desserializa (pickle) o que chega
+# pela porta, então a chave é obrigatória e não tem valor padrão.
+AUTHKEY_ENV_VAR = "ASCE_AUTHKEY"
+# Intervalo com que um agente ocioso volta a consultar a fila de tarefas, e
+# com que um agente ocupado manda sinal de vida
+POLL_SECONDS = 1.0
+# Sem sinal de vida por esse tempo, o agente é dado como perdido e o pedaço
+# que ele processava volta para a fila
+AGENT_TIMEOUT_SECONDS = 30.0
+# Um pedaço que derruba agentes mais vezes que isso aborta a análise
+MAX_ATTEMPTS = 3
+# Resposta de `TaskBoard.claim` quando a análise acabou
+STOP = "stop"
+
+
+class TaskBoard:
+    """
+    Fila de descritores de pedaços (data_path, start_byte, end_byte,
+    profile_enabled, trace_dir) que vive no servidor do gerenciador, com o
+    registro de qual pedaço cada agente está processando e do último sinal de
+    vida de cada um. Retirar um pedaço e registrá-lo como do agente é uma
+    operação só, então nenhum pedaço se perde se o agente morrer no meio.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._claims = {}
+        self._heartbeats = {}
+        self._closed = False
+
+    def put(self, task_id: int, task: tuple):
+        with self._lock:
+            self._pending.append((task_id, task))
+
+    def claim(self, agent_id: str):
+        """Próximo (task_id, descritor) para `agent_id`, None se a fila está vazia ou STOP."""
+        with self._lock:
+            self._heartbeats[agent_id] = time.monotonic()
+            if self._closed:
+                return STOP
+            if not self._pending:
+                return None
+            item = self._claims[agent_id] = self._pending.popleft()
+            return item
+
+    def heartbeat(self, agent_id: str):
+        with self._lock:
+            self._heartbeats[agent_id] = time.monotonic()
+
+    def release(self, agent_id: str):
+        with self._lock:
+            self._claims.pop(agent_id, None)
+
+    def requeue_lost(self, timeout: float, dead_agents=()) -> list[int]:
+        """
+        Esquece os agentes em `dead_agents` ou sem sinal de vida há `timeout`
+        segundos e devolve ao início da fila os pedaços que eles tinham
+        retirado. Retorna os ids desses pedaços.
+        """
+        now = time.monotonic()
+        requeued = []
+        with self._lock:
+            lost = [agent_id for agent_id, beat in self._heartbeats.items()
+                    if agent_id in dead_agents or now - beat > timeout]
+            for agent_id in lost:
+                del self._heartbeats[agent_id]
+                item = self._claims.pop(agent_id, None)
+                if item is not None:
+                    self._pending.appendleft(item)
+                    requeued.append(item[0])
+        return requeued
+
+    def agents(self) -> list[str]:
+        with self._lock:
+            return list(self._heartbeats)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+
+# Estado que vive no processo servidor do gerenciador
+_board = None
+_results = None
+
+
+def _get_board():
+    global _board
+    if _board is None:
+        _board = TaskBoard()
+    return _board
+
+
+def _get_results():
+    global _results
+    if _results is None:
+        _results = queue.Queue()
+    return _results
+
+
+class WorkManager(BaseManager):
+    """
+    Gerenciador TCP que expõe aos agentes o quadro de pedaços (`TaskBoard`) e
+    a fila de resultados parciais (task_id, resultado).
+    """
+
+
+WorkManager.register("get_board", callable=_get_board)
+WorkManager.register("get_results", callable=_get_results)
+
+
+def get_authkey() -> bytes | None:
+    """Chave de `ASCE_AUTHKEY`, ou None se a variável não está definida."""
+    key = os.environ.get(AUTHKEY_ENV_VAR)
+    return key.encode() if key else None
+
+
+def generate_authkey() -> bytes:
+    return secrets.token_hex(16).encode()
+
+
+def run_agent(address: tuple[str, int], authkey: bytes | None = None, data_path: str | None = None) -> int:
+    """
+    Agente worker: retira descritores de pedaços do `TaskBoard` do
+    coordenador, processa cada um com `process_file_chunk` e devolve o
+    resultado parcial. Com a fila vazia (`claim` devolve None), espera
+    `POLL_SECONDS` e tenta de novo; termina ao receber `STOP` ou quando o
+    coordenador encerra. Retorna o número de pedaços processados.
+
+    `data_path` substitui o caminho do descritor, para nós que têm sua própria
+    cópia do arquivo em outro local; sem ele, o arquivo precisa estar no mesmo
+    caminho em todos os nós (ex.: um volume compartilhado).
+    """
+    authkey = authkey or get_authkey()
+    if authkey is None:
+        raise ValueError(f"Defina {AUTHKEY_ENV_VAR} com a chave do coordenador.")
+    manager = WorkManager(address=address, authkey=authkey)
+    manager.connect()
+    board, results = manager.get_board(), manager.get_results()
+    agent_id = agent_name(os.getpid())
+
+    # Sinal de vida enquanto um pedaço é processado (o proxy abre uma conexão
+    # própria nesta thread)
+    stopped = threading.Event()
+
+    def send_heartbeats():
+        while not stopped.wait(POLL_SECONDS):
+            try:
+                board.heartbeat(agent_id)
+            except (EOFError, ConnectionError):
+                return
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+
+    processed = 0
+    try:
+        while True:
+            try:
+                item = board.claim(agent_id)
+            except (EOFError, ConnectionError):
+                break
+            if item == STOP:
+                break
+            if item is None:
+                time.sleep(POLL_SECONDS)
+                continue
+            task_id, task = item
+            if data_path is not None:
+                task = (data_path, *task[1:])
+            res = process_file_chunk(task)
+            res["worker"]["agent"] = agent_id
+            try:
+                results.put((task_id, res))
+                board.release(agent_id)
+            except (EOFError, ConnectionError):
+                break
+            processed += 1
+    finally:
+        stopped.set()
+    return processed
+
+
+def agent_name(pid: int) -> str:
+    return f"{socket.gethostname()}:{pid}"
+
+
+def run_coordinator(data_path: str, num_agents: int, profiler=None, address: tuple[str, int] = ("127.0.0.1", 0),
+                    authkey: bytes | None = None, local_agents: bool = True) -> tuple[float, list]:
+    """
+    Publica os pedaços do arquivo num `WorkManager` em `address` e incorpora os
+    resultados parciais à medida que os agentes os devolvem.
+
+    Com `local_agents=True`, inicia `num_agents` agentes nesta máquina (modo de
+    teste em localhost). Caso contrário, espera que agentes remotos se
+    conectem (`python -m solution_multiprocessing.distributed agent ...`);
+    `num_agents` só dimensiona os pedaços.
+
+    Sem `authkey` nem `ASCE_AUTHKEY`, gera uma chave aleatória (suficiente
+    para os agentes locais, que a recebem diretamente). Pedaços de agentes
+    que morrem ou param de mandar sinal de vida voltam para a fila; agentes
+    locais mortos são substituídos.
+    """
+    profiler = profiler or get_profiler(False)
+    start_time = time.perf_counter()
+
+    with profiler.stage("chunking"):
+        num_chunks = auto_chunk_count(os.path.getsize(data_path), num_agents)
+        chunks = get_file_chunks(data_path, num_chunks)
+        # O diretório de rastreamento só existe nesta máquina: agentes
+        # remotos não rastreiam alocações
+        trace_dir = allocation_trace_dir() if local_agents else None
+        task_args = [(os.path.abspath(data_path), start, end, profiler.enabled, trace_dir) for start, end in chunks]
+
+    authkey = authkey or get_authkey() or generate_authkey()
+    manager = WorkManager(address=address, authkey=authkey, ctx=get_context())
+    manager.start()
+    agents = []
+    placement = plan_placement(num_agents) if local_agents else None
+
+    def start_agent(slot: int):
+        agent = get_context().Process(target=run_agent, args=(manager.address, authkey), daemon=True)
+        agent.start()
+        if placement:
+            pin_process(agent.pid, placement[slot])
+        return agent
+
+    try:
+        board, results = manager.get_board(), manager.get_results()
+        for task_id, task in enumerate(task_args):
+            board.put(task_id, task)
+
+        if local_agents:
+            agents = [start_agent(slot) for slot in range(num_agents)]
+
+        final_station_report = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "multi_sensor_periods": 0})
+        all_found_anomalies = []
+        agent_busy = defaultdict(float)
+        agent_tasks = defaultdict(int)
+        merge_seconds = 0.0
+
+        done = set()
+        attempts = defaultdict(lambda: 1)
+
+        pool_start = time.perf_counter()
+        while len(done) < len(task_args):
+            try:
+                task_id, res = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                dead = set()
+                for slot, agent in enumerate(agents):
+                    if not agent.is_alive():
+                        dead.add(agent_name(agent.pid))
+                        agents[slot] = start_agent(slot)
+                for task_id in board.requeue_lost(AGENT_TIMEOUT_SECONDS, dead):
+                    attempts[task_id] += 1
+                    if attempts[task_id] > MAX_ATTEMPTS:
+                        raise RuntimeError(f"O pedaço {task_args[task_id][1:3]} falhou em {MAX_ATTEMPTS} agentes.")
+                continue
+            # Um agente dado como perdido pode ainda entregar o pedaço que foi refeito
+            if task_id in done:
+                continue
+            done.add(task_id)
+            merge_start = time.perf_counter()
+            merge_chunk_result(res, final_station_report, all_found_anomalies, profiler)
+            agent_busy[res["worker"]["agent"]] += res["worker"]["busy_seconds"]
+            agent_tasks[res["worker"]["agent"]] += 1
+            merge_seconds += time.perf_counter() - merge_start
+        pool_elapsed = time.perf_counter() - pool_start
+        profiler.add_time("merge", merge_seconds)
+
+        # Agentes que pedirem o próximo pedaço recebem STOP; quem estiver
+        # ocupado com um pedaço repetido percebe o fim quando o gerenciador
+        # é desligado
+        board.close()
+        for agent in agents:
+            agent.join(timeout=AGENT_TIMEOUT_SECONDS)
+    finally:
+        manager.shutdown()
+
+    if profiler.enabled:
+        profiler.add_time("ipc/overhead", max(0.0, pool_elapsed - sum(agent_busy.values()) / num_agents))
+        profiler.count("chunks", len(task_args))
+        profiler.count("agents", len(agent_busy))
+        for agent_id, busy in sorted(agent_busy.items()):
+            profiler.record_worker(agent_id, busy, max(0.0, pool_elapsed - busy), agent_tasks[agent_id])
+
+    end_time = time.perf_counter()
+    return (end_time - start_time), all_found_anomalies
+
+
+@cached_analysis("multiprocessing-distributed", os.path.dirname(__file__))
+def run_distributed_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
+    """
+    Mesma interface de `run_analysis`, executando o coordenador TCP com
+    `num_workers` agentes locais. Serve para comparar, com o mesmo código de
+    processamento, o custo do protocolo de rede com o do `multiprocessing.Pool`,
+    do message broker e do Spark.
+    """
+    return run_coordinator(data_path, num_workers, profiler=profiler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Multi-node execution of the multiprocessing solution.")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="Publish the chunks and wait for remote agents.")
+    coordinator_parser.add_argument("--data", default=os.path.join("data", "synthetic_data.csv"), help="CSV file to analyse.")
+    coordinator_parser.add_argument("--host", default="127.0.0.1",
+                                    help="Interface to listen on (0.0.0.0 to accept remote agents).")
+    coordinator_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on.")
+    coordinator_parser.add_argument("--agents", type=int, default=4, help="Expected agent processes (sizes the chunks).")
+
+    agent_parser = subparsers.add_parser("agent", help="Pull chunks from a coordinator and process them.")
+    agent_parser.add_argument("--host", default="127.0.0.1", help="Coordinator host.")
+    agent_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Coordinator port.")
+    agent_parser.add_argument("--processes", type=int, default=available_cpu_count(), help="Agent processes on this node.")
+    agent_parser.add_argument("--data-path", default=None, help="Local copy of the CSV, if not at the coordinator's path.")
+
+    local_parser = subparsers.add_parser("local", help="Coordinator plus agents on localhost, for testing.")
+    local_parser.add_argument("--data", default=os.path.join("data", "synthetic_data.csv"), help="CSV file to analyse.")
+    local_parser.add_argument("--agents", type=int, default=4, help="Number of local agents.")
+    args = parser.parse_args()
+
+    if args.mode == "agent":
+        if get_authkey() is None:
+            parser.error(f"defina {AUTHKEY_ENV_VAR} com a chave impressa pelo coordenador")
+        agent_processes = [
+            get_context().Process(target=run_agent, args=((args.host, args.port), None, args.data_path))
+            for _ in range(args.processes)
+        ]
+        placement = plan_placement(args.processes)
+        for index, agent in enumerate(agent_processes):
+            agent.start()
+            if placement:
+                pin_process(agent.pid, placement[index])
+        for agent in agent_processes:
+            agent.join()
+    else:
+        profiler = get_profiler(True)
+        if args.mode == "coordinator":
+            authkey = get_authkey()
+            if authkey is None:
+                authkey = generate_authkey()
+                print(f"{AUTHKEY_ENV_VAR} não definida; chave gerada para esta execução:")
+                print(f"  export {AUTHKEY_ENV_VAR}={authkey.decode()}")
+            print(f"Aguardando agentes em {args.host}:{args.port}...")
+            execution_time, anomalies_found = run_coordinator(
+                args.data, args.agents, profiler=profiler, address=(args.host, args.port),
+                authkey=authkey, local_agents=False
+            )
+        else:
+            execution_time, anomalies_found = run_coordinator(args.data, args.agents, profiler=profiler)
+
+        print(f"Tempo de execução distribuída: {execution_time:.4f} segundos.")
+        print(f"Total de anomalias encontradas: {len(anomalies_found)}")
+        for agent_id, load in profiler.workers.items():
+            print(f"  {agent_id}: {load['tasks']} pedaços, ocupado {load['busy']:.3f}s, ocioso {load['idle']:.3f}s")
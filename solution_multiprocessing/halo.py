@@ -0,0 +1,252 @@
+import argparse
+import heapq
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from core.models import EventBatch, MeteorologicalEvent
+from core.profiling import get_profiler
+from core.placement import worker_pool
+from .data_parser import auto_chunk_count, get_file_chunks, load_and_group_by_region, parse_event_bytes, read_byte_range
+from .metrics import is_anomalous, moving_average_series
+from .out_of_core import SEGMENT_COLUMNS, SPILL_DIR_ENV_VAR
+
+SENSORS = ("temperature", "humidity", "pressure")
+# Amostras de timestamps por fatia, em cada corrida, usadas para escolher as fronteiras
+SAMPLES_PER_SLICE = 32
+
+
+def collect_region_runs(args: tuple) -> dict:
+    """
+    Fase 1 (worker): lê um pedaço de bytes do arquivo, ordena por tempo os
+    eventos não anômalos de cada região e os grava em `spill_dir`, um
+    segmento por região em colunas (timestamps, temperaturas, umidades,
+    pressões). Devolve, por região, (caminho, offset, quantidade, amostras),
+    sendo as amostras pares (posição, timestamp) a cada `stride` eventos,
+    para que o planejador escolha as fatias sem receber os eventos.
+    """
+    data_path, start_byte, end_byte, spill_dir, num_slices = args
+    rows, _ = parse_event_bytes(read_byte_range(data_path, start_byte, end_byte))
+    region_events = defaultdict(EventBatch)
+    for row in rows:
+        if not is_anomalous(MeteorologicalEvent(*row))[0]:
+            region_events[row[2]].append(*row)
+    del rows
+
+    runs = {}
+    path = os.path.join(spill_dir, f"run-{start_byte}.bin")
+    with open(path, 'wb') as f:
+        for region, events in sorted(region_events.items()):
+            events.sort_by_time()
+            count = len(events)
+            stride = max(1, count // (num_slices * SAMPLES_PER_SLICE))
+            samples = [(index, events.timestamps[index]) for index in range(0, count, stride)]
+            runs[region] = (path, f.tell(), count, samples)
+            for name, _ in SEGMENT_COLUMNS:
+                getattr(events, name).tofile(f)
+    return runs
+
+
+def plan_halo_slices(region_runs: dict[str, list], num_slices: int, window_size: int) -> list[tuple]:
+    """
+    Divide a série de cada região em até `num_slices` fatias de tempo com
+    quantidades parecidas de eventos, a partir das amostras de cada corrida
+    ordenada (um pedaço do arquivo) devolvidas pela fase 1. Para cada
+    fronteira e corrida, as amostras vizinhas delimitam o trecho em que está
+    o corte; a tarefa da fatia localiza o corte exato lendo só esse trecho.
+    Os eventos não passam pelo coordenador.
+
+    Retorna tarefas (region, slice_index, start_boundary, end_boundary,
+    parts), com fronteiras None nas pontas e uma parte (caminho, offset,
+    quantidade, início, fim) por corrida, sendo início e fim trechos (a, b)
+    de posições que contêm o corte.
+    """
+    tasks = []
+    for region, runs in region_runs.items():
+        total = sum(run[2] for run in runs)
+        if not total:
+            continue
+        # Cada amostra representa os eventos até a próxima amostra da corrida
+        weighted = sorted(
+            (timestamp, (samples[i + 1][0] if i + 1 < len(samples) else count) - index)
+            for _, _, count, samples in runs for i, (index, timestamp) in enumerate(samples)
+        )
+        boundaries, seen, target = [], 0, 1
+        for timestamp, weight in weighted:
+            while target < num_slices and seen >= total * target // num_slices:
+                if not boundaries or boundaries[-1] < timestamp:
+                    boundaries.append(timestamp)
+                target += 1
+            seen += weight
+
+        # Trecho do corte de cada fronteira em cada corrida; a fatia j vai do
+        # corte da fronteira j - 1 (ou do início) ao da fronteira j (ou do fim)
+        cuts = []
+        for _, _, count, samples in runs:
+            sample_timestamps = [timestamp for _, timestamp in samples]
+            run_cuts = [(0, 0)]
+            for boundary in boundaries:
+                k = bisect_left(sample_timestamps, boundary)
+                run_cuts.append((samples[k - 1][0] + 1 if k else 0, samples[k][0] if k < len(samples) else count))
+            run_cuts.append((count, count))
+            cuts.append(run_cuts)
+        for j in range(len(boundaries) + 1):
+            # Corridas que terminam antes da fatia ainda podem fornecer o halo
+            if any(run_cuts[j + 1][1] > run_cuts[j][0] for run_cuts in cuts):
+                parts = [(path, offset, count, run_cuts[j], run_cuts[j + 1])
+                         for (path, offset, count, _), run_cuts in zip(runs, cuts)]
+                tasks.append((region, j, boundaries[j - 1] if j else None,
+                              boundaries[j] if j < len(boundaries) else None, parts))
+    return tasks
+
+
+def _read_columns(f, offset: int, count: int, lo: int, hi: int) -> tuple:
+    # Posições [lo, hi) de cada coluna de um segmento gravado na fase 1
+    columns = []
+    column_offset = offset
+    for _, typecode in SEGMENT_COLUMNS:
+        column = array(typecode)
+        f.seek(column_offset + lo * column.itemsize)
+        column.frombytes(f.read((hi - lo) * column.itemsize))
+        columns.append(column)
+        column_offset += count * column.itemsize
+    return tuple(columns)
+
+
+def _locate_cut(f, offset: int, count: int, bracket: tuple, boundary) -> int:
+    # Primeira posição com timestamp >= boundary, procurada só no trecho
+    lo, hi = bracket
+    if boundary is None or hi <= lo:
+        return lo
+    timestamps = array("q")
+    f.seek(offset + lo * timestamps.itemsize)
+    timestamps.frombytes(f.read((hi - lo) * timestamps.itemsize))
+    return lo + bisect_left(timestamps, boundary)
+
+
+def _merge_parts(parts: list[tuple]) -> list[tuple]:
+    # Intercala as corridas por timestamp; em empates, a ordem das corridas
+    return list(heapq.merge(*(zip(*part) for part in parts), key=lambda row: row[0]))
+
+
+def moving_average_slice(args: tuple) -> dict:
+    """
+    Fase 2 (worker): lê de cada corrida os eventos da fatia e o halo
+    somente leitura, os até `window_size - 1` eventos da região imediatamente
+    anteriores ao início da fatia, e calcula exatamente o trecho da série de
+    médias móveis da fatia, usando o halo apenas para completar a janela.
+    """
+    region, slice_index, start_boundary, end_boundary, parts, window_size = args
+    body_parts, halo_candidates = [], []
+    for path, offset, count, start_bracket, end_bracket in parts:
+        with open(path, 'rb') as f:
+            lo = _locate_cut(f, offset, count, start_bracket, start_boundary)
+            hi = _locate_cut(f, offset, count, end_bracket, end_boundary)
+            if hi > lo:
+                body_parts.append(_read_columns(f, offset, count, lo, hi))
+            if lo > 0 and window_size > 1:
+                halo_candidates.append(_read_columns(f, offset, count, max(0, lo - (window_size - 1)), lo))
+    halo = _merge_parts(halo_candidates)[-(window_size - 1):] if body_parts and window_size > 1 else []
+    rows = halo + _merge_parts(body_parts)
+    series = {
+        sensor: moving_average_series([row[column] for row in rows], window_size, halo=len(halo))
+        for column, sensor in enumerate(SENSORS, start=1)
+    }
+    return {
+        "region": region,
+        "slice": slice_index,
+        "series": series,
+        "body_events": len(rows) - len(halo),
+        "halo_events": len(halo),
+    }
+
+
+def run_region_moving_averages(data_path: str, num_workers: int, window_size: int = 50,
+                               profiler=None) -> tuple[float, dict, dict]:
+    """
+    Calcula em paralelo a série completa de médias móveis de cada região,
+    idêntica à de uma passada única sobre a região ordenada por tempo. Os
+    eventos ordenados da fase 1 ficam em arquivos temporários
+    (`ASCE_SPILL_DIR`), apagados ao final: o coordenador só recebe amostras
+    de timestamps e as séries calculadas.
+
+    Retorna o tempo de execução, as séries ({região: {sensor: [médias]}}) e o
+    custo do halo: fatias, eventos do halo (processados duas vezes) e a razão
+    em relação ao total de eventos das fatias.
+    """
+    profiler = profiler or get_profiler(False)
+    start_time = time.perf_counter()
+
+    with profiler.stage("chunking"):
+        num_chunks = auto_chunk_count(os.path.getsize(data_path), num_workers)
+        chunks = get_file_chunks(data_path, num_chunks)
+
+    spill_root = tempfile.mkdtemp(prefix="asce-halo-", dir=os.environ.get(SPILL_DIR_ENV_VAR))
+    try:
+        with worker_pool(num_workers) as pool:
+            region_runs = defaultdict(list)
+            with profiler.stage("parse"):
+                phase_args = [(data_path, start, end, spill_root, num_workers) for start, end in chunks]
+                for runs in pool.imap_unordered(collect_region_runs, phase_args):
+                    for region, run in runs.items():
+                        region_runs[region].append(run)
+
+            with profiler.stage("plan"):
+                tasks = plan_halo_slices(region_runs, num_workers, window_size)
+
+            slices = defaultdict(dict)
+            overhead = {"body_events": 0, "halo_events": 0}
+            with profiler.stage("metrics"):
+                task_args = [(*task, window_size) for task in tasks]
+                for res in pool.imap_unordered(moving_average_slice, task_args):
+                    slices[res["region"]][res["slice"]] = res["series"]
+                    for name in overhead:
+                        overhead[name] += res[name]
+    finally:
+        shutil.rmtree(spill_root, ignore_errors=True)
+
+    with profiler.stage("merge"):
+        # Costura: os trechos de cada região, na ordem das fatias
+        region_series = {
+            region: {sensor: [value for j in sorted(parts) for value in parts[j][sensor]] for sensor in SENSORS}
+            for region, parts in slices.items()
+        }
+
+    overhead["slices"] = len(tasks)
+    overhead["halo_ratio"] = round(overhead["halo_events"] / overhead["body_events"], 4) if overhead["body_events"] else 0.0
+    profiler.count("halo_events", overhead["halo_events"])
+
+    end_time = time.perf_counter()
+    return (end_time - start_time), region_series, overhead
+
+
+def serial_region_moving_averages(data_path: str, window_size: int = 50) -> dict:
+    """Referência sequencial: a série de cada região numa passada única."""
+    region_series = {}
+    for region, events in load_and_group_by_region(data_path).items():
+        rows = [event for event in events if not is_anomalous(event)[0]]
+        region_series[region] = {
+            sensor: moving_average_series([getattr(event, sensor) for event in rows], window_size)
+            for sensor in SENSORS
+        }
+    return region_series
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exact parallel region moving averages with halo-overlap slices.")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv'))
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes.")
+    parser.add_argument("--verify", action="store_true", help="Compare against a single sequential pass.")
+    args = parser.parse_args()
+
+    execution_time, series, halo_overhead = run_region_moving_averages(args.data, args.workers)
+    print(f"Tempo das médias móveis com halo ({args.workers} workers): {execution_time:.4f} segundos.")
+    print(f"Fatias: {halo_overhead['slices']} | Eventos no halo: {halo_overhead['halo_events']} "
+          f"({halo_overhead['halo_ratio']:.2%} dos eventos das fatias)")
+    if args.verify:
+        reference = serial_region_moving_averages(args.data)
+        print("Séries idênticas à passada sequencial:", reference == series)
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+
+from core.models import EventBatch, MeteorologicalEvent, merge_by_time
+from core.profiling import get_profiler
+from core.timestamps import format_iso_us
+from .data_parser import parse_event_bytes, read_byte_range
+from .metrics import MovingAverageState, MultiSensorPeriodCounter, is_anomalous
+
+CHECKPOINT_VERSION = 2
+# Quantos bytes antes da marca d'água entram na impressão digital do arquivo,
+# usada para detectar que o arquivo foi reescrito (e não apenas estendido).
+FINGERPRINT_BYTES = 4096
+
+
+def default_checkpoint_path(data_path: str) -> str:
+    return f"{data_path}.checkpoint.json"
+
+
+def anomaly_log_path(checkpoint_path: str) -> str:
+    """Arquivo só de acréscimo com as anomalias (uma por linha, JSON), ao lado do checkpoint."""
+    return f"{os.path.splitext(checkpoint_path)[0]}.anomalies.jsonl"
+
+
+def _fingerprint(data_path: str, watermark: int) -> str:
+    return hashlib.sha1(read_byte_range(data_path, max(0, watermark - FINGERPRINT_BYTES), watermark)).hexdigest()
+
+
+class AnalysisState:
+    """
+    Estado da análise até a marca d'água (`watermark`, em bytes): contadores e
+    janela de anomalias multi-sensor por estação e janelas de média móvel por
+    região. Nada nele cresce com o histórico: as anomalias vão para um log só
+    de acréscimo (`anomaly_log_path`), do qual o estado guarda apenas o
+    tamanho válido (`anomaly_log_bytes`), e `new_anomalies` tem só as da
+    execução atual.
+
+    Processar o arquivo em várias execuções, cada uma continuando do
+    checkpoint da anterior, dá exatamente o mesmo resultado de uma passada
+    única, desde que os bytes anexados sigam a ordem de um feed: nenhum evento
+    novo anterior ao último já visto da mesma estação, nem anterior ou igual
+    ao último da mesma região. Quando isso não vale, `apply` retorna False sem
+    alterar o estado e a análise precisa ser refeita do zero.
+    """
+
+    def __init__(self):
+        self.watermark = 0
+        self.fingerprint = ""
+        self.stations = {}
+        self.regions = {}
+        self.anomaly_log_bytes = 0
+        self.new_anomalies = []
+
+    def apply(self, rows: list[tuple]) -> bool:
+        station_batches = defaultdict(EventBatch)
+        new_anomalies = []
+        for row in rows:
+            station_batches[row[1]].append(*row)
+            anomaly_found, sensor = is_anomalous(MeteorologicalEvent(*row))
+            if anomaly_found:
+                new_anomalies.append({"timestamp": row[0], "station_id": row[1], "sensor": sensor})
+
+        # Eventos não anômalos por região e estação, como em process_file_chunk
+        region_batches = defaultdict(lambda: defaultdict(EventBatch))
+        station_sensors = {}
+        for station_id, events in station_batches.items():
+            events.sort_by_time()
+            station = self.stations.get(station_id)
+            if station is not None and events.timestamps[0] < station["last_timestamp"]:
+                return False
+            sensors = station_sensors[station_id] = []
+            for event in events:
+                anomaly_found, sensor = is_anomalous(event)
+                sensors.append(sensor)
+                if not anomaly_found:
+                    region_batches[event.region][station_id].append_event(event)
+
+        for region, batches in region_batches.items():
+            region_state = self.regions.get(region)
+            first_timestamp = min(batch.timestamps[0] for batch in batches.values())
+            if region_state is not None and first_timestamp <= region_state["last_timestamp"]:
+                return False
+
+        # A entrada é válida; só agora o estado é alterado
+        for station_id, events in station_batches.items():
+            station = self.stations.get(station_id)
+            if station is None:
+                station = self.stations[station_id] = {
+                    "total_events": 0, "anomaly_events": 0, "last_timestamp": 0,
+                    "multi_sensor": MultiSensorPeriodCounter(),
+                }
+            counter = station["multi_sensor"]
+            for timestamp, sensor in zip(events.timestamps, station_sensors[station_id]):
+                counter.push(timestamp, sensor)
+                if sensor is not None:
+                    station["anomaly_events"] += 1
+            station["total_events"] += len(events)
+            station["last_timestamp"] = events.timestamps[-1]
+
+        for region, batches in region_batches.items():
+            region_state = self.regions.get(region)
+            if region_state is None:
+                region_state = self.regions[region] = {"last_timestamp": 0, "averages": MovingAverageState()}
+            averages = region_state["averages"]
+            for event in merge_by_time(batches.values()):
+                averages.push(event)
+            region_state["last_timestamp"] = event.timestamp
+
+        self.new_anomalies.extend(new_anomalies)
+        return True
+
+    def report(self) -> dict:
+        """Relatório por estação e por região, no formato de `process_file_chunk`."""
+        return {
+            "station_results": {
+                station_id: {
+                    "total_events": station["total_events"],
+                    "anomaly_events": station["anomaly_events"],
+                    "multi_sensor_periods": station["multi_sensor"].periods,
+                }
+                for station_id, station in self.stations.items()
+            },
+            "region_results": {region: state["averages"].averages() for region, state in self.regions.items()},
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CHECKPOINT_VERSION,
+            "watermark": self.watermark,
+            "fingerprint": self.fingerprint,
+            "stations": {
+                str(station_id): dict(station, multi_sensor=station["multi_sensor"].to_dict())
+                for station_id, station in self.stations.items()
+            },
+            "regions": {
+                region: {"last_timestamp": state["last_timestamp"], "averages": state["averages"].to_dict()}
+                for region, state in self.regions.items()
+            },
+            "anomaly_log_bytes": self.anomaly_log_bytes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnalysisState":
+        state = cls()
+        state.watermark = data["watermark"]
+        state.fingerprint = data["fingerprint"]
+        state.stations = {
+            int(station_id): dict(station, multi_sensor=MultiSensorPeriodCounter.from_dict(station["multi_sensor"]))
+            for station_id, station in data["stations"].items()
+        }
+        state.regions = {
+            region: {"last_timestamp": region_state["last_timestamp"],
+                     "averages": MovingAverageState.from_dict(region_state["averages"])}
+            for region, region_state in data["regions"].items()
+        }
+        state.anomaly_log_bytes = data["anomaly_log_bytes"]
+        return state
+
+
+def load_checkpoint(data_path: str, checkpoint_path: str) -> AnalysisState | None:
+    """
+    Retorna o estado salvo se ele ainda vale para o arquivo: mesma versão, o
+    arquivo não encolheu, os bytes antes da marca d'água não mudaram e o log
+    de anomalias tem ao menos o tamanho registrado.
+    """
+    try:
+        with open(checkpoint_path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        return None
+    if os.path.getsize(data_path) < data["watermark"]:
+        return None
+    if _fingerprint(data_path, data["watermark"]) != data["fingerprint"]:
+        return None
+    log_path = anomaly_log_path(checkpoint_path)
+    if (os.path.getsize(log_path) if os.path.exists(log_path) else 0) < data["anomaly_log_bytes"]:
+        return None
+    return AnalysisState.from_dict(data)
+
+
+def append_anomalies(state: AnalysisState, log_path: str):
+    """
+    Acrescenta `state.new_anomalies` ao log a partir de `anomaly_log_bytes` e
+    atualiza esse tamanho. O que passar dele (anomalias de uma execução que
+    não chegou a salvar o checkpoint) é descartado antes.
+    """
+    with open(log_path, 'r+b' if os.path.exists(log_path) else 'wb') as f:
+        f.truncate(state.anomaly_log_bytes)
+        f.seek(state.anomaly_log_bytes)
+        f.write(b"".join(json.dumps(anomaly).encode() + b"\n" for anomaly in state.new_anomalies))
+        f.flush()
+        os.fsync(f.fileno())
+        state.anomaly_log_bytes = f.tell()
+
+
+def load_anomalies(data_path: str, checkpoint_path: str | None = None) -> list[dict]:
+    """Todas as anomalias até o último checkpoint (timestamps ISO); lê o log inteiro."""
+    checkpoint_path = checkpoint_path or default_checkpoint_path(data_path)
+    try:
+        with open(checkpoint_path, 'r') as f:
+            valid_bytes = json.load(f)["anomaly_log_bytes"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return []
+    with open(anomaly_log_path(checkpoint_path), 'rb') as f:
+        lines = f.read(valid_bytes).splitlines()
+    return [dict(anomaly, timestamp=format_iso_us(anomaly["timestamp"])) for anomaly in map(json.loads, lines)]
+
+
+def save_checkpoint(state: AnalysisState, checkpoint_path: str):
+    # As anomalias vão primeiro para o log; o checkpoint só passa a contar com
+    # elas depois de gravado
+    append_anomalies(state, anomaly_log_path(checkpoint_path))
+    # Escrita atômica: um checkpoint pela metade nunca substitui o anterior
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def run_incremental_analysis(data_path: str, checkpoint_path: str | None = None, profiler=None) -> tuple[float, list, dict]:
+    """
+    Processa apenas os bytes anexados a `data_path` desde a última execução,
+    retomando do checkpoint, e salva o novo checkpoint. Sem checkpoint válido
+    (primeira execução, arquivo reescrito ou dados fora de ordem), processa o
+    arquivo inteiro.
+
+    Retorna o tempo de execução, as anomalias encontradas nesta execução
+    (com timestamps ISO) e o relatório por estação/região. O custo depende
+    dos bytes novos, não do histórico; a lista completa de anomalias fica no
+    log e é lida sob demanda com `load_anomalies`.
+    """
+    profiler = profiler or get_profiler(False)
+    checkpoint_path = checkpoint_path or default_checkpoint_path(data_path)
+    start_time = time.perf_counter()
+
+    with profiler.stage("checkpoint"):
+        state = load_checkpoint(data_path, checkpoint_path)
+    if state is None:
+        profiler.count("full_recomputes")
+        state = AnalysisState()
+
+    with profiler.stage("read"):
+        start_byte = state.watermark
+        file_size = os.path.getsize(data_path)
+        new_bytes = read_byte_range(data_path, start_byte, file_size)
+        # Uma linha ainda sendo escrita fica para a próxima execução
+        new_bytes = new_bytes[:new_bytes.rfind(b'\n') + 1]
+    profiler.count("new_bytes", len(new_bytes))
+
+    with profiler.stage("parse"):
+        rows, malformed = parse_event_bytes(new_bytes)
+    profiler.count("malformed_rows", malformed)
+    profiler.count("events", len(rows))
+
+    with profiler.stage("metrics"):
+        applied = state.apply(rows)
+    if not applied:
+        # Dados anexados fora de ordem: a continuação não seria exata
+        profiler.count("full_recomputes")
+        state, start_byte = AnalysisState(), 0
+        with profiler.stage("read"):
+            new_bytes = read_byte_range(data_path, 0, file_size)
+            new_bytes = new_bytes[:new_bytes.rfind(b'\n') + 1]
+        with profiler.stage("parse"):
+            rows, malformed = parse_event_bytes(new_bytes)
+        with profiler.stage("metrics"):
+            state.apply(rows)
+
+    with profiler.stage("checkpoint"):
+        state.watermark = start_byte + len(new_bytes)
+        state.fingerprint = _fingerprint(data_path, state.watermark)
+        save_checkpoint(state, checkpoint_path)
+
+    found_anomalies = [dict(anomaly, timestamp=format_iso_us(anomaly["timestamp"])) for anomaly in state.new_anomalies]
+    end_time = time.perf_counter()
+    return (end_time - start_time), found_anomalies, state.report()
+
+
+if __name__ == '__main__':
+    DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv')
+    profiler = get_profiler(True)
+    execution_time, anomalies_found, report = run_incremental_analysis(DATA_FILE, profiler=profiler)
+
+    print(f"Tempo da execução incremental: {execution_time:.4f} segundos.")
+    print(f"Bytes novos processados: {profiler.counters['new_bytes']} | Eventos novos: {profiler.counters['events']}")
+    total_anomalies = sum(station["anomaly_events"] for station in report["station_results"].values())
+    print(f"Anomalias novas: {len(anomalies_found)} | Total desde o início: {total_anomalies}")
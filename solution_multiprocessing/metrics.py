@@ -1,30 +1,12 @@
 from collections import deque
-from datetime import datetime, timedelta
-
-def is_anomalous(event: dict) -> tuple[bool, str | None]:
-    """
-    Verifica se um evento contém uma leitura de sensor anômala.
-    As regras agora são INCLUSIVAS para corresponder perfeitamente à geração.
-    """
-    # Anomalia de Temperatura: gerador cria valores >= 45.0 ou <= -10.0
-    if event['temperature'] >= 45.0 or event['temperature'] <= -10.0:
-        return (True, 'temperature')
-    
-    # Anomalia de Umidade: gerador cria valores > 100.0 ou < 0.0
-    # A lógica original `> 100.0` ou `< 0.0` estava correta aqui.
-    if event['humidity'] > 100.0 or event['humidity'] < 0.0:
-        return (True, 'humidity')
-        
-    # Anomalia de Pressão: gerador cria valores fora da faixa normal de 980-1040
-    # A lógica original `> 1040.0` ou `< 980.0` estava funcionalmente correta, vamos mantê-la.
-    if event['pressure'] > 1040.0 or event['pressure'] < 980.0:
-        return (True, 'pressure')
-        
-    return (False, None)
+from collections.abc import Iterable, Sequence
 
+from core.models import MeteorologicalEvent
+# Regras de anomalia compartilhadas por todas as soluções
+from core.rules import is_anomalous
+from core.timestamps import MICROS_PER_MINUTE
 
-
-def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
+def calculate_moving_averages(events: Iterable[MeteorologicalEvent], window_size: int) -> dict:
     """
     Calcula as médias móveis para temperatura, umidade e pressão,
     ignorando valores anômalos.
@@ -43,9 +25,9 @@ def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
         anomaly_found, _ = is_anomalous(event)
         
         if not anomaly_found:
-            temp_window.append(event['temperature'])
-            hum_window.append(event['humidity'])
-            press_window.append(event['pressure'])
+            temp_window.append(event.temperature)
+            hum_window.append(event.humidity)
+            press_window.append(event.pressure)
         
         if len(temp_window) == window_size:
             averages['temperature'].append(sum(temp_window) / window_size)
@@ -59,33 +41,121 @@ def calculate_moving_averages(events: list[dict], window_size: int) -> dict:
     
     return last_averages
 
-def count_multi_sensor_anomaly_periods(events: list[dict], window_minutes: int = 10) -> int:
+def moving_average_series(values: Sequence[float], window_size: int, halo: int = 0) -> list[float]:
+    """
+    Série completa de médias móveis de `values` (já sem anomalias, em ordem de
+    tempo), uma por posição em que a janela está cheia. Os `halo` primeiros
+    valores apenas completam a janela das posições seguintes e não geram
+    médias próprias, o que permite calcular trechos da série em paralelo.
+    """
+    return [
+        sum(values[end - window_size + 1:end + 1]) / window_size
+        for end in range(max(halo, window_size - 1), len(values))
+    ]
+
+def count_multi_sensor_anomaly_periods(events: Sequence[MeteorologicalEvent], window_minutes: int = 10) -> int:
     """
     Conta o número de períodos de 'window_minutes' em que uma estação teve
-    anomalias em sensores distintos.
+    anomalias em sensores distintos. Os eventos devem estar ordenados pelo
+    timestamp (em microssegundos, ver core.timestamps).
     """
     if not events:
         return 0
 
+    window_us = window_minutes * MICROS_PER_MINUTE
     period_count = 0
     window = deque()
     
     for event in events:
-        event_time = datetime.fromisoformat(event['timestamp'])
+        event_time = event.timestamp
         
-        while window and (event_time - window[0]['timestamp_obj']) > timedelta(minutes=window_minutes):
+        while window and (event_time - window[0][0]) > window_us:
             window.popleft()
 
         anomaly_found, sensor = is_anomalous(event)
         if anomaly_found:
-            window.append({
-                'timestamp_obj': event_time,
-                'sensor': sensor
-            })
+            window.append((event_time, sensor))
 
-        sensors_in_window = {e['sensor'] for e in window}
+        sensors_in_window = {anomaly_sensor for _, anomaly_sensor in window}
         if len(sensors_in_window) > 1:
             period_count += 1
             window.clear()
             
-    return period_count
\ No newline at end of file
+    return period_count
+
+class MultiSensorPeriodCounter:
+    """
+    Versão incremental de `count_multi_sensor_anomaly_periods`: recebe os
+    eventos de uma estação um a um, em ordem de tempo, e mantém a janela e a
+    contagem entre chamadas. O estado é serializável com `to_dict`.
+    """
+
+    __slots__ = ("window_us", "periods", "window")
+
+    def __init__(self, window_minutes: int = 10):
+        self.window_us = window_minutes * MICROS_PER_MINUTE
+        self.periods = 0
+        self.window = deque()
+
+    def push(self, timestamp: int, sensor: str | None) -> bool:
+        """Processa um evento (`sensor` é None se não for anômalo). Retorna True se um período fechou."""
+        window = self.window
+        while window and (timestamp - window[0][0]) > self.window_us:
+            window.popleft()
+        if sensor is not None:
+            window.append((timestamp, sensor))
+        if len({anomaly_sensor for _, anomaly_sensor in window}) > 1:
+            self.periods += 1
+            window.clear()
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        return {"periods": self.periods, "window": [list(item) for item in self.window]}
+
+    @classmethod
+    def from_dict(cls, state: dict, window_minutes: int = 10) -> "MultiSensorPeriodCounter":
+        counter = cls(window_minutes)
+        counter.periods = state["periods"]
+        counter.window.extend(tuple(item) for item in state["window"])
+        return counter
+
+
+class MovingAverageState:
+    """
+    Versão incremental de `calculate_moving_averages` para eventos não
+    anômalos. Como a janela só cresce até `window_size` e depois desliza, a
+    última média é a média da janela atual; `averages` devolve exatamente o
+    mesmo resultado da função em lote.
+    """
+
+    __slots__ = ("window_size", "temperature", "humidity", "pressure")
+
+    def __init__(self, window_size: int = 50):
+        self.window_size = window_size
+        self.temperature = deque(maxlen=window_size)
+        self.humidity = deque(maxlen=window_size)
+        self.pressure = deque(maxlen=window_size)
+
+    def push(self, event: MeteorologicalEvent):
+        self.temperature.append(event.temperature)
+        self.humidity.append(event.humidity)
+        self.pressure.append(event.pressure)
+
+    def averages(self) -> dict:
+        full = len(self.temperature) == self.window_size
+        return {
+            sensor: round(sum(window) / self.window_size, 2) if full else 0
+            for sensor, window in (("temperature", self.temperature), ("humidity", self.humidity), ("pressure", self.pressure))
+        }
+
+    def to_dict(self) -> dict:
+        return {"temperature": list(self.temperature), "humidity": list(self.humidity), "pressure": list(self.pressure)}
+
+    @classmethod
+    def from_dict(cls, state: dict, window_size: int = 50) -> "MovingAverageState":
+        averages = cls(window_size)
+        averages.temperature.extend(state["temperature"])
+        averages.humidity.extend(state["humidity"])
+        averages.pressure.extend(state["pressure"])
+        return averages
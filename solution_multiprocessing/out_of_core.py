@@ -0,0 +1,415 @@
+import argparse
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from operator import itemgetter
+
+from core.cache import cached_analysis
+from core.models import EventBatch, MeteorologicalEvent
+from core.profiling import get_profiler
+from core.sketches import DistributionSketches, write_distribution_report
+from core.placement import worker_pool
+from core.timestamps import format_iso_us
+from .data_parser import get_file_chunks, parse_event_bytes
+from .metrics import MovingAverageState, MultiSensorPeriodCounter, is_anomalous
+
+# Orçamento de memória (MB) do processamento inteiro, dividido entre os
+# workers; e diretório dos arquivos temporários (padrão: o do sistema).
+MEMORY_BUDGET_ENV_VAR = "ASCE_MEMORY_BUDGET_MB"
+SPILL_DIR_ENV_VAR = "ASCE_SPILL_DIR"
+DEFAULT_MEMORY_BUDGET_MB = 512
+DISTRIBUTIONS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'distributions_out_of_core.json')
+
+# Colunas de cada segmento (uma estação de uma região) nos arquivos de run
+SEGMENT_COLUMNS = (("timestamps", "q"), ("temperatures", "d"), ("humidities", "d"), ("pressures", "d"))
+SEGMENT_ITEM_BYTES = sum(array(typecode).itemsize for _, typecode in SEGMENT_COLUMNS)
+# Custo estimado de um evento no buffer (colunas do EventBatch com folga de
+# crescimento) e de um evento recém-parseado (tupla, int, floats)
+BUFFERED_EVENT_BYTES = 64
+PARSED_EVENT_BYTES = 320
+AVERAGE_LINE_BYTES = 60
+MIN_READ_BLOCK_BYTES = 64 * 1024
+MAX_READ_BLOCK_BYTES = 8 * 1024 * 1024
+MIN_MERGE_BLOCK_ITEMS = 256
+# Custo estimado de uma anomalia no buffer do merge (linha JSON já codificada)
+BUFFERED_ANOMALY_BYTES = 128
+MIN_ANOMALY_BUFFER_ITEMS = 256
+# Arquivos de run abertos ao mesmo tempo por worker no merge; com mais runs,
+# os menos usados recentemente são fechados e reabertos quando preciso
+MAX_OPEN_RUN_FILES = 64
+
+
+def default_memory_budget() -> int:
+    return int(float(os.environ.get(MEMORY_BUDGET_ENV_VAR, DEFAULT_MEMORY_BUDGET_MB)) * 1024 * 1024)
+
+
+def plan_memory(budget_bytes: int) -> dict:
+    """
+    Divide o orçamento de um worker entre o bloco lido do arquivo, as linhas
+    parseadas desse bloco e o buffer de eventos que é despejado em disco
+    quando enche (~1/4, 1/4 e 1/2).
+    """
+    read_block = budget_bytes // 4 * AVERAGE_LINE_BYTES // (AVERAGE_LINE_BYTES + PARSED_EVENT_BYTES)
+    read_block = max(MIN_READ_BLOCK_BYTES, min(MAX_READ_BLOCK_BYTES, read_block))
+    return {"read_block_bytes": read_block, "buffer_events": max(1024, budget_bytes // 2 // BUFFERED_EVENT_BYTES)}
+
+
+def plan_merge(budget_bytes: int, num_segments: int) -> dict:
+    """
+    Divide metade do orçamento de um worker no merge entre o buffer de
+    anomalias (1/8 do orçamento) e um bloco por segmento aberto (o resto).
+    """
+    anomaly_bytes = budget_bytes // 8
+    block_items = (budget_bytes // 2 - anomaly_bytes) // (num_segments * SEGMENT_ITEM_BYTES * 4)
+    return {
+        "block_items": max(MIN_MERGE_BLOCK_ITEMS, block_items),
+        "anomaly_buffer_items": max(MIN_ANOMALY_BUFFER_ITEMS, anomaly_bytes // BUFFERED_ANOMALY_BYTES),
+    }
+
+
+def default_anomalies_path(data_path: str) -> str:
+    return f"{data_path}.out_of_core.anomalies.jsonl"
+
+
+def read_anomalies(anomalies_path: str):
+    """Percorre as anomalias gravadas por `run_out_of_core` (timestamps ISO), uma por vez."""
+    with open(anomalies_path, 'rb') as f:
+        for line in f:
+            anomaly = json.loads(line)
+            anomaly["timestamp"] = format_iso_us(anomaly["timestamp"])
+            yield anomaly
+
+
+def iter_line_blocks(data_path: str, start_byte: int, end_byte: int, block_bytes: int):
+    """Lê [start_byte, end_byte) em blocos de ~`block_bytes` terminados em fim de linha."""
+    with open(data_path, 'rb') as f:
+        f.seek(start_byte)
+        remaining = end_byte - start_byte
+        carry = b""
+        while remaining > 0:
+            block = f.read(min(block_bytes, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            block = carry + block
+            cut = block.rfind(b'\n') + 1 if remaining > 0 else len(block)
+            carry = block[cut:]
+            if cut:
+                yield block[:cut]
+        if carry:
+            yield carry
+
+
+class RunWriter:
+    """
+    Agrupa eventos por (região, estação) num buffer limitado a
+    `buffer_events`. Quando ele enche, cada grupo é ordenado por tempo e o
+    buffer inteiro vira um arquivo de run em `spill_dir`: um segmento por
+    grupo, com as colunas gravadas em binário (8 + 3 × 8 bytes por evento).
+    """
+
+    def __init__(self, spill_dir: str, buffer_events: int, profiler):
+        self.spill_dir = spill_dir
+        self.buffer_events = buffer_events
+        self.profiler = profiler
+        self.buffer = defaultdict(EventBatch)
+        self.buffered = 0
+        # Segmentos gravados: (região, estação, caminho, offset, quantidade)
+        self.segments = []
+        self.runs = 0
+        self.spilled_bytes = 0
+
+    def add(self, row: tuple):
+        self.buffer[(row[2], row[1])].append(*row)
+        self.buffered += 1
+        if self.buffered >= self.buffer_events:
+            self.spill()
+
+    def spill(self):
+        if not self.buffered:
+            return
+        with self.profiler.stage("spill"):
+            path = os.path.join(self.spill_dir, f"run-{os.getpid()}-{self.runs}.bin")
+            with open(path, 'wb') as f:
+                for (region, station_id), batch in sorted(self.buffer.items()):
+                    batch.sort_by_time()
+                    self.segments.append((region, station_id, path, f.tell(), len(batch)))
+                    for name, _ in SEGMENT_COLUMNS:
+                        getattr(batch, name).tofile(f)
+                self.spilled_bytes += f.tell()
+        self.runs += 1
+        self.buffer = defaultdict(EventBatch)
+        self.buffered = 0
+
+
+def spill_range(args: tuple) -> dict:
+    """
+    Fase 1 (worker): lê um intervalo contíguo do arquivo em blocos, parseia e
+    despeja runs ordenados por (região, estação, tempo) sem nunca manter mais
+    do que o orçamento em memória.
+    """
+    task_start = time.perf_counter()
+    data_path, start_byte, end_byte, spill_dir, budget_bytes, profile_enabled = args
+    profiler = get_profiler(profile_enabled)
+    plan = plan_memory(budget_bytes)
+    writer = RunWriter(spill_dir, plan["buffer_events"], profiler)
+
+    for block in iter_line_blocks(data_path, start_byte, end_byte, plan["read_block_bytes"]):
+        with profiler.stage("parse"):
+            rows, malformed = parse_event_bytes(block)
+            profiler.count("malformed_rows", malformed)
+        with profiler.stage("grouping"):
+            for row in rows:
+                writer.add(row)
+        del rows
+    writer.spill()
+
+    profiler.count("spilled_runs", writer.runs)
+    profiler.count("spilled_bytes", writer.spilled_bytes)
+    return {
+        "segments": writer.segments, "profile": profiler.to_dict(),
+        "worker": {"pid": os.getpid(), "busy_seconds": time.perf_counter() - task_start},
+    }
+
+
+class RunFiles:
+    """
+    Arquivos de run abertos durante o merge, compartilhados entre todos os
+    segmentos de cada run e limitados a `max_open` (LRU). Sem isso, cada
+    segmento (run × estação) manteria o próprio arquivo aberto e uma região
+    com muitos runs esgotaria o limite de descritores do processo.
+    """
+
+    def __init__(self, max_open: int = MAX_OPEN_RUN_FILES):
+        self.max_open = max_open
+        self._files = OrderedDict()
+        self.reopened = 0
+
+    def get(self, path: str):
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        if len(self._files) >= self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+            self.reopened += 1
+        f = self._files[path] = open(path, 'rb')
+        return f
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+def iter_segment(files: RunFiles, path: str, offset: int, count: int, block_items: int):
+    """Lê um segmento em blocos de `block_items` eventos: (timestamp, temperatura, umidade, pressão)."""
+    for start in range(0, count, block_items):
+        size = min(block_items, count - start)
+        # Cada bloco posiciona o arquivo antes de ler, já que ele é
+        # compartilhado com os outros segmentos do mesmo run
+        f = files.get(path)
+        columns = []
+        column_offset = offset
+        for _, typecode in SEGMENT_COLUMNS:
+            column = array(typecode)
+            f.seek(column_offset + start * column.itemsize)
+            column.frombytes(f.read(size * column.itemsize))
+            columns.append(column)
+            column_offset += count * column.itemsize
+        yield from zip(*columns)
+
+
+def merge_region(args: tuple) -> dict:
+    """
+    Fase 2 (worker): intercala por tempo (k-way merge) todos os segmentos de
+    uma região, lidos em blocos, e alimenta os kernels incrementais: janela
+    multi-sensor por estação, média móvel da região, contagens e sketches.
+    As anomalias vão para `anomaly_path` (JSON por linha) sempre que o buffer
+    chega a `anomaly_buffer_items`. A memória é ~ segmentos × `block_items`
+    eventos mais esse buffer, qualquer que seja o tamanho da região, e os
+    arquivos abertos são no máximo `MAX_OPEN_RUN_FILES` + 1.
+    """
+    task_start = time.perf_counter()
+    region, segments, block_items, anomaly_path, anomaly_buffer_items, profile_enabled = args
+    profiler = get_profiler(profile_enabled)
+
+    def tagged(station_id, stream):
+        for timestamp, temperature, humidity, pressure in stream:
+            yield timestamp, station_id, temperature, humidity, pressure
+
+    files = RunFiles()
+    streams = [tagged(station_id, iter_segment(files, path, offset, count, block_items))
+               for station_id, path, offset, count in segments]
+    stations = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "counter": MultiSensorPeriodCounter()})
+    averages = MovingAverageState(50)
+    sketches = DistributionSketches()
+    anomaly_file = open(anomaly_path, 'wb')
+    anomaly_buffer = []
+    anomaly_count = 0
+
+    try:
+        with profiler.stage("merge/metrics"):
+            for timestamp, station_id, temperature, humidity, pressure in heapq.merge(*streams, key=itemgetter(0)):
+                event = MeteorologicalEvent(timestamp, station_id, region, temperature, humidity, pressure)
+                station = stations[station_id]
+                station["total_events"] += 1
+                anomaly_found, sensor = is_anomalous(event)
+                station["counter"].push(timestamp, sensor)
+                if anomaly_found:
+                    station["anomaly_events"] += 1
+                    anomaly_buffer.append(json.dumps(
+                        {"timestamp": timestamp, "station_id": station_id, "sensor": sensor}).encode() + b"\n")
+                    if len(anomaly_buffer) >= anomaly_buffer_items:
+                        anomaly_file.write(b"".join(anomaly_buffer))
+                        anomaly_count += len(anomaly_buffer)
+                        anomaly_buffer.clear()
+                else:
+                    averages.push(event)
+                    sketches.add(region, station_id, temperature, humidity, pressure)
+        anomaly_file.write(b"".join(anomaly_buffer))
+        anomaly_count += len(anomaly_buffer)
+    finally:
+        files.close()
+        anomaly_file.close()
+
+    profiler.count("run_file_reopens", files.reopened)
+    profiler.count("events", sum(station["total_events"] for station in stations.values()))
+    profiler.count("anomalies", anomaly_count)
+    return {
+        "region": region,
+        "station_results": {
+            station_id: {
+                "total_events": station["total_events"], "anomaly_events": station["anomaly_events"],
+                "multi_sensor_periods": station["counter"].periods,
+            }
+            for station_id, station in stations.items()
+        },
+        "moving_averages": averages.averages(),
+        "anomaly_path": anomaly_path,
+        "anomaly_count": anomaly_count,
+        "sketches": sketches.to_dict(),
+        "profile": profiler.to_dict(),
+        "worker": {"pid": os.getpid(), "busy_seconds": time.perf_counter() - task_start},
+    }
+
+
+def run_out_of_core(data_path: str, num_workers: int, profiler=None, memory_budget_bytes: int | None = None,
+                    spill_dir: str | None = None, anomalies_path: str | None = None) -> dict:
+    """
+    Agrupamento e ordenação externos em duas fases, com no máximo
+    `memory_budget_bytes` (padrão: ASCE_MEMORY_BUDGET_MB) somando todos os
+    workers:
+
+    1. cada worker lê um intervalo do arquivo e despeja runs ordenados por
+       (região, estação, tempo) em arquivos temporários;
+    2. cada região é uma tarefa que intercala os segmentos dela em todos os
+       runs, em blocos, direto nos kernels incrementais.
+
+    O orçamento cobre os dados (blocos lidos, linhas parseadas, buffers e
+    blocos do merge); cada processo soma a ele o próprio interpretador
+    (~16 MB). A vazão depende só de leitura e escrita sequenciais e do merge,
+    então um dataset maior que a RAM é processado em tempo proporcional ao
+    tamanho. Os arquivos temporários são apagados ao final.
+
+    As anomalias não voltam em memória: cada região as grava num arquivo no
+    diretório de spill, e o coordenador as concatena em `anomalies_path`
+    (padrão: `default_anomalies_path`), lido com `read_anomalies`. O
+    relatório traz o caminho e a contagem.
+    """
+    profiler = profiler or get_profiler(False)
+    budget = memory_budget_bytes or default_memory_budget()
+    worker_budget = budget // num_workers
+    spill_root = tempfile.mkdtemp(prefix="asce-spill-", dir=spill_dir or os.environ.get(SPILL_DIR_ENV_VAR))
+
+    final_station_report = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "multi_sensor_periods": 0})
+    region_results = {}
+    anomalies_path = anomalies_path or default_anomalies_path(data_path)
+    anomaly_count = 0
+    sketches = DistributionSketches()
+    try:
+        with worker_pool(num_workers) as pool:
+            with profiler.stage("chunking"):
+                ranges = get_file_chunks(data_path, num_workers)
+            segments_by_region = defaultdict(list)
+            for res in pool.imap_unordered(spill_range, [
+                (data_path, start, end, spill_root, worker_budget, profiler.enabled) for start, end in ranges
+            ]):
+                profiler.merge(res["profile"])
+                for region, station_id, path, offset, count in res["segments"]:
+                    segments_by_region[region].append((station_id, path, offset, count))
+
+            merge_args = []
+            for index, (region, segments) in enumerate(sorted(segments_by_region.items())):
+                plan = plan_merge(worker_budget, len(segments))
+                merge_args.append((region, segments, plan["block_items"],
+                                   os.path.join(spill_root, f"anomalies-{index}.jsonl"),
+                                   plan["anomaly_buffer_items"], profiler.enabled))
+            with open(anomalies_path, 'wb') as output:
+                for res in pool.imap_unordered(merge_region, merge_args):
+                    with profiler.stage("merge"):
+                        for station_id, metrics in res["station_results"].items():
+                            for name, value in metrics.items():
+                                final_station_report[station_id][name] += value
+                        region_results[res["region"]] = res["moving_averages"]
+                        with open(res["anomaly_path"], 'rb') as region_anomalies:
+                            shutil.copyfileobj(region_anomalies, output)
+                        anomaly_count += res["anomaly_count"]
+                        sketches.merge(res["sketches"])
+                        profiler.merge(res["profile"])
+    finally:
+        shutil.rmtree(spill_root, ignore_errors=True)
+
+    with profiler.stage("sketches"):
+        write_distribution_report(sketches, DISTRIBUTIONS_FILE)
+    return {
+        "stations": dict(final_station_report), "regions": region_results,
+        "anomaly_count": anomaly_count, "anomalies_path": anomalies_path,
+    }
+
+
+@cached_analysis("multiprocessing-out-of-core", os.path.dirname(__file__))
+def run_out_of_core_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
+    """
+    Mesma interface de `run_analysis`, usando `run_out_of_core` com o
+    orçamento padrão. A interface exige a lista de anomalias, então ela é
+    lida do arquivo gravado; quem não precisa dela inteira em memória deve
+    chamar `run_out_of_core` e percorrer `read_anomalies`.
+    """
+    start_time = time.perf_counter()
+    if not os.path.exists(data_path):
+        print(f"Arquivo de dados não encontrado: {data_path}")
+        return -1.0, []
+    report = run_out_of_core(data_path, num_workers, profiler=profiler)
+    return time.perf_counter() - start_time, list(read_anomalies(report["anomalies_path"]))
+
+
+if __name__ == '__main__':
+    from core.resources import ResourceSampler
+
+    parser = argparse.ArgumentParser(description="Out-of-core group-by with spill-to-disk.")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv'))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_MEMORY_BUDGET_MB, help="Total memory budget.")
+    parser.add_argument("--spill-dir", default=None)
+    args = parser.parse_args()
+
+    profiler = get_profiler(True)
+    start = time.perf_counter()
+    with ResourceSampler() as sampler:
+        report = run_out_of_core(args.data, args.workers, profiler, int(args.memory_mb * 1024 * 1024), args.spill_dir)
+    elapsed = time.perf_counter() - start
+    resources = sampler.report()
+    size_mb = os.path.getsize(args.data) / (1024 * 1024)
+    print(f"{report['anomaly_count']} anomalias ({report['anomalies_path']}) em {elapsed:.2f} s ({size_mb / elapsed:.1f} MB/s de CSV).")
+    print(f"Runs despejados: {profiler.counters['spilled_runs']} "
+          f"({profiler.counters['spilled_bytes'] / (1024 * 1024):.1f} MB); orçamento {args.memory_mb:g} MB, "
+          f"maior pico RSS de worker {resources['max_worker_peak_rss_mb']:.1f} MB.")
+    for stage, seconds in sorted(profiler.timings.items(), key=lambda item: -item[1]):
+        print(f"  {stage:>14}: {seconds:.3f} s")
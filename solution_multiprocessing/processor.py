@@ -1,111 +1,214 @@
-import multiprocessing
 import time
-import csv
-import io
 import os
 from collections import defaultdict
 
+from core.models import EventBatch
+from core.cache import cached_analysis
+from core.profiling import get_profiler
+from core.resources import AllocationTracer, allocation_trace_dir
+from core.rules import is_anomalous_row
+from core.sketches import DistributionSketches, write_distribution_report
+from core.placement import worker_pool
+from core.timestamps import format_iso_us
 # Importa as funções de métricas e o parser do próprio módulo
-from .metrics import is_anomalous, calculate_moving_averages, count_multi_sensor_anomaly_periods
-from .data_parser import get_file_chunks
+from .metrics import count_multi_sensor_anomaly_periods
+from .data_parser import (
+    auto_chunk_count, filter_rows, get_file_chunks, parse_event_bytes, read_byte_range, read_byte_ranges,
+)
 
-def process_file_chunk(args: tuple[str, int, int]) -> dict:
+# Percentis por região e estação (sketches combinados de todos os pedaços)
+DISTRIBUTIONS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'distributions_multiprocessing.json')
+
+def process_file_chunk(args: tuple) -> dict:
     """
     Função do worker que lê um pedaço do arquivo, processa as métricas
     e coleta as anomalias encontradas.
+
+    `args` é (data_path, start_byte, end_byte) ou, com instrumentação,
+    (data_path, start_byte, end_byte, profile_enabled, trace_dir), sendo
+    `trace_dir` o `allocation_trace_dir()` do coordenador. O perfil por etapa
+    do worker volta no campo "profile" do resultado, e o campo "worker" traz o
+    pid e o tempo gasto nesta tarefa, para medir o balanceamento de carga.
+    """
+    task_start = time.perf_counter()
+    data_path, start_byte, end_byte = args[:3]
+    profiler = get_profiler(len(args) > 3 and args[3])
+    trace_dir = args[4] if len(args) > 4 else None
+
+    with profiler.stage("read"):
+        chunk_bytes = read_byte_range(data_path, start_byte, end_byte)
+    return analyze_chunk_bytes(chunk_bytes, profiler, task_start, trace_dir=trace_dir)
+
+
+def process_byte_ranges(args: tuple) -> dict:
+    """
+    Worker de uma unidade de trabalho alinhada por estação (ver
+    `station_index.StationIndex.work_units`): lê apenas os intervalos de
+    bytes `ranges` e mantém só as linhas que passam pelo filtro de estações
+    e tempo, já que intervalos vizinhos podem ter sido lidos juntos.
+
+    `args` é (data_path, ranges, station_ids, start_us, end_us, profile_enabled, trace_dir).
     """
-    data_path, start_byte, end_byte = args
+    task_start = time.perf_counter()
+    data_path, ranges, station_ids, start_us, end_us, profile_enabled, trace_dir = args
+    profiler = get_profiler(profile_enabled)
+
+    with profiler.stage("read"):
+        chunk_bytes = read_byte_ranges(data_path, ranges)
+    return analyze_chunk_bytes(chunk_bytes, profiler, task_start, (station_ids, start_us, end_us), trace_dir)
+
+
+def analyze_chunk_bytes(chunk_bytes: bytes, profiler, task_start: float, row_filter: tuple | None = None,
+                        trace_dir: str | None = None) -> dict:
+    """
+    Parsing, agrupamento, anomalias, métricas por estação e sketches de um
+    pedaço de bytes do CSV; `row_filter` é (station_ids, start_us, end_us) de
+    `filter_rows` e `trace_dir` ativa o `AllocationTracer`.
+    """
+    tracer = AllocationTracer(output_dir=trace_dir)
+    tracer.start()
     
-    station_events = defaultdict(list)
-    region_events = defaultdict(list)
+    station_events = defaultdict(EventBatch)
+    # Eventos não anômalos por região e, dentro dela, por estação, para os
+    # sketches (que não dependem da ordem). As médias móveis por região são
+    # calculadas sobre a série inteira em `halo.run_region_moving_averages`.
+    region_events = defaultdict(lambda: defaultdict(EventBatch))
     
     found_anomalies_in_chunk = []
 
-    with open(data_path, 'r', newline='') as f:
-        f.seek(start_byte)
-        chunk_size = end_byte - start_byte
-        chunk_buffer = io.StringIO(f.read(chunk_size))
+    parse_start = time.perf_counter()
+    rows, malformed = parse_event_bytes(chunk_bytes)
+    profiler.count("malformed_rows", malformed)
+    if row_filter is not None:
+        rows = filter_rows(rows, *row_filter)
 
-    reader = csv.reader(chunk_buffer)
-    header = ["timestamp", "station_id", "region", "temperature", "humidity", "pressure"]
-    
-    for row in reader:
-        if len(row) != len(header):
-            continue
-            
-        try:
-            event = {h: v for h, v in zip(header, row)}
-            event['station_id'] = int(event['station_id'])
-            event['temperature'] = float(event['temperature'])
-            event['humidity'] = float(event['humidity'])
-            event['pressure'] = float(event['pressure'])
-
-            station_events[event['station_id']].append(event)
-            
-            # Verifica a anomalia uma vez e coleta se for o caso
-            anomaly_found, sensor = is_anomalous(event)
-            if anomaly_found:
-                found_anomalies_in_chunk.append({
-                    "timestamp": event['timestamp'],
-                    "station_id": event['station_id'],
-                    "sensor": sensor
-                })
-            else:
-                # Apenas eventos não anômalos para o cálculo da média
-                region_events[event['region']].append(event)
-        except (ValueError, KeyError):
-            continue
+    # As regras são avaliadas direto na tupla parseada, sem um evento por linha
+    for row in rows:
+        timestamp, station_id, region = row[0], row[1], row[2]
+        station_events[station_id].append(*row)
+        
+        # Verifica a anomalia uma vez e coleta se for o caso
+        anomaly_found, sensor = is_anomalous_row(row)
+        if anomaly_found:
+            found_anomalies_in_chunk.append({
+                "timestamp": timestamp,
+                "station_id": station_id,
+                "sensor": sensor
+            })
+        else:
+            # Apenas eventos não anômalos para o cálculo da média
+            region_events[region][station_id].append(*row)
+    # O parsing, o agrupamento e a detecção de anomalias acontecem no mesmo laço
+    profiler.add_time("parse", time.perf_counter() - parse_start)
+    profiler.count("events", sum(len(events) for events in station_events.values()))
+    profiler.count("anomalies", len(found_anomalies_in_chunk))
 
     station_results = {}
     for station_id, events in station_events.items():
-        events.sort(key=lambda x: x['timestamp'])
+        with profiler.stage("sort"):
+            if events.sort_by_time():
+                profiler.count("presorted_batches")
         
-        # A contagem de anomalias pode ser feita a partir da lista já coletada
-        anomaly_count = sum(1 for anom in found_anomalies_in_chunk if anom['station_id'] == station_id)
-        
-        station_results[station_id] = {
-            'total_events': len(events), 
-            'anomaly_events': anomaly_count,
-            'multi_sensor_periods': count_multi_sensor_anomaly_periods(events)
-        }
+        with profiler.stage("metrics"):
+            # A contagem de anomalias pode ser feita a partir da lista já coletada
+            anomaly_count = sum(1 for anom in found_anomalies_in_chunk if anom['station_id'] == station_id)
+            
+            station_results[station_id] = {
+                'total_events': len(events), 
+                'anomaly_events': anomaly_count,
+                'multi_sensor_periods': count_multi_sensor_anomaly_periods(events)
+            }
 
-    region_results = {}
-    for region, events in region_events.items():
-        events.sort(key=lambda x: x['timestamp'])
-        region_results[region] = calculate_moving_averages(events, window_size=50)
+    sketches = DistributionSketches()
+    with profiler.stage("sketches"):
+        for region, station_batches in region_events.items():
+            for station_id, events in station_batches.items():
+                sketches.add_columns(region, station_id, events.temperatures, events.humidities, events.pressures)
+
+    tracer.stop()
 
     # Retorna os resultados e também a lista de anomalias
     return {
         "station_results": station_results, 
-        "region_results": region_results, 
-        "found_anomalies": found_anomalies_in_chunk
+        "found_anomalies": found_anomalies_in_chunk,
+        "sketches": sketches.to_dict(),
+        "profile": profiler.to_dict(),
+        "worker": {"pid": os.getpid(), "busy_seconds": time.perf_counter() - task_start}
     }
 
 
+def merge_chunk_result(res: dict, final_station_report: dict, all_found_anomalies: list, profiler,
+                       sketches: DistributionSketches | None = None):
+    """Incorpora o resultado de `process_file_chunk` ao relatório acumulado."""
+    for station_id, metrics in res['station_results'].items():
+        final_station_report[station_id]["total_events"] += metrics["total_events"]
+        final_station_report[station_id]["anomaly_events"] += metrics["anomaly_events"]
+
+    # Adiciona as anomalias encontradas pelo worker à lista principal,
+    # convertendo o timestamp inteiro de volta para ISO apenas aqui, na saída
+    for anomaly in res.get("found_anomalies", ()):
+        anomaly["timestamp"] = format_iso_us(anomaly["timestamp"])
+        all_found_anomalies.append(anomaly)
+    if sketches is not None:
+        sketches.merge(res.get("sketches"))
+    profiler.merge(res.get("profile"))
+
+
 # A função agora retorna uma tupla (float, list)
-def run_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
-    start_time = time.perf_counter()
+@cached_analysis("multiprocessing", os.path.dirname(__file__))
+def run_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
+    """
+    Se um `StageProfiler` for passado, ele recebe o tempo das etapas do
+    coordenador e a soma das etapas de todos os workers, além do tempo ocupado
+    e ocioso de cada worker (`profiler.workers`). Os percentis por região e
+    estação são salvos em DISTRIBUTIONS_FILE.
 
-    # 1. Obter os pedaços do arquivo para cada worker
-    chunks = get_file_chunks(data_path, num_workers)
-    task_args = [(data_path, start, end) for start, end in chunks]
+    O resultado passa pelo cache de `core.cache`; `use_cache=False` força a
+    execução (ex.: em benchmarks).
+    """
+    profiler = profiler or get_profiler(False)
+    start_time = time.perf_counter()
 
-    # 2. Executar o processamento em paralelo
-    with multiprocessing.Pool(processes=num_workers) as pool:
-        partial_results = pool.map(process_file_chunk, task_args)
+    # 1. Cortar o arquivo em mais pedaços do que workers, para que um pedaço
+    # lento não segure a execução inteira
+    with profiler.stage("chunking"):
+        num_chunks = auto_chunk_count(os.path.getsize(data_path), num_workers)
+        chunks = get_file_chunks(data_path, num_chunks)
+        task_args = [(data_path, start, end, profiler.enabled, allocation_trace_dir()) for start, end in chunks]
 
     final_station_report = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "multi_sensor_periods": 0})
     # Lista para agregar todas as anomalias encontradas pelos workers
     all_found_anomalies = []
-
-    for res in partial_results:
-        for station_id, metrics in res['station_results'].items():
-            final_station_report[station_id]["total_events"] += metrics["total_events"]
-            final_station_report[station_id]["anomaly_events"] += metrics["anomaly_events"]
-        
-        # Adiciona as anomalias encontradas pelo worker à lista principal
-        if res.get("found_anomalies"):
-            all_found_anomalies.extend(res['found_anomalies'])
+    sketches = DistributionSketches()
+    worker_busy = defaultdict(float)
+    worker_tasks = defaultdict(int)
+    merge_seconds = 0.0
+
+    # 2. Distribuir os pedaços sob demanda e incorporar cada resultado assim
+    # que ele fica pronto, enquanto os demais ainda estão em processamento
+    pool_start = time.perf_counter()
+    with worker_pool(num_workers) as pool:
+        for res in pool.imap_unordered(process_file_chunk, task_args):
+            merge_start = time.perf_counter()
+            merge_chunk_result(res, final_station_report, all_found_anomalies, profiler, sketches)
+            worker_busy[res["worker"]["pid"]] += res["worker"]["busy_seconds"]
+            worker_tasks[res["worker"]["pid"]] += 1
+            merge_seconds += time.perf_counter() - merge_start
+    pool_elapsed = time.perf_counter() - pool_start
+    profiler.add_time("merge", merge_seconds)
+    with profiler.stage("sketches"):
+        write_distribution_report(sketches, DISTRIBUTIONS_FILE)
+
+    if profiler.enabled:
+        # O que o pool gastou além do trabalho útil médio por worker é custo de
+        # criação de processos, serialização (IPC) e desbalanceamento.
+        profiler.add_time("ipc/overhead", max(0.0, pool_elapsed - sum(worker_busy.values()) / num_workers))
+        profiler.count("chunks", len(task_args))
+        # Ocioso = tempo do pool em que o worker não processava nenhum pedaço
+        # (inicialização, espera e fim sem trabalho). Workers que não
+        # receberam nenhum pedaço não aparecem.
+        for number, (pid, busy) in enumerate(sorted(worker_busy.items()), start=1):
+            profiler.record_worker(f"worker {number}", busy, max(0.0, pool_elapsed - busy), worker_tasks[pid])
     
     end_time = time.perf_counter()
     
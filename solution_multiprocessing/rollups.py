@@ -0,0 +1,293 @@
+import argparse
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+from core.cache import dataset_fingerprint
+from core.profiling import get_profiler
+from core.rules import is_anomalous_row
+from core.placement import worker_pool
+from core.timestamps import MICROS_PER_HOUR, MICROS_PER_MINUTE, format_iso_us, parse_iso_us
+from .data_parser import auto_chunk_count, get_file_chunks, parse_event_bytes, read_byte_range
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'rollups.sqlite')
+GRANULARITIES = {"minute": MICROS_PER_MINUTE, "hour": MICROS_PER_HOUR}
+SCOPES = ("station", "region")
+# Colunas agregadas de cada bucket; as médias saem de soma / normal_events
+MEASURES = (
+    "events", "normal_events",
+    "temperature_anomalies", "humidity_anomalies", "pressure_anomalies",
+    "temperature_sum", "humidity_sum", "pressure_sum",
+)
+_SENSOR_OFFSET = {"temperature": 2, "humidity": 3, "pressure": 4}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    {", ".join(f"{measure} {'REAL' if measure.endswith('_sum') else 'INTEGER'} NOT NULL" for measure in MEASURES)},
+    PRIMARY KEY (granularity, scope, key, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollups_by_time ON rollups (granularity, scope, bucket);
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def rollup_chunk(args: tuple) -> dict:
+    """
+    Worker: agrega um pedaço do arquivo por (minuto, estação, região). As
+    horas e as regiões são derivadas desses totais no coordenador.
+    """
+    data_path, start_byte, end_byte = args
+    rows, malformed = parse_event_bytes(read_byte_range(data_path, start_byte, end_byte))
+    partial = defaultdict(lambda: [0, 0, 0, 0, 0, 0.0, 0.0, 0.0])
+    for row in rows:
+        timestamp, station_id, region, temperature, humidity, pressure = row
+        totals = partial[(timestamp - timestamp % MICROS_PER_MINUTE, station_id, region)]
+        totals[0] += 1
+        anomaly_found, sensor = is_anomalous_row(row)
+        if anomaly_found:
+            totals[_SENSOR_OFFSET[sensor]] += 1
+        else:
+            totals[1] += 1
+            totals[5] += temperature
+            totals[6] += humidity
+            totals[7] += pressure
+    return {"partial": dict(partial), "malformed": malformed}
+
+
+def _add_into(target: list, values: list):
+    for index, value in enumerate(values):
+        target[index] += value
+
+
+def build_rollups(data_path: str, num_workers: int = 4, store_path: str = DEFAULT_STORE_PATH, profiler=None) -> dict:
+    """
+    Materializa os agregados por estação e por região em buckets de minuto e
+    de hora (eventos, anomalias por sensor e somas para as médias) em um
+    banco SQLite indexado por (granularidade, escopo, chave, bucket).
+
+    O banco guarda a impressão digital do dataset; `is_rollup_current`
+    permite reaproveitá-lo enquanto o arquivo não mudar. Um dataset sem
+    eventos gera um banco vazio, com primeiro e último minuto nulos.
+    """
+    profiler = profiler or get_profiler(False)
+    start_time = time.perf_counter()
+
+    with profiler.stage("chunking"):
+        num_chunks = auto_chunk_count(os.path.getsize(data_path), num_workers)
+        chunks = get_file_chunks(data_path, num_chunks)
+
+    minute_totals = defaultdict(lambda: [0, 0, 0, 0, 0, 0.0, 0.0, 0.0])
+    malformed = 0
+    with worker_pool(num_workers) as pool:
+        for res in pool.imap_unordered(rollup_chunk, [(data_path, start, end) for start, end in chunks]):
+            with profiler.stage("merge"):
+                for key, values in res["partial"].items():
+                    _add_into(minute_totals[key], values)
+                malformed += res["malformed"]
+
+    with profiler.stage("rollup"):
+        buckets = defaultdict(lambda: [0, 0, 0, 0, 0, 0.0, 0.0, 0.0])
+        for (minute, station_id, region), values in minute_totals.items():
+            hour = minute - minute % MICROS_PER_HOUR
+            for granularity, bucket in (("minute", minute), ("hour", hour)):
+                _add_into(buckets[(granularity, "station", str(station_id), bucket)], values)
+                _add_into(buckets[(granularity, "region", region, bucket)], values)
+
+    with profiler.stage("store"):
+        tmp_path = f"{store_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        minutes = [key[0] for key in minute_totals]
+        try:
+            connection = sqlite3.connect(tmp_path)
+            try:
+                with connection:
+                    connection.executescript(_SCHEMA)
+                    connection.executemany(
+                        f"INSERT INTO rollups VALUES (?, ?, ?, ?, {', '.join('?' for _ in MEASURES)})",
+                        (key + tuple(values) for key, values in buckets.items()),
+                    )
+                    connection.executemany("INSERT INTO metadata VALUES (?, ?)", [
+                        ("dataset", os.path.abspath(data_path)),
+                        ("fingerprint", dataset_fingerprint(data_path)),
+                        ("first_minute", str(min(minutes)) if minutes else None),
+                        ("last_minute", str(max(minutes)) if minutes else None),
+                    ])
+            finally:
+                connection.close()
+            # Substitui o banco anterior de uma vez, sem deixar leitores com dados pela metade
+            os.replace(tmp_path, store_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    profiler.count("rollup_rows", len(buckets))
+    profiler.count("malformed_rows", malformed)
+    return {"seconds": time.perf_counter() - start_time, "rows": len(buckets), "bytes": os.path.getsize(store_path)}
+
+
+def is_rollup_current(data_path: str, store_path: str = DEFAULT_STORE_PATH) -> bool:
+    """True se o banco existe e foi construído a partir do arquivo atual."""
+    if not os.path.exists(store_path) or not os.path.exists(data_path):
+        return False
+    try:
+        with RollupStore(store_path) as store:
+            return store.metadata().get("fingerprint") == dataset_fingerprint(data_path)
+    except sqlite3.DatabaseError:
+        return False
+
+
+def _to_us(value) -> int | None:
+    if value is None or isinstance(value, int):
+        return value
+    return parse_iso_us(value)
+
+
+class RollupStore:
+    """
+    Consultas por intervalo de tempo e filtro de estações/região sobre os
+    rollups, sem reler o CSV.
+
+    A resolução é de um minuto: `start` é arredondado para baixo e `end`
+    (exclusivo) para cima, até o minuto. Um intervalo longo é respondido com
+    buckets de hora no meio e de minuto apenas nas pontas, então o custo
+    depende do número de horas, não do número de eventos.
+
+    Use como gerenciador de contexto (ou chame `close`) para fechar a conexão.
+    """
+
+    def __init__(self, store_path: str = DEFAULT_STORE_PATH):
+        self.store_path = store_path
+        self.connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def metadata(self) -> dict:
+        return dict(self.connection.execute("SELECT name, value FROM metadata"))
+
+    def time_range(self) -> tuple[int, int] | None:
+        """(primeiro minuto, fim do último minuto) dos dados, em microssegundos; None sem eventos."""
+        metadata = self.metadata()
+        if metadata.get("first_minute") is None:
+            return None
+        return int(metadata["first_minute"]), int(metadata["last_minute"]) + MICROS_PER_MINUTE
+
+    def _ranges(self, start: int, end: int) -> list[tuple[str, int, int]]:
+        # Cobre [start, end) com minutos nas pontas e horas inteiras no meio
+        first_hour = -(-start // MICROS_PER_HOUR) * MICROS_PER_HOUR
+        last_hour = end - end % MICROS_PER_HOUR
+        if first_hour >= last_hour:
+            return [("minute", start, end)]
+        ranges = [("hour", first_hour, last_hour)]
+        if start < first_hour:
+            ranges.append(("minute", start, first_hour))
+        if last_hour < end:
+            ranges.append(("minute", last_hour, end))
+        return ranges
+
+    def _select(self, scope: str, start, end, keys, group_by_bucket: bool, granularity: str | None):
+        results = defaultdict(lambda: [0] * len(MEASURES))
+        data_range = self.time_range()
+        if data_range is None:
+            return results
+        data_start, data_end = data_range
+        start = _to_us(start) if start is not None else data_start
+        end = _to_us(end) if end is not None else data_end
+        start -= start % MICROS_PER_MINUTE
+        end = -(-end // MICROS_PER_MINUTE) * MICROS_PER_MINUTE
+
+        # Mesmo numa série por hora, as pontas vêm dos buckets de minuto: a
+        # primeira e a última hora ficam parciais, mas nunca saem de [start, end)
+        ranges = [("minute", start, end)] if granularity == "minute" else self._ranges(start, end)
+        bucket_expression = f"bucket - bucket % {GRANULARITIES[granularity or 'minute']}"
+
+        sums = ", ".join(f"SUM({measure})" for measure in MEASURES)
+        key_filter, key_params = "", []
+        if keys:
+            key_filter = f" AND key IN ({', '.join('?' for _ in keys)})"
+            key_params = [str(key) for key in keys]
+        group = "key, 2" if group_by_bucket else "key"
+        for range_granularity, range_start, range_end in ranges:
+            query = (
+                f"SELECT key, {bucket_expression if group_by_bucket else '0'}, {sums} FROM rollups "
+                f"WHERE granularity = ? AND scope = ? AND bucket >= ? AND bucket < ?{key_filter} GROUP BY {group}"
+            )
+            for key, bucket, *values in self.connection.execute(
+                query, [range_granularity, scope, range_start, range_end, *key_params]
+            ):
+                _add_into(results[(key, bucket)], values)
+        return results
+
+    @staticmethod
+    def _row(key: str, values: list) -> dict:
+        measures = dict(zip(MEASURES, values))
+        normal = measures["normal_events"]
+        return {
+            "key": key,
+            "events": measures["events"],
+            "anomalies": measures["temperature_anomalies"] + measures["humidity_anomalies"] + measures["pressure_anomalies"],
+            "temperature_anomalies": measures["temperature_anomalies"],
+            "humidity_anomalies": measures["humidity_anomalies"],
+            "pressure_anomalies": measures["pressure_anomalies"],
+            "mean_temperature": round(measures["temperature_sum"] / normal, 2) if normal else None,
+            "mean_humidity": round(measures["humidity_sum"] / normal, 2) if normal else None,
+            "mean_pressure": round(measures["pressure_sum"] / normal, 2) if normal else None,
+        }
+
+    def summary(self, scope: str = "station", start=None, end=None, keys=None) -> list[dict]:
+        """
+        Totais por estação (ou região) no intervalo [start, end): eventos,
+        anomalias por sensor e médias dos eventos não anômalos. `start` e
+        `end` são ISO 8601 ou microssegundos; `keys` filtra estações/regiões.
+        """
+        results = self._select(scope, start, end, keys, group_by_bucket=False, granularity=None)
+        rows = [self._row(key, values) for (key, _), values in results.items()]
+        return sorted(rows, key=lambda row: (int(row["key"]) if scope == "station" else row["key"]))
+
+    def series(self, scope: str = "station", start=None, end=None, keys=None, granularity: str = "hour") -> list[dict]:
+        """
+        Os mesmos agregados por bucket de `granularity` ("minute" ou "hour"),
+        contando só eventos de [start, end): numa série por hora, os buckets
+        das pontas somam apenas os minutos dentro do intervalo.
+        """
+        results = self._select(scope, start, end, keys, group_by_bucket=True, granularity=granularity)
+        rows = [dict(self._row(key, values), bucket=format_iso_us(bucket)) for (key, bucket), values in results.items()]
+        return sorted(rows, key=lambda row: (row["bucket"], row["key"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the time-bucketed rollup store.")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv'))
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--last-hours", type=float, default=1.0, help="Query window ending at the last event.")
+    args = parser.parse_args()
+
+    if not is_rollup_current(args.data, args.store):
+        build = build_rollups(args.data, args.workers, args.store)
+        print(f"Rollups construídos em {build['seconds']:.3f}s: {build['rows']} linhas, {build['bytes'] / 1024:.0f} KB.")
+
+    with RollupStore(args.store) as store:
+        data_range = store.time_range()
+        if data_range is None:
+            parser.exit(message="O dataset não tem eventos.\n")
+        query_start = data_range[1] - int(args.last_hours * MICROS_PER_HOUR)
+        start_time = time.perf_counter()
+        rows = store.summary("station", start=query_start, end=data_range[1])
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+    print(f"Anomalias por estação nas últimas {args.last_hours:g} h (consulta em {elapsed_ms:.1f} ms):")
+    for row in rows:
+        print(f"  estação {row['key']:>3}: {row['anomalies']:>5} anomalias em {row['events']:>6} eventos")
@@ -0,0 +1,278 @@
+import argparse
+import heapq
+import json
+import os
+import time
+import zlib
+from array import array
+from collections import defaultdict
+
+from core.cache import dataset_fingerprint
+from core.profiling import get_profiler
+from core.resources import allocation_trace_dir
+from core.placement import worker_pool
+from core.timestamps import MICROS_PER_HOUR, parse_iso_us
+from .data_parser import auto_chunk_count, get_file_chunks, read_byte_range
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".stidx"
+# Intervalos separados por até MAX_GAP_BYTES são lidos numa única leitura, e
+# as linhas de outras estações no meio são descartadas depois do parsing. Como
+# o parsing custa bem mais que as leituras (o arquivo costuma estar no cache do
+# sistema), o padrão é ler só as linhas selecionadas; intervalos adjacentes
+# sempre são juntados.
+MAX_GAP_BYTES = 0
+
+
+def default_index_path(data_path: str) -> str:
+    return f"{data_path}{INDEX_SUFFIX}"
+
+
+def coalesce(ranges, max_gap: int = 0) -> list[tuple[int, int]]:
+    """Ordena e junta intervalos (start, end) adjacentes ou separados por até `max_gap` bytes."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= max_gap:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def index_chunk(args: tuple) -> dict:
+    """
+    Worker: percorre as linhas de um pedaço e registra, para cada (estação,
+    bucket de tempo), os intervalos de bytes das suas linhas, juntando linhas
+    consecutivas da mesma chave num único intervalo. Só o timestamp e a
+    estação (os dois primeiros campos, nunca entre aspas) são lidos.
+    """
+    data_path, start_byte, end_byte, bucket_us = args
+    entries = defaultdict(list)
+    offset = start_byte
+    last_key, last_range = None, None
+    for line in read_byte_range(data_path, start_byte, end_byte).split(b'\n'):
+        line_end = offset + len(line) + 1
+        fields = line.split(b',', 2)
+        try:
+            timestamp = parse_iso_us(fields[0])
+            key = (int(fields[1]), timestamp - timestamp % bucket_us)
+        except (ValueError, IndexError):
+            key = None
+        if key is not None:
+            ranges = entries[key]
+            if key == last_key and last_range == len(ranges) - 1 and ranges[-1][1] == offset:
+                ranges[-1][1] = min(line_end, end_byte)
+            else:
+                ranges.append([offset, min(line_end, end_byte)])
+            last_key, last_range = key, len(ranges) - 1
+        offset = line_end
+    return {"entries": dict(entries), "start_byte": start_byte}
+
+
+class StationIndex:
+    """
+    Índice lateral (`<csv>.stidx`) que mapeia cada (estação, bucket de tempo)
+    para os intervalos de bytes das suas linhas no CSV.
+
+    Num arquivo ordenado por estação e tempo cada chave ocupa um único
+    intervalo, e o índice tem poucos KB. Num arquivo em ordem aleatória cada
+    linha é um intervalo; os offsets são gravados em deltas comprimidos com
+    zlib. O índice guarda a impressão digital do CSV e só vale para ele.
+    """
+
+    def __init__(self, bucket_us: int = MICROS_PER_HOUR, fingerprint: str = "", entries: dict | None = None):
+        self.bucket_us = bucket_us
+        self.fingerprint = fingerprint
+        # {(station_id, bucket): array("q", [start, end, start, end, ...])}
+        self.entries = entries or {}
+
+    def stations(self) -> list[int]:
+        return sorted({station_id for station_id, _ in self.entries})
+
+    def _selected(self, station_ids=None, start_us: int | None = None, end_us: int | None = None):
+        for (station_id, bucket), flat in self.entries.items():
+            if station_ids is not None and station_id not in station_ids:
+                continue
+            if start_us is not None and bucket + self.bucket_us <= start_us:
+                continue
+            if end_us is not None and bucket >= end_us:
+                continue
+            yield station_id, flat
+
+    def ranges(self, station_ids=None, start_us: int | None = None, end_us: int | None = None,
+               max_gap: int = MAX_GAP_BYTES) -> list[tuple[int, int]]:
+        """Intervalos de bytes (ordenados e agrupados) que contêm as linhas selecionadas."""
+        selected = (
+            (flat[i], flat[i + 1]) for _, flat in self._selected(station_ids, start_us, end_us)
+            for i in range(0, len(flat), 2)
+        )
+        return coalesce(selected, max_gap)
+
+    def work_units(self, num_units: int, station_ids=None, start_us: int | None = None, end_us: int | None = None,
+                   max_gap: int = MAX_GAP_BYTES) -> list[tuple[frozenset, list[tuple[int, int]]]]:
+        """
+        Divide as estações selecionadas em até `num_units` unidades de
+        trabalho (estações, intervalos), cada estação inteira numa só unidade
+        (as métricas por estação saem completas de um único worker). As
+        estações são distribuídas da maior para a menor, sempre para a unidade
+        com menos bytes (LPT), e cada unidade recebe seus intervalos
+        agrupados. Como o agrupamento lê também linhas de outras estações, a
+        unidade deve filtrar pelas próprias estações.
+        """
+        station_ranges = defaultdict(list)
+        for station_id, flat in self._selected(station_ids, start_us, end_us):
+            station_ranges[station_id].extend((flat[i], flat[i + 1]) for i in range(0, len(flat), 2))
+        sizes = {station_id: sum(end - start for start, end in ranges) for station_id, ranges in station_ranges.items()}
+
+        units = [(0, number, []) for number in range(max(1, min(num_units, len(station_ranges))))]
+        heapq.heapify(units)
+        for station_id in sorted(sizes, key=sizes.get, reverse=True):
+            load, number, stations = heapq.heappop(units)
+            stations.append(station_id)
+            heapq.heappush(units, (load + sizes[station_id], number, stations))
+        return [
+            (frozenset(stations), coalesce((r for station_id in stations for r in station_ranges[station_id]), max_gap))
+            for _, _, stations in sorted(units, key=lambda unit: unit[1]) if stations
+        ]
+
+    def save(self, index_path: str):
+        keys = sorted(self.entries)
+        header = array("q")
+        offsets = array("q")
+        for station_id, bucket in keys:
+            flat = self.entries[(station_id, bucket)]
+            header.extend((station_id, bucket, len(flat) // 2))
+            # Deltas em relação ao valor anterior: números pequenos comprimem bem
+            previous = 0
+            for value in flat:
+                offsets.append(value - previous)
+                previous = value
+        metadata = {
+            "version": INDEX_VERSION, "fingerprint": self.fingerprint, "bucket_us": self.bucket_us,
+            "keys": len(keys), "ranges": len(offsets) // 2,
+        }
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(metadata).encode() + b'\n')
+            f.write(zlib.compress(header.tobytes() + offsets.tobytes(), 6))
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: str) -> "StationIndex":
+        with open(index_path, 'rb') as f:
+            metadata = json.loads(f.readline())
+            payload = zlib.decompress(f.read())
+        if metadata.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versão de índice não suportada: {metadata.get('version')}")
+        header = array("q")
+        header.frombytes(payload[:metadata["keys"] * 3 * 8])
+        deltas = array("q")
+        deltas.frombytes(payload[metadata["keys"] * 3 * 8:])
+
+        entries = {}
+        position = 0
+        for k in range(metadata["keys"]):
+            station_id, bucket, count = header[3 * k:3 * k + 3]
+            flat = array("q", deltas[position:position + 2 * count])
+            for i in range(1, len(flat)):
+                flat[i] += flat[i - 1]
+            entries[(station_id, bucket)] = flat
+            position += 2 * count
+        return cls(metadata["bucket_us"], metadata["fingerprint"], entries)
+
+
+def build_station_index(data_path: str, num_workers: int = 4, bucket_us: int = MICROS_PER_HOUR,
+                        index_path: str | None = None) -> StationIndex:
+    """Constrói o índice em paralelo (um pedaço do CSV por tarefa) e o salva ao lado do arquivo."""
+    chunks = get_file_chunks(data_path, auto_chunk_count(os.path.getsize(data_path), num_workers))
+    entries = defaultdict(list)
+    with worker_pool(num_workers) as pool:
+        # Em ordem do arquivo, para que os intervalos de cada chave fiquem ordenados
+        for res in pool.imap(index_chunk, [(data_path, start, end, bucket_us) for start, end in chunks]):
+            for key, ranges in res["entries"].items():
+                merged = entries[key]
+                for start, end in ranges:
+                    if merged and merged[-1][1] == start:
+                        merged[-1] = (merged[-1][0], end)
+                    else:
+                        merged.append((start, end))
+    index = StationIndex(
+        bucket_us, dataset_fingerprint(data_path),
+        {key: array("q", (value for pair in ranges for value in pair)) for key, ranges in entries.items()},
+    )
+    index.save(index_path or default_index_path(data_path))
+    return index
+
+
+def load_or_build_index(data_path: str, num_workers: int = 4, bucket_us: int = MICROS_PER_HOUR) -> StationIndex:
+    """Usa o índice salvo se ele corresponder ao CSV atual; senão, reconstrói."""
+    index_path = default_index_path(data_path)
+    try:
+        index = StationIndex.load(index_path)
+        if index.fingerprint == dataset_fingerprint(data_path) and index.bucket_us == bucket_us:
+            return index
+    except (FileNotFoundError, ValueError, zlib.error, json.JSONDecodeError):
+        pass
+    return build_station_index(data_path, num_workers, bucket_us, index_path)
+
+
+def _to_us(value) -> int | None:
+    return parse_iso_us(value) if isinstance(value, str) else value
+
+
+def run_filtered_analysis(data_path: str, num_workers: int, station_ids=None, start=None, end=None,
+                          profiler=None, use_index: bool = True) -> tuple[float, list]:
+    """
+    Análise das estações `station_ids` (None = todas) no intervalo
+    [start, end) (ISO 8601 ou microssegundos; None = sem limite). Com o
+    índice, cada worker recebe uma unidade alinhada por estação e lê só os
+    intervalos de bytes selecionados; com `use_index=False`, o arquivo
+    inteiro é lido e filtrado linha a linha (a referência do benchmark).
+    O índice é construído (fora da medição) se ainda não existir.
+    """
+    from .processor import merge_chunk_result, process_byte_ranges
+
+    profiler = profiler or get_profiler(False)
+    station_ids = frozenset(station_ids) if station_ids is not None else None
+    start_us, end_us = _to_us(start), _to_us(end)
+    index = load_or_build_index(data_path, num_workers) if use_index else None
+
+    start_time = time.perf_counter()
+    with profiler.stage("chunking"):
+        if index is not None:
+            units = index.work_units(num_workers, station_ids, start_us, end_us)
+        else:
+            chunks = get_file_chunks(data_path, auto_chunk_count(os.path.getsize(data_path), num_workers))
+            units = [(station_ids, [chunk]) for chunk in chunks]
+        trace_dir = allocation_trace_dir()
+        task_args = [(data_path, ranges, stations, start_us, end_us, profiler.enabled, trace_dir) for stations, ranges in units]
+    profiler.count("bytes_read", sum(end - start for _, ranges in units for start, end in ranges))
+
+    final_station_report = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "multi_sensor_periods": 0})
+    all_found_anomalies = []
+    if task_args:
+        with worker_pool(num_workers) as pool:
+            for res in pool.imap_unordered(process_byte_ranges, task_args):
+                with profiler.stage("merge"):
+                    merge_chunk_result(res, final_station_report, all_found_anomalies, profiler)
+    return time.perf_counter() - start_time, all_found_anomalies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the per-station byte-offset index or run a filtered analysis.")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv'))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--stations", type=int, nargs="*", help="Stations to analyse (default: only build the index).")
+    parser.add_argument("--start", help="ISO 8601 start of the time window.")
+    parser.add_argument("--end", help="ISO 8601 end of the time window.")
+    args = parser.parse_args()
+
+    build_start = time.perf_counter()
+    station_index = build_station_index(args.data, args.workers)
+    print(f"Índice construído em {time.perf_counter() - build_start:.3f} s: {len(station_index.entries)} chaves, "
+          f"{os.path.getsize(default_index_path(args.data)) / 1024:.1f} KB "
+          f"(CSV: {os.path.getsize(args.data) / 1024:.0f} KB).")
+    if args.stations:
+        exec_time, anomalies = run_filtered_analysis(args.data, args.workers, args.stations, args.start, args.end)
+        print(f"{len(anomalies)} anomalias nas estações {args.stations} em {exec_time:.4f} s.")
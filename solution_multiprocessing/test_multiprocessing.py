@@ -1,14 +1,16 @@
 
-import multiprocessing
 import time
 from collections import defaultdict
+from core.models import EventBatch
+from core.resources import ResourceSampler
+from core.placement import available_cpu_count, worker_pool
 from .metrics import is_anomalous, calculate_moving_averages, count_multi_sensor_anomaly_periods
 from .data_parser import load_and_group_by_station, load_and_group_by_region
 
 
-def process_station_chunk(station_data: tuple[int, list[dict]]) -> dict:
+def process_station_chunk(station_data: tuple[int, EventBatch]) -> dict:
     station_id, event_list = station_data
-    event_list.sort(key=lambda x: x['timestamp'])
+    event_list.sort_by_time()
     total_events = len(event_list)
     anomaly_counts = defaultdict(int)
     for event in event_list:
@@ -23,7 +25,7 @@ def process_station_chunk(station_data: tuple[int, list[dict]]) -> dict:
     }
     return {station_id: result}
 
-def process_region_chunk(region_data: tuple[str, list[dict]]) -> dict:
+def process_region_chunk(region_data: tuple[str, EventBatch]) -> dict:
     region_name, event_list = region_data
     moving_averages = calculate_moving_averages(event_list, window_size=50)
     return {region_name: moving_averages}
@@ -45,15 +47,19 @@ def run_analysis_benchmark(data_path: str, num_workers: int, workload_multiplier
 
     start_time = time.perf_counter()
 
-    with multiprocessing.Pool(processes=num_workers) as pool:
-        # Executa ambas as análises
-        pool.map(process_station_chunk, station_work_items)
-        pool.map(process_region_chunk, region_work_items)
+    with ResourceSampler() as sampler:
+        with worker_pool(num_workers) as pool:
+            # Executa ambas as análises
+            pool.map(process_station_chunk, station_work_items)
+            pool.map(process_region_chunk, region_work_items)
 
     end_time = time.perf_counter()
     duration = end_time - start_time
+    resources = sampler.report()
     
     print(f"Execução com {num_workers} worker(s) finalizada em {duration:.4f} segundos.")
+    print(f"  Pico RSS total: {resources['total_peak_rss_mb']:.1f} MB | CPU: {resources['cpu_percent']:.0f}% "
+          f"| Trocas de contexto (invol.): {resources['involuntary_ctx_switches']}")
     return duration
 
 
@@ -67,8 +73,8 @@ if __name__ == "__main__":
 
     results = {}
     for workers in WORKER_COUNTS:
-        if workers > multiprocessing.cpu_count():
-            print(f"Pulando teste com {workers} workers (Máximo de CPUs: {multiprocessing.cpu_count()}).")
+        if workers > available_cpu_count():
+            print(f"Pulando teste com {workers} workers (Máximo de CPUs: {available_cpu_count()}).")
             continue
         
         duration = run_analysis_benchmark(DATA_FILE, num_workers=workers, workload_multiplier=WORKLOAD_MULTIPLIER)
@@ -3,21 +3,45 @@ from pyspark.sql import SparkSession, Window
 from pyspark.sql.functions import col, when, count, avg, unix_timestamp, to_timestamp
 import os
 
-def run_spark_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
+from core.cache import cached_analysis
+from core.profiling import get_profiler
+from core.rules import compile_spark
+from core.sketches import DistributionSketches, write_distribution_report
+
+# Percentis por região e estação (sketches combinados de todas as partições)
+DISTRIBUTIONS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'distributions_spark.json')
+
+def build_partition_sketches(rows):
+    """Resume uma partição de eventos não anômalos num `DistributionSketches`."""
+    sketches = DistributionSketches()
+    for row in rows:
+        if None not in row:
+            sketches.add(row.region, row.station_id, row.temperature, row.humidity, row.pressure)
+    yield sketches.to_dict()
+
+@cached_analysis("spark", os.path.dirname(__file__))
+def run_spark_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
     """
     Executa a análise completa de dados meteorológicos usando Apache Spark.
     Retorna o tempo total de execução e a lista de anomalias detectadas.
+
+    Os percentis por região e estação são salvos em DISTRIBUTIONS_FILE.
+    Como o Spark é preguiçoso, as etapas do `profiler` são medidas nas ações
+    (`collect`), que é onde o plano de cada métrica de fato executa.
+    O resultado passa pelo cache de `core.cache` (`use_cache=False` o ignora).
     """
+    profiler = profiler or get_profiler(False)
     start_time = time.perf_counter()
 
     # 1. Iniciar a SparkSession
-    spark = SparkSession.builder \
-        .appName(f"Analysis_Workers_{num_workers}") \
-        .master(f"local[{num_workers}]") \
-        .config("spark.sql.session.timeZone", "UTC") \
-        .getOrCreate()
-    
-    spark.sparkContext.setLogLevel("ERROR")
+    with profiler.stage("session"):
+        spark = SparkSession.builder \
+            .appName(f"Analysis_Workers_{num_workers}") \
+            .master(f"local[{num_workers}]") \
+            .config("spark.sql.session.timeZone", "UTC") \
+            .getOrCreate()
+        
+        spark.sparkContext.setLogLevel("ERROR")
 
     # 2. Carregar os dados
     df = spark.read.csv(data_path, header=True, inferSchema=False) \
@@ -28,20 +52,12 @@ def run_spark_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
         .withColumn("station_id", col("station_id").cast("integer"))
 
 
-    # 3. Identificar anomalias e enriquecer o DataFrame
-    anomaly_conditions = (
-        (col("temperature") >= 45.0) | (col("temperature") <= -10.0) |
-        (col("humidity") > 100.0) | (col("humidity") < 0.0) |
-        (col("pressure") > 1040.0) | (col("pressure") < 980.0)
-    )
+    # 3. Identificar anomalias e enriquecer o DataFrame, com as mesmas regras
+    # (core.rules) das demais soluções
+    anomaly_conditions, anomaly_sensor = compile_spark()
     
     df_with_anomalies = df.withColumn("is_anomaly", when(anomaly_conditions, 1).otherwise(0)) \
-        .withColumn("anomaly_sensor", 
-            when((col("temperature") >= 45.0) | (col("temperature") <= -10.0), "temperature")
-            .when((col("humidity") > 100.0) | (col("humidity") < 0.0), "humidity")
-            .when((col("pressure") > 1040.0) | (col("pressure") < 980.0), "pressure")
-            .otherwise(None)
-        )
+        .withColumn("anomaly_sensor", anomaly_sensor)
     
     df_with_anomalies.cache()
 
@@ -71,23 +87,39 @@ def run_spark_analysis(data_path: str, num_workers: int) -> tuple[float, list]:
         .filter(col("is_anomaly") == 1) \
         .select("timestamp", "station_id", "anomaly_sensor")
 
-    station_anomaly_report.collect()
-    region_moving_avg_report.collect()
-    multi_anomaly_periods.collect()
+    # A primeira ação também materializa o cache (leitura + parsing do CSV)
+    with profiler.stage("parse+station_report"):
+        station_anomaly_report.collect()
+    with profiler.stage("region_moving_avg"):
+        region_moving_avg_report.collect()
+    with profiler.stage("multi_sensor_periods"):
+        multi_anomaly_periods.collect()
+    with profiler.stage("sketches"):
+        # Cada partição monta seus sketches; o driver só combina os resumos
+        partition_sketches = df_no_anomalies \
+            .select("region", "station_id", "temperature", "humidity", "pressure") \
+            .rdd.mapPartitions(build_partition_sketches).collect()
+        sketches = DistributionSketches()
+        for partial in partition_sketches:
+            sketches.merge(partial)
+        write_distribution_report(sketches, DISTRIBUTIONS_FILE)
     
-    found_anomalies_rows = found_anomalies_df.collect()
-    found_anomalies_list = [
-        {
-            "timestamp": row.timestamp.isoformat(), 
-            "station_id": row.station_id, 
-            "sensor": row.anomaly_sensor
-        } 
-        for row in found_anomalies_rows
-    ]
+    with profiler.stage("collect_anomalies"):
+        found_anomalies_rows = found_anomalies_df.collect()
+        found_anomalies_list = [
+            {
+                "timestamp": row.timestamp.isoformat(), 
+                "station_id": row.station_id, 
+                "sensor": row.anomaly_sensor
+            } 
+            for row in found_anomalies_rows
+        ]
+    profiler.count("anomalies", len(found_anomalies_list))
 
     df_with_anomalies.unpersist()
     
-    spark.stop()
+    with profiler.stage("session"):
+        spark.stop()
     end_time = time.perf_counter()
     
     return (end_time - start_time), found_anomalies_list
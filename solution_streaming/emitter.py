@@ -0,0 +1,67 @@
+import argparse
+import csv
+import datetime
+import io
+import random
+import socket
+import time
+
+from faker import Faker
+
+from data_generator.generator import TOTAL_STATIONS, make_event, setup_regions
+
+# Intervalo entre envios e tamanho máximo de cada lote enviado
+TICK_SECONDS = 0.001
+MAX_BATCH = 1000
+
+
+def run_emitter(host: str, port: int, rate: float, duration: float, anomaly_percentage: float = 5.0) -> dict:
+    """
+    Gera eventos sintéticos em tempo real, a `rate` eventos/s durante
+    `duration` segundos, e os envia como linhas CSV (mesmo esquema do arquivo
+    gerado) por uma conexão TCP local. O timestamp de cada evento é o instante
+    em que ele foi criado, o que permite ao processador medir a latência de
+    detecção.
+    """
+    fake = Faker('pt_BR')
+    regions_config = setup_regions(fake)
+    regions_list = list(regions_config.keys())
+
+    sent, generated_anomalies = 0, 0
+    with socket.create_connection((host, port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        start_time = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start_time
+            if elapsed >= duration:
+                break
+            due = min(int(rate * elapsed) - sent, MAX_BATCH)
+            if due <= 0:
+                time.sleep(TICK_SECONDS)
+                continue
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for _ in range(due):
+                station_id = random.randint(1, TOTAL_STATIONS)
+                event_time = datetime.datetime.now(datetime.timezone.utc)
+                event_data, anomaly = make_event(station_id, event_time, regions_config, regions_list, anomaly_percentage)
+                writer.writerow(event_data.values())
+                generated_anomalies += anomaly is not None
+            sock.sendall(buffer.getvalue().encode())
+            sent += due
+        sock.shutdown(socket.SHUT_WR)
+
+    return {"sent": sent, "generated_anomalies": generated_anomalies}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emit synthetic meteorological events over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Events per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to emit for.")
+    parser.add_argument("--anomaly_perc", type=float, default=5.0, help="Percentage of anomalies to introduce.")
+    args = parser.parse_args()
+
+    print(run_emitter(args.host, args.port, args.rate, args.duration, args.anomaly_perc))
@@ -0,0 +1,161 @@
+import argparse
+import math
+import socket
+import time
+from array import array
+
+from core.models import MeteorologicalEvent
+from core.profiling import get_profiler
+from core.startup import get_context
+from core.timestamps import format_iso_us
+from solution_multiprocessing.data_parser import parse_event_bytes
+from solution_multiprocessing.metrics import MovingAverageState, MultiSensorPeriodCounter, is_anomalous
+from .emitter import run_emitter
+
+RECV_BYTES = 1 << 16
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Percentil pelo método do posto mais próximo; `sorted_values` já ordenado."""
+    if not sorted_values:
+        return 0.0
+    # p * n / 100 (e não p / 100 * n) mantém exatos os postos inteiros, ex.: p95 de 20 valores
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(latencies_us: array) -> dict:
+    ordered = sorted(latencies_us)
+    return {
+        "p50_ms": round(percentile(ordered, 50) / 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) / 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) / 1000, 3),
+        "max_ms": round(ordered[-1] / 1000, 3) if ordered else 0.0,
+    }
+
+
+class OnlineDetector:
+    """
+    Mantém, evento a evento, a janela multi-sensor de cada estação e a média
+    móvel de cada região (as mesmas classes do modo incremental), e chama
+    `on_anomaly` / `on_alert` assim que uma anomalia ou um período com
+    anomalias em sensores distintos é detectado.
+
+    A latência de detecção é a diferença entre o relógio (UTC) no momento da
+    detecção e o timestamp do evento, que o emissor preenche com o instante
+    de criação da leitura.
+    """
+
+    def __init__(self, on_anomaly=None, on_alert=None):
+        self.on_anomaly = on_anomaly
+        self.on_alert = on_alert
+        self.stations = {}
+        self.regions = {}
+        self.events = 0
+        self.anomalies = 0
+        self.alerts = 0
+        self.anomaly_latencies_us = array("q")
+        self.alert_latencies_us = array("q")
+
+    def process(self, rows: list[tuple]):
+        for row in rows:
+            event = MeteorologicalEvent(*row)
+            anomaly_found, sensor = is_anomalous(event)
+
+            counter = self.stations.get(event.station_id)
+            if counter is None:
+                counter = self.stations[event.station_id] = MultiSensorPeriodCounter()
+            period_closed = counter.push(event.timestamp, sensor)
+
+            if anomaly_found:
+                self.anomalies += 1
+                self.anomaly_latencies_us.append(time.time_ns() // 1000 - event.timestamp)
+                if self.on_anomaly is not None:
+                    self.on_anomaly({"timestamp": format_iso_us(event.timestamp), "station_id": event.station_id, "sensor": sensor})
+            else:
+                averages = self.regions.get(event.region)
+                if averages is None:
+                    averages = self.regions[event.region] = MovingAverageState()
+                averages.push(event)
+
+            if period_closed:
+                self.alerts += 1
+                self.alert_latencies_us.append(time.time_ns() // 1000 - event.timestamp)
+                if self.on_alert is not None:
+                    self.on_alert({"timestamp": format_iso_us(event.timestamp), "station_id": event.station_id})
+        self.events += len(rows)
+
+    def region_averages(self) -> dict:
+        return {region: averages.averages() for region, averages in self.regions.items()}
+
+
+def run_streaming_analysis(rate: float, duration: float, anomaly_percentage: float = 5.0,
+                           on_anomaly=None, on_alert=None, profiler=None) -> dict:
+    """
+    Inicia o emissor num processo separado, recebe o fluxo por um socket TCP
+    local e processa os eventos à medida que chegam. Retorna a taxa
+    sustentada, as contagens e os percentis de latência de detecção.
+    """
+    profiler = profiler or get_profiler(False)
+    detector = OnlineDetector(on_anomaly, on_alert)
+
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        port = server.getsockname()[1]
+        emitter = get_context().Process(
+            target=run_emitter, args=("127.0.0.1", port, rate, duration, anomaly_percentage), daemon=True
+        )
+        emitter.start()
+        connection, _ = server.accept()
+
+    pending = b""
+    start_time = None
+    malformed = 0
+    with connection:
+        while True:
+            with profiler.stage("ipc"):
+                data = connection.recv(RECV_BYTES)
+            if not data:
+                break
+            if start_time is None:
+                start_time = time.perf_counter()
+            pending += data
+            # Apenas linhas completas; o resto espera o próximo recv
+            cut = pending.rfind(b"\n") + 1
+            complete, pending = pending[:cut], pending[cut:]
+            with profiler.stage("parse"):
+                rows, skipped = parse_event_bytes(complete)
+            malformed += skipped
+            with profiler.stage("metrics"):
+                detector.process(rows)
+    elapsed = time.perf_counter() - start_time if start_time is not None else 0.0
+    emitter.join()
+    profiler.count("events", detector.events)
+    profiler.count("malformed_rows", malformed)
+
+    return {
+        "target_rate": rate,
+        "events": detector.events,
+        "duration_s": round(elapsed, 3),
+        "events_per_second": round(detector.events / elapsed, 1) if elapsed > 0 else 0.0,
+        "anomalies": detector.anomalies,
+        "alerts": detector.alerts,
+        "anomaly_latency": latency_summary(detector.anomaly_latencies_us),
+        "alert_latency": latency_summary(detector.alert_latencies_us),
+        "region_averages": detector.region_averages(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online anomaly detection over a live event stream.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1000, 5000, 20000], help="Input rates (events/s) to test.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per rate.")
+    parser.add_argument("--anomaly_perc", type=float, default=5.0, help="Percentage of anomalies to introduce.")
+    args = parser.parse_args()
+
+    print("Iniciando processamento em streaming...")
+    for rate in args.rates:
+        result = run_streaming_analysis(rate, args.duration, args.anomaly_perc)
+        latency = result["anomaly_latency"]
+        print(f"Taxa alvo: {rate:>8.0f} ev/s | Sustentada: {result['events_per_second']:>9.1f} ev/s "
+              f"| Anomalias: {result['anomalies']:>6} | Alertas: {result['alerts']:>4} "
+              f"| Latência p50/p95/p99: {latency['p50_ms']:.2f}/{latency['p95_ms']:.2f}/{latency['p99_ms']:.2f} ms")
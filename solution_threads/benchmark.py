@@ -0,0 +1,39 @@
+import sys
+
+from core.placement import available_cpu_count
+from core.resources import ResourceSampler
+from solution_multiprocessing.processor import run_analysis
+from .processor import gil_enabled, run_mapped_analysis, run_thread_analysis
+
+# Backends comparados no mesmo grau de paralelismo (processos x threads)
+BACKENDS = {
+    "processos (Pool)": lambda data_path, degree: run_analysis(data_path, degree, use_cache=False),
+    "threads (NumPy)": lambda data_path, degree: run_thread_analysis(data_path, degree, use_cache=False),
+    "threads (mmap, só kernels)": run_mapped_analysis,
+}
+
+
+def run_backend_benchmark(data_path: str, degrees=(1, 2, 4, 8)) -> dict:
+    """
+    Executa cada backend em cada grau e mostra tempo, speedup sobre o grau 1
+    do próprio backend e pico de memória. As colunas mapeadas são criadas
+    antes da primeira medição.
+    """
+    print(f"GIL {'ativo' if gil_enabled() else 'desligado (free-threaded)'}; CPUs: {available_cpu_count()}.\n")
+    run_mapped_analysis(data_path, 1)
+    results = {}
+    for degree in degrees:
+        for name, run in BACKENDS.items():
+            with ResourceSampler() as sampler:
+                exec_time, anomalies = run(data_path, degree)
+            resources = sampler.report()
+            results[(name, degree)] = exec_time
+            speedup = results[(name, degrees[0])] / exec_time if exec_time > 0 else 0
+            print(f"Grau {degree:>2} | {name:>28}: {exec_time:8.4f} s | speedup {speedup:5.2f}x "
+                  f"| pico RSS total {resources['total_peak_rss_mb']:7.1f} MB | {len(anomalies)} anomalias")
+    return results
+
+
+if __name__ == "__main__":
+    DATA_FILE = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic_data.csv"
+    run_backend_benchmark(DATA_FILE)
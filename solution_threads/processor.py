@@ -0,0 +1,377 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.cache import cached_analysis, dataset_fingerprint
+from core.profiling import get_profiler
+from core.rules import SENSORS, compile_numpy
+from core.sketches import DistributionSketches, write_distribution_report
+from core.timestamps import MICROS_PER_MINUTE, format_iso_us
+from solution_multiprocessing.data_parser import (
+    TASKS_PER_WORKER, auto_chunk_count, get_file_chunks, parse_event_bytes, read_byte_range,
+)
+
+DISTRIBUTIONS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'distributions_threads.json')
+# Colunas em .npy para abrir com memória mapeada (ver materialize_columns)
+COLUMNS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'columns')
+COLUMN_DTYPES = {
+    "timestamp": np.int64,
+    "station_id": np.int32,
+    "region_code": np.uint16,
+    "temperature": np.float64,
+    "humidity": np.float64,
+    "pressure": np.float64,
+}
+MOVING_AVERAGE_WINDOW = 50
+MULTI_SENSOR_WINDOW_US = 10 * MICROS_PER_MINUTE
+
+anomaly_mask = compile_numpy()
+
+
+def gil_enabled() -> bool:
+    """False num CPython free-threaded (3.13t+) com o GIL desligado."""
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+def _task_info(task_start: float) -> dict:
+    return {"thread": threading.current_thread().name, "busy_seconds": time.perf_counter() - task_start}
+
+
+# --- Etapa 1: parsing -------------------------------------------------------
+
+def parse_chunk(args: tuple) -> dict:
+    """
+    Converte um pedaço de bytes do CSV em colunas NumPy. O parsing é código
+    Python e só roda de fato em paralelo num interpretador free-threaded; com
+    GIL, as threads se revezam nesta etapa.
+    """
+    task_start = time.perf_counter()
+    data_path, start_byte, end_byte, profile_enabled = args
+    profiler = get_profiler(profile_enabled)
+
+    with profiler.stage("read"):
+        chunk_bytes = read_byte_range(data_path, start_byte, end_byte)
+    with profiler.stage("parse"):
+        rows, malformed = parse_event_bytes(chunk_bytes)
+        profiler.count("malformed_rows", malformed)
+        regions = {}
+        if rows:
+            timestamps, station_ids, region_names, temperatures, humidities, pressures = zip(*rows)
+            region_codes = [regions.setdefault(name, len(regions)) for name in region_names]
+        else:
+            timestamps = station_ids = region_codes = temperatures = humidities = pressures = ()
+        columns = {
+            name: np.array(values, dtype=COLUMN_DTYPES[name])
+            for name, values in zip(COLUMN_DTYPES, (timestamps, station_ids, region_codes, temperatures, humidities, pressures))
+        }
+
+    return {"columns": columns, "regions": list(regions), "profile": profiler.to_dict(), "worker": _task_info(task_start)}
+
+
+def concatenate_chunks(results: list[dict]) -> tuple[dict, list[str]]:
+    """
+    Junta as colunas dos pedaços (na ordem do arquivo) em colunas únicas,
+    compartilhadas por todas as threads sem cópia, e unifica as tabelas de
+    regiões de cada pedaço.
+    """
+    region_index = {}
+    region_columns = []
+    for res in results:
+        lookup = np.array(
+            [region_index.setdefault(name, len(region_index)) for name in res["regions"]] or [0],
+            dtype=np.uint16,
+        )
+        region_columns.append(lookup[res["columns"]["region_code"]])
+    regions = list(region_index)
+    columns = {
+        name: np.concatenate([res["columns"][name] for res in results]) if results else np.empty(0, dtype)
+        for name, dtype in COLUMN_DTYPES.items()
+    }
+    if results:
+        columns["region_code"] = np.concatenate(region_columns)
+    return columns, regions
+
+
+# --- Etapa 2: kernels por faixa de linhas -----------------------------------
+
+def scan_rows(args: tuple) -> dict:
+    """
+    Kernel vetorizado sobre a faixa [start, stop) das colunas compartilhadas:
+    máscara de anomalias, contagens por estação e sketches dos eventos não
+    anômalos. As fatias são visões (sem cópia) e as operações do NumPy sobre
+    arrays numéricos liberam o GIL enquanto percorrem os dados.
+    """
+    task_start = time.perf_counter()
+    columns, regions, start, stop, profile_enabled = args
+    profiler = get_profiler(profile_enabled)
+    rows = {name: column[start:stop] for name, column in columns.items()}
+
+    with profiler.stage("anomalies"):
+        mask, sensor_codes = anomaly_mask(rows)
+        anomaly_rows = np.flatnonzero(mask)
+        found = (
+            rows["timestamp"][anomaly_rows],
+            rows["station_id"][anomaly_rows],
+            sensor_codes[anomaly_rows],
+        )
+
+    with profiler.stage("metrics"):
+        stations, totals = np.unique(rows["station_id"], return_counts=True)
+        anomalous_stations, anomaly_counts = np.unique(found[1], return_counts=True)
+
+    with profiler.stage("sketches"):
+        sketches = DistributionSketches()
+        normal = np.flatnonzero(~mask)
+        if len(normal):
+            keys = rows["region_code"][normal].astype(np.int64) << 32 | rows["station_id"][normal]
+            order = np.argsort(keys, kind="stable")
+            normal, keys = normal[order], keys[order]
+            bounds = np.flatnonzero(np.diff(keys)) + 1
+            for group in np.split(normal, bounds):
+                first = group[0]
+                sketches.add_columns(
+                    regions[rows["region_code"][first]], int(rows["station_id"][first]),
+                    rows["temperature"][group].tolist(), rows["humidity"][group].tolist(), rows["pressure"][group].tolist(),
+                )
+
+    profiler.count("events", stop - start)
+    profiler.count("anomalies", len(anomaly_rows))
+    return {
+        "found": found,
+        "station_totals": dict(zip(stations.tolist(), totals.tolist())),
+        "station_anomalies": dict(zip(anomalous_stations.tolist(), anomaly_counts.tolist())),
+        "sketches": sketches,
+        "profile": profiler.to_dict(),
+        "worker": _task_info(task_start),
+    }
+
+
+# --- Etapa 3: kernels por estação e por região ------------------------------
+
+def count_multi_sensor_periods(timestamps: np.ndarray, sensor_codes: np.ndarray,
+                               window_us: int = MULTI_SENSOR_WINDOW_US) -> int:
+    """
+    Mesmo resultado de `count_multi_sensor_anomaly_periods`, percorrendo só as
+    anomalias da estação (em ordem de tempo): entre duas anomalias a janela
+    apenas perde itens, então eventos normais nunca abrem um período novo.
+    """
+    period_count = 0
+    window = []
+    for timestamp, code in zip(timestamps.tolist(), sensor_codes.tolist()):
+        window = [(t, c) for t, c in window if timestamp - t <= window_us]
+        window.append((timestamp, code))
+        if len({c for _, c in window}) > 1:
+            period_count += 1
+            window = []
+    return period_count
+
+
+def station_kernel(args: tuple) -> dict:
+    task_start = time.perf_counter()
+    station_id, timestamps, sensor_codes = args
+    order = np.argsort(timestamps, kind="stable")
+    periods = count_multi_sensor_periods(timestamps[order], sensor_codes[order])
+    return {"station_id": station_id, "multi_sensor_periods": periods, "worker": _task_info(task_start)}
+
+
+def region_kernel(args: tuple) -> dict:
+    """
+    Série de médias móveis (janela de 50 eventos não anômalos, em ordem de
+    tempo) da região via somas acumuladas, e o último valor de cada sensor,
+    como `calculate_moving_averages`.
+    """
+    task_start = time.perf_counter()
+    region, columns, rows, window_size = args
+    order = rows[np.argsort(columns["timestamp"][rows], kind="stable")]
+    averages = {}
+    for sensor in SENSORS:
+        values = columns[sensor][order]
+        if len(values) < window_size:
+            averages[sensor] = 0
+            continue
+        sums = np.cumsum(values)
+        series = (sums[window_size - 1:] - np.concatenate(([0.0], sums[:-window_size]))) / window_size
+        averages[sensor] = round(float(series[-1]), 2)
+    return {"region": region, "averages": averages, "worker": _task_info(task_start)}
+
+
+# --- Orquestração -----------------------------------------------------------
+
+def analyze_columns(columns: dict, regions: list[str], executor: ThreadPoolExecutor, num_workers: int,
+                    profiler, worker_busy: dict) -> dict:
+    """
+    Executa as etapas 2 e 3 sobre colunas já carregadas (em memória ou
+    mapeadas de COLUMNS_DIR). Cada tarefa devolve seu resultado e só a thread
+    principal acumula, então nada é compartilhado para escrita entre threads,
+    com ou sem GIL.
+    """
+    size = len(columns["timestamp"])
+    bounds = np.linspace(0, size, num=min(size, num_workers * TASKS_PER_WORKER) + 1, dtype=np.int64)
+    scan_args = [(columns, regions, int(start), int(stop), profiler.enabled) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    station_report = defaultdict(lambda: {"total_events": 0, "anomaly_events": 0, "multi_sensor_periods": 0})
+    found_parts = []
+    sketches = DistributionSketches()
+    for res in executor.map(scan_rows, scan_args):
+        with profiler.stage("merge"):
+            for station_id, total in res["station_totals"].items():
+                station_report[station_id]["total_events"] += total
+            for station_id, count in res["station_anomalies"].items():
+                station_report[station_id]["anomaly_events"] += count
+            found_parts.append(res["found"])
+            sketches.merge(res["sketches"])
+            profiler.merge(res["profile"])
+            worker_busy[res["worker"]["thread"]].append(res["worker"]["busy_seconds"])
+
+    with profiler.stage("grouping"):
+        found_timestamps = np.concatenate([part[0] for part in found_parts]) if found_parts else np.empty(0, np.int64)
+        found_stations = np.concatenate([part[1] for part in found_parts]) if found_parts else np.empty(0, np.int32)
+        found_codes = np.concatenate([part[2] for part in found_parts]) if found_parts else np.empty(0, np.int8)
+        station_order = np.argsort(found_stations, kind="stable")
+        station_ids, station_starts = np.unique(found_stations[station_order], return_index=True)
+        station_args = [
+            (int(station_id), found_timestamps[group], found_codes[group])
+            for station_id, group in zip(station_ids, np.split(station_order, station_starts[1:]))
+        ]
+        normal = np.flatnonzero(~anomaly_mask(columns)[0])
+        region_order = normal[np.argsort(columns["region_code"][normal], kind="stable")]
+        region_codes, region_starts = np.unique(columns["region_code"][region_order], return_index=True)
+        region_args = [
+            (regions[code], columns, group, MOVING_AVERAGE_WINDOW)
+            for code, group in zip(region_codes, np.split(region_order, region_starts[1:]))
+        ]
+
+    region_averages = {}
+    with profiler.stage("metrics"):
+        for res in executor.map(station_kernel, station_args):
+            station_report[res["station_id"]]["multi_sensor_periods"] = res["multi_sensor_periods"]
+            worker_busy[res["worker"]["thread"]].append(res["worker"]["busy_seconds"])
+        for res in executor.map(region_kernel, region_args):
+            region_averages[res["region"]] = res["averages"]
+            worker_busy[res["worker"]["thread"]].append(res["worker"]["busy_seconds"])
+
+    with profiler.stage("output"):
+        anomalies = [
+            {"timestamp": format_iso_us(timestamp), "station_id": station_id, "sensor": SENSORS[code]}
+            for timestamp, station_id, code in zip(found_timestamps.tolist(), found_stations.tolist(), found_codes.tolist())
+        ]
+    with profiler.stage("sketches"):
+        write_distribution_report(sketches, DISTRIBUTIONS_FILE)
+
+    return {"anomalies": anomalies, "stations": dict(station_report), "regions": region_averages}
+
+
+def load_columns(data_path: str, executor: ThreadPoolExecutor, num_workers: int, profiler, worker_busy: dict):
+    """Etapa 1: parsing dos pedaços do arquivo no pool de threads."""
+    with profiler.stage("chunking"):
+        chunks = get_file_chunks(data_path, auto_chunk_count(os.path.getsize(data_path), num_workers))
+    results = []
+    for res in executor.map(parse_chunk, [(data_path, start, end, profiler.enabled) for start, end in chunks]):
+        profiler.merge(res["profile"])
+        worker_busy[res["worker"]["thread"]].append(res["worker"]["busy_seconds"])
+        results.append(res)
+    with profiler.stage("merge"):
+        return concatenate_chunks(results)
+
+
+def materialize_columns(data_path: str, directory: str = COLUMNS_DIR, num_workers: int = 4) -> tuple[dict, list[str]]:
+    """
+    Salva as colunas do dataset em arquivos .npy (uma vez por versão do
+    arquivo) e as reabre com `mmap_mode="r"`: as páginas vêm do cache do
+    sistema operacional sob demanda, e todas as threads leem o mesmo
+    mapeamento somente leitura.
+    """
+    metadata_path = os.path.join(directory, "columns.json")
+    fingerprint = dataset_fingerprint(data_path)
+    try:
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        metadata = {}
+
+    if metadata.get("fingerprint") != fingerprint:
+        os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="asce-parse") as executor:
+            columns, regions = load_columns(data_path, executor, num_workers, get_profiler(False), defaultdict(list))
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), column)
+        metadata = {"fingerprint": fingerprint, "regions": regions}
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f)
+
+    columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in COLUMN_DTYPES}
+    return columns, metadata["regions"]
+
+
+def _record_threads(profiler, worker_busy: dict, elapsed: float):
+    for number, (_, busy) in enumerate(sorted(worker_busy.items()), start=1):
+        profiler.record_worker(f"thread {number}", sum(busy), max(0.0, elapsed - sum(busy)), len(busy))
+
+
+# Depende do parser e da divisão em pedaços de solution_multiprocessing
+@cached_analysis("threads", os.path.dirname(__file__), os.path.join(os.path.dirname(__file__), '..', 'solution_multiprocessing'))
+def run_thread_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
+    """
+    Mesma interface de `run_analysis`, com `num_workers` threads de um
+    `ThreadPoolExecutor` em vez de processos: sem criação de processos nem
+    pickle, as colunas NumPy são compartilhadas pelas threads. O ganho vem
+    dos kernels vetorizados, que liberam o GIL; o parsing só escala num
+    CPython free-threaded (`profiler.counters["gil_disabled"]`).
+    """
+    profiler = profiler or get_profiler(False)
+    start_time = time.perf_counter()
+    if not os.path.exists(data_path):
+        print(f"Arquivo de dados não encontrado: {data_path}")
+        return -1.0, []
+
+    worker_busy = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="asce") as executor:
+        columns, regions = load_columns(data_path, executor, num_workers, profiler, worker_busy)
+        report = analyze_columns(columns, regions, executor, num_workers, profiler, worker_busy)
+    elapsed = time.perf_counter() - start_time
+    if profiler.enabled:
+        profiler.count("gil_disabled", int(not gil_enabled()))
+        _record_threads(profiler, worker_busy, elapsed)
+    return elapsed, report["anomalies"]
+
+
+def run_mapped_analysis(data_path: str, num_workers: int, profiler=None) -> tuple[float, list]:
+    """
+    Variante sobre as colunas mapeadas de COLUMNS_DIR (criadas na primeira
+    chamada, fora da medição): mede só os kernels, sem o parsing.
+    """
+    profiler = profiler or get_profiler(False)
+    columns, regions = materialize_columns(data_path, num_workers=num_workers)
+    start_time = time.perf_counter()
+    worker_busy = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="asce") as executor:
+        report = analyze_columns(columns, regions, executor, num_workers, profiler, worker_busy)
+    elapsed = time.perf_counter() - start_time
+    if profiler.enabled:
+        _record_threads(profiler, worker_busy, elapsed)
+    return elapsed, report["anomalies"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Thread-pool analysis with NumPy kernels.")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_data.csv'))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mmap", action="store_true", help="Run the kernels over memory-mapped .npy columns.")
+    args = parser.parse_args()
+
+    print(f"GIL {'ativo' if gil_enabled() else 'desligado (free-threaded)'}; {args.workers} threads.")
+    run = run_mapped_analysis if args.mmap else run_thread_analysis
+    profiler = get_profiler(True)
+    kwargs = {} if args.mmap else {"use_cache": False}
+    execution_time, anomalies_found = run(args.data, args.workers, profiler=profiler, **kwargs)
+    print(f"Tempo de execução: {execution_time:.4f} segundos.")
+    print(f"Total de anomalias encontradas: {len(anomalies_found)}")
+    for stage, seconds in sorted(profiler.timings.items(), key=lambda item: -item[1]):
+        print(f"  {stage:>10}: {seconds:.4f} s")